@@ -29,6 +29,7 @@ class Config:
     _validations: Dict[str, ConfigValidation] = {}
     _environment: Environment = Environment.DEVELOPMENT
     _version: str = "1.0.0"
+    _loaded: bool = False
 
     def __new__(cls):
         if cls._instance is None:
@@ -111,16 +112,24 @@ class Config:
             cls._environment = env
 
         base_path = Path(__file__).parent
+        base_config_path = base_path / "config.yaml"
         config_path = base_path / f"config.{cls._environment.value}.yaml"
 
         if not config_path.exists():
-            config_path = base_path / "config.yaml"
+            config_path = base_config_path
 
         if not config_path.exists():
             raise FileNotFoundError(f"Configuration file not found at {config_path}")
 
         with open(config_path, "r") as f:
-            cls._config = yaml.safe_load(f)
+            cls._config = yaml.safe_load(f) or {}
+
+        # Environment files only override what differs from the base config
+        if config_path != base_config_path and base_config_path.exists():
+            with open(base_config_path, "r") as f:
+                base_config = yaml.safe_load(f) or {}
+            cls._config = cls._merge(base_config, cls._config)
+        cls._loaded = True
 
         # Validate all configuration values
         for key in cls._validations:
@@ -128,9 +137,33 @@ class Config:
             if not cls._validate_value(key, value):
                 raise ValueError(f"Invalid configuration value for {key}")
 
+    @classmethod
+    def ensure_loaded(cls) -> None:
+        """Load configuration on first use instead of at import time.
+
+        Uses the APP_ENV environment variable when set, otherwise production.
+        Does nothing once any configuration has been loaded.
+        """
+        if cls._loaded:
+            return
+        env = os.getenv("APP_ENV")
+        cls.load_config(Environment(env) if env else Environment.PRODUCTION)
+
+    @classmethod
+    def _merge(cls, base: Dict[str, Any], override: Dict[str, Any]) -> Dict[str, Any]:
+        """Recursively merge override values on top of base values."""
+        merged = dict(base)
+        for key, value in override.items():
+            if isinstance(value, dict) and isinstance(merged.get(key), dict):
+                merged[key] = cls._merge(merged[key], value)
+            else:
+                merged[key] = value
+        return merged
+
     @classmethod
     def get(cls, key: str, default: Any = None) -> Any:
         """Get configuration value by key."""
+        cls.ensure_loaded()
         keys = key.split(".")
         value = cls._config
 
@@ -144,6 +177,7 @@ class Config:
     @classmethod
     def set(cls, key: str, value: Any) -> None:
         """Set configuration value with validation."""
+        cls.ensure_loaded()
         if not cls._validate_value(key, value):
             raise ValueError(f"Invalid value for {key}: {value}")
 
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Stages in dependency order: each one's inputs include the previous output
+STAGES = ("audio", "video", "metadata")
+
+BUILD = "build"
+REUSE = "reuse"
+ADOPT = "adopt"
+
+_file_hash_memo: Dict[Tuple[str, int, int], str] = {}
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def hash_file(path: str) -> str:
+    """Hash a file's bytes, memoized on (path, size, mtime) within a process."""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _file_hash_memo:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        _file_hash_memo[memo_key] = digest.hexdigest()
+    return _file_hash_memo[memo_key]
+
+
+def fingerprint(inputs: Dict[str, Any]) -> str:
+    """Stable hash of a stage's inputs."""
+    return hash_text(json.dumps(inputs, sort_keys=True, default=str))
+
+
+class BuildManifest:
+    """Per-script record of the input fingerprint each stage was built from.
+
+    One small JSON file per script keeps parallel batch workers from
+    contending on a shared manifest.
+    """
+
+    def __init__(self, name: str, directory: str):
+        self.name = name
+        self.path = os.path.join(directory, f"{name}.json")
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.stages = json.load(f).get("stages", {})
+            except (OSError, json.JSONDecodeError):
+                self.stages = {}
+
+    def decide(
+        self,
+        stage: str,
+        stage_fingerprint: str,
+        output_exists: bool,
+        output_complete: Optional[Callable[[], bool]] = None,
+    ) -> Tuple[str, str]:
+        """Return (action, reason) for a stage given its current inputs.
+
+        output_complete is only called before adopting an artifact the
+        manifest has no record of.
+        """
+        record = self.stages.get(stage)
+        if not output_exists:
+            return BUILD, "output missing"
+        if record is None:
+            # Artifacts from before the manifest existed are trusted once
+            # rather than paying to rebuild the whole catalog, unless they
+            # were left half-written
+            if output_complete is not None and not output_complete():
+                return BUILD, "existing output incomplete"
+            return ADOPT, "adopting existing output"
+        if record.get("fingerprint") != stage_fingerprint:
+            return BUILD, "inputs changed"
+        return REUSE, "up to date"
+
+    def record(
+        self, stage: str, stage_fingerprint: str, output: Optional[str] = None
+    ) -> None:
+        self.stages[stage] = {
+            "fingerprint": stage_fingerprint,
+            "output": output,
+            "built_at": datetime.now().isoformat(),
+        }
+        self.save()
+
+    def invalidate(self, stage: str) -> None:
+        if self.stages.pop(stage, None) is not None:
+            self.save()
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"name": self.name, "stages": self.stages}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def format_plan(script_path: str, plan: Dict[str, Dict[str, Any]]) -> str:
+    parts = [f"{stage}={plan[stage]['action']}" for stage in STAGES if stage in plan]
+    reasons = [
+        f"{stage}: {plan[stage]['reason']}"
+        for stage in STAGES
+        if stage in plan and plan[stage]["action"] == BUILD
+    ]
+    line = f"{script_path}: {', '.join(parts)}"
+    if reasons:
+        line += f" ({'; '.join(reasons)})"
+    return line
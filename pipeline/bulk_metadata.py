@@ -0,0 +1,194 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from glob import glob
+
+from config import Config
+from pipeline.generate_metadata import (
+    completion_limit,
+    count_tokens,
+    fallback_metadata,
+    get_async_client,
+    get_metadata_cache,
+    get_metadata_settings,
+    metadata_cache_key,
+    metadata_request,
+    parse_response,
+)
+
+
+class TokenBucket:
+    """Async token bucket refilled continuously at rate_per_minute.
+
+    Waiters are served in arrival order, so one large request can't be
+    starved by a stream of small ones.
+    """
+
+    def __init__(self, rate_per_minute, capacity=None, clock=time.monotonic):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = float(self.capacity)
+        self.clock = clock
+        self.updated = clock()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1):
+        # A request bigger than the bucket could never be admitted otherwise
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+def estimate_tokens(messages, model=None):
+    # Only used for budgeting, so a few tokens of per-message overhead are
+    # left out
+    return sum(count_tokens(m["content"], model) for m in messages)
+
+
+def retry_after_seconds(error):
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def get_bulk_settings():
+    return {
+        "concurrency": Config.get("api.openai.bulk.concurrency", 8),
+        "requests_per_minute": Config.get("api.openai.bulk.requests_per_minute", 500),
+        "tokens_per_minute": Config.get("api.openai.bulk.tokens_per_minute", 40000),
+        "max_retries": Config.get("api.openai.bulk.max_retries", 5),
+    }
+
+
+async def generate_metadata_bulk_async(
+    scripts,
+    concurrency=None,
+    requests_per_minute=None,
+    tokens_per_minute=None,
+    max_retries=None,
+    refresh=False,
+    client=None,
+):
+    """Generate metadata for many scripts, returned in input order.
+
+    Keeps up to `concurrency` requests in flight while staying inside the
+    requests- and tokens-per-minute budgets; 429s are retried with
+    exponential backoff (or the server's Retry-After), and replies that
+    fail validation are retried like generate_video_metadata does.
+    """
+    from openai import RateLimitError
+
+    bulk = get_bulk_settings()
+    concurrency = concurrency or bulk["concurrency"]
+    max_retries = bulk["max_retries"] if max_retries is None else max_retries
+    request_bucket = TokenBucket(requests_per_minute or bulk["requests_per_minute"])
+    token_bucket = TokenBucket(tokens_per_minute or bulk["tokens_per_minute"])
+
+    if client is None:
+        # 429s must reach the token buckets' backoff below, not be
+        # retried inside the SDK behind the rate limiter's back
+        client = get_async_client(max_retries=0)
+
+    settings = get_metadata_settings()
+    cache = get_metadata_cache() if Config.get("cache.metadata.enabled", True) else None
+    semaphore = asyncio.Semaphore(concurrency)
+    results = [None] * len(scripts)
+
+    async def generate_one(index, script_text):
+        key = metadata_cache_key(script_text, settings) if cache else None
+        if cache and not refresh:
+            cached = cache.get_bytes(key)
+            if cached is not None:
+                results[index] = json.loads(cached)
+                return
+
+        request = metadata_request(script_text, settings)
+        budget = estimate_tokens(
+            request["messages"], settings["model"]
+        ) + completion_limit(settings)
+        invalid = 0
+
+        async with semaphore:
+            for attempt in range(max_retries + settings["retries"] + 1):
+                await request_bucket.acquire(1)
+                await token_bucket.acquire(budget)
+                try:
+                    response = await client.chat.completions.create(**request)
+                    metadata = parse_response(response)
+                except ValueError as e:
+                    invalid += 1
+                    print(f"⚠️ Unusable metadata response for script {index}: {e}")
+                    if invalid > settings["retries"]:
+                        break
+                    continue
+                except RateLimitError as e:
+                    rate_limited = attempt - invalid
+                    if rate_limited == max_retries:
+                        print(f"❌ Rate limited on script {index}, giving up: {e}")
+                        break
+                    delay = retry_after_seconds(e) or min(60, 2**rate_limited)
+                    delay += random.uniform(0, delay / 4)
+                    print(f"⏳ Rate limited on script {index}, retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                    continue
+                except Exception as e:
+                    print(f"Error generating metadata for script {index}: {e}")
+                    break
+
+                if cache:
+                    cache.put_bytes(key, json.dumps(metadata).encode("utf-8"))
+                results[index] = metadata
+                return
+
+        results[index] = fallback_metadata()
+
+    await asyncio.gather(
+        *(generate_one(i, script_text) for i, script_text in enumerate(scripts))
+    )
+    return results
+
+
+def generate_metadata_bulk(scripts, **kwargs):
+    return asyncio.run(generate_metadata_bulk_async(scripts, **kwargs))
+
+
+if __name__ == "__main__":
+    from pipeline.text_to_speech import get_script_text
+
+    parser = argparse.ArgumentParser(description="Backfill metadata for many scripts")
+    parser.add_argument("paths", nargs="*", help="script files (default: scripts/*.md)")
+    parser.add_argument("--concurrency", type=int, default=None)
+    parser.add_argument("--refresh", action="store_true", help="ignore cached results")
+    args = parser.parse_args()
+
+    paths = args.paths or sorted(glob(os.path.join("scripts", "*.md")))
+    started = time.perf_counter()
+    results = generate_metadata_bulk(
+        [get_script_text(path) for path in paths],
+        concurrency=args.concurrency,
+        refresh=args.refresh,
+    )
+    for path, metadata in zip(paths, results):
+        print(json.dumps({"script": path, **metadata}))
+    elapsed = time.perf_counter() - started
+    print(f"✅ Generated metadata for {len(paths)} scripts in {elapsed:.1f}s")
@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class DiskCache:
+    """Content-addressed file cache with LRU eviction by total size.
+
+    Entries are plain files named by key. A hit bumps the file's access
+    time, which is what eviction orders by; the modification time stays
+    the write time so an optional TTL can expire entries independently.
+    Counters and the size total are safe to share between threads.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: Optional[int] = None,
+        ttl: Optional[float] = None,
+        suffix: str = "",
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        self._size: Optional[int] = None
+        # Chunked TTS calls the cache from a thread pool
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        return hashlib.sha256(
+            json.dumps(parts, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}{self.suffix}")
+
+    def get_path(self, key: str) -> Optional[str]:
+        path = self.path_for(key)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self._count(hit=False)
+            return None
+
+        if self.ttl is not None and time.time() - stat.st_mtime > self.ttl:
+            self._remove(path, stat.st_size)
+            self._count(hit=False)
+            return None
+
+        # Record the use for LRU ordering without touching the write time
+        try:
+            os.utime(path, (time.time(), stat.st_mtime))
+        except FileNotFoundError:
+            # Evicted by another thread since the stat
+            self._count(hit=False)
+            return None
+        self._count(hit=True)
+        return path
+
+    def _count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        path = self.get_path(key)
+        if path is None:
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def put_bytes(self, key: str, data: bytes) -> str:
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        self._commit(tmp_path, path)
+        return path
+
+    def put_file(self, key: str, source_path: str) -> str:
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        os.close(fd)
+        shutil.copyfile(source_path, tmp_path)
+        self._commit(tmp_path, path)
+        return path
+
+    def delete(self, key: str) -> None:
+        path = self.path_for(key)
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            return
+        self._remove(path, size)
+
+    def stats(self) -> Dict[str, int]:
+        entries = self._entries()
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+        }
+
+    def evict(self) -> int:
+        """Drop least recently used entries until under max_bytes."""
+        with self._lock:
+            entries = self._entries()
+            self._size = sum(size for _, size, _ in entries)
+            if self.max_bytes is None or self._size <= self.max_bytes:
+                return 0
+
+            removed = 0
+            for path, size, _ in sorted(entries, key=lambda entry: entry[2]):
+                if self._size <= self.max_bytes:
+                    break
+                self._remove(path, size)
+                removed += 1
+            return removed
+
+    def _commit(self, tmp_path: str, path: str) -> None:
+        with self._lock:
+            try:
+                previous = os.path.getsize(path)
+            except FileNotFoundError:
+                previous = 0
+            os.replace(tmp_path, path)
+
+            if self.max_bytes is None:
+                return
+            if self._size is None:
+                self.evict()
+            else:
+                self._size += os.path.getsize(path) - previous
+                if self._size > self.max_bytes:
+                    self.evict()
+
+    def _remove(self, path: str, size: int) -> None:
+        with self._lock:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                return
+            if self._size is not None:
+                self._size -= size
+
+    def _entries(self) -> List[Tuple[str, int, float]]:
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((path, stat.st_size, stat.st_atime))
+        return entries
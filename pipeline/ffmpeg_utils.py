@@ -0,0 +1,110 @@
+import os
+import re
+import shutil
+import subprocess
+from typing import List, Optional
+
+DURATION_PATTERN = re.compile(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+
+
+class FFmpegError(RuntimeError):
+    pass
+
+
+def ffmpeg_binary() -> str:
+    # Same override moviepy_conf.py uses, so both render engines agree
+    return os.getenv("FFMPEG_BINARY", "ffmpeg")
+
+
+def ffprobe_binary() -> Optional[str]:
+    explicit = os.getenv("FFPROBE_BINARY")
+    if explicit:
+        return explicit
+    return shutil.which("ffprobe")
+
+
+def ffmpeg_available() -> bool:
+    binary = ffmpeg_binary()
+    return os.path.isfile(binary) or shutil.which(binary) is not None
+
+
+def run_ffmpeg(args: List[str]) -> None:
+    cmd = [ffmpeg_binary(), "-hide_banner", "-loglevel", "error", "-y", *args]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise FFmpegError(
+            f"ffmpeg exited with {result.returncode}: {result.stderr.strip()}"
+        )
+
+
+def probe_duration(path: str) -> float:
+    """Return the duration of a media file in seconds."""
+    ffprobe = ffprobe_binary()
+    if ffprobe:
+        result = subprocess.run(
+            [
+                ffprobe,
+                "-v",
+                "error",
+                "-show_entries",
+                "format=duration",
+                "-of",
+                "default=noprint_wrappers=1:nokey=1",
+                path,
+            ],
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode == 0 and result.stdout.strip():
+            return float(result.stdout.strip())
+
+    # No ffprobe: ffmpeg prints the container duration when given only an input
+    result = subprocess.run(
+        [ffmpeg_binary(), "-hide_banner", "-i", path], capture_output=True, text=True
+    )
+    match = DURATION_PATTERN.search(result.stderr)
+    if not match:
+        raise FFmpegError(f"Could not determine duration of {path}")
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def media_is_complete(path: str) -> bool:
+    """Whether a media file decodes to the end without errors.
+
+    A file cut off mid-write often still has a readable header, so this
+    decodes it fully instead of probing. Truncated MP4s fail this; MP3s are
+    a plain run of frames and can't be told apart. Without ffmpeg the file
+    is given the benefit of the doubt.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return False
+    if not ffmpeg_available():
+        return True
+    result = subprocess.run(
+        [ffmpeg_binary(), "-hide_banner", "-v", "error", "-i", path, "-f", "null", "-"],
+        capture_output=True,
+        text=True,
+    )
+    return result.returncode == 0 and not result.stderr.strip()
+
+
+def transcode_bytes(data: bytes, output_args: List[str]) -> bytes:
+    """Pipe media bytes through ffmpeg and return the encoded output."""
+    cmd = [
+        ffmpeg_binary(),
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-i",
+        "pipe:0",
+        *output_args,
+        "pipe:1",
+    ]
+    result = subprocess.run(cmd, input=data, capture_output=True)
+    if result.returncode != 0:
+        raise FFmpegError(
+            f"ffmpeg exited with {result.returncode}: "
+            f"{result.stderr.decode(errors='replace').strip()}"
+        )
+    return result.stdout
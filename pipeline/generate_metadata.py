@@ -1,20 +1,109 @@
+import functools
 import json
 import os
 import re
+from typing import List
 
 from dotenv import load_dotenv
-from openai import OpenAI
 
-from config import Config, Environment
+from config import Config
+from pipeline.disk_cache import DiskCache
 
-# Load configuration and environment variables
-Config.load_config(Environment.PRODUCTION)
-load_dotenv()
+_client = None
+_metadata_cache = None
 
-# Initialize OpenAI client with configured settings
-client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY"), timeout=Config.get("api.openai.timeout", 30)
-)
+
+FALLBACK_METADATA = {
+    "title": "AI Video",
+    "description": "Generated by Try This AI",
+    "tags": ["ai", "video", "generation"],
+}
+
+# Bump whenever the prompt below changes so cached/built metadata is redone
+PROMPT_VERSION = 2
+
+# Models that accept response_format={"type": "json_schema"}; older chat
+# models only take json_object, and the original gpt-4 takes neither
+JSON_SCHEMA_MODELS = ("gpt-4o", "gpt-4.1", "gpt-5", "o1", "o3", "o4")
+JSON_OBJECT_MODELS = ("gpt-3.5-turbo", "gpt-4-turbo", "gpt-4-1106", "gpt-4-0125")
+# Reasoning models reject temperature and max_tokens; their cap is
+# max_completion_tokens, which also covers the hidden reasoning
+REASONING_MODELS = ("gpt-5", "o1", "o3", "o4")
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+MARKDOWN_NOISE = re.compile(r"^\s{0,3}(#{1,6}|[-*+>]|\d+\.)\s+|[*_`]{1,3}", re.M)
+
+
+def get_client():
+    # Created on first use so importing the pipeline doesn't pay for the
+    # OpenAI SDK or require an API key
+    global _client
+    if _client is None:
+        from openai import OpenAI
+
+        load_dotenv()
+        _client = OpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            timeout=Config.get("api.openai.timeout", 30),
+        )
+    return _client
+
+
+def get_async_client(**kwargs):
+    """A new AsyncOpenAI client, configured like get_client().
+
+    Not shared: an async client belongs to the event loop it first ran
+    on, and each bulk run starts its own loop.
+    """
+    from openai import AsyncOpenAI
+
+    load_dotenv()
+    return AsyncOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        timeout=Config.get("api.openai.timeout", 30),
+        **kwargs,
+    )
+
+
+def get_metadata_settings():
+    settings = {
+        "model": Config.get("api.openai.model"),
+        "temperature": Config.get("api.openai.temperature", 0.7),
+        "max_tokens": Config.get("api.openai.metadata.max_tokens", 300),
+        "mode": Config.get("api.openai.metadata.mode", "compact"),
+        "script_token_budget": Config.get(
+            "api.openai.metadata.script_token_budget", 1200
+        ),
+        "response_format": Config.get("api.openai.metadata.response_format", "auto"),
+        "retries": Config.get("api.openai.metadata.retries", 1),
+        "prompt_version": PROMPT_VERSION,
+    }
+    if is_reasoning_model(settings["model"]):
+        # Only set for these models so other models' cache keys don't change
+        settings["max_completion_tokens"] = Config.get(
+            "api.openai.metadata.max_completion_tokens", 2000
+        )
+    return settings
+
+
+@functools.lru_cache(maxsize=None)
+def _get_encoding(model):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text, model=None):
+    """Count tokens with tiktoken when installed, else estimate ~4 chars each."""
+    encoding = _get_encoding(model or "gpt-4")
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
 
 
 def is_short_form(script_text):
@@ -22,75 +111,258 @@ def is_short_form(script_text):
     return len(script_text.split()) < max_words
 
 
-def generate_video_metadata(script_text):
-    # Get configuration values
+def compact_script(script_text, budget, model=None):
+    """Shrink a script to roughly `budget` tokens for the metadata prompt.
+
+    Titles and tags mostly come from the hook and the point of each
+    section, so long scripts keep their opening paragraph plus the first
+    sentence of every later paragraph, in order, until the budget is spent.
+    """
+    text = MARKDOWN_NOISE.sub("", script_text)
+    paragraphs = [" ".join(p.split()) for p in re.split(r"\n\s*\n", text)]
+    paragraphs = [p for p in paragraphs if p]
+    compacted = "\n\n".join(paragraphs)
+    if not budget or count_tokens(compacted, model) <= budget:
+        return compacted
+
+    pieces = [paragraphs[0]] + [SENTENCE_END.split(p)[0] for p in paragraphs[1:]]
+    kept = []
+    used = 0
+    for piece in pieces:
+        cost = count_tokens(piece, model)
+        if used + cost > budget:
+            if not kept:
+                # A single huge opening paragraph: keep its leading words
+                words = piece.split()
+                kept.append(" ".join(words[: max(1, len(words) * budget // cost)]))
+            break
+        kept.append(piece)
+        used += cost
+    return "\n".join(kept)
+
+
+def build_system_prompt():
+    # Identical for every script so the provider can reuse the cached prefix
     channel_name = Config.get("youtube.channel_name", "Try This AI")
     max_title_length = Config.get("youtube.metadata.max_title_length", 100)
-    max_description_length = Config.get("youtube.metadata.max_description_length", 5000)
-    max_tags = Config.get("youtube.metadata.max_tags", 500)
 
-    prompt = f"""
-You're writing YouTube metadata for a short, punchy, faceless AI channel called \"{channel_name}\".
+    intro = (
+        "You write YouTube metadata for a short, punchy, faceless AI channel "
+        f'called "{channel_name}".'
+    )
+    return f"""{intro}
 
 The tone should be:
 - Bold and attention-grabbing
 - Tailored for dev-curious viewers
 - Written in plain English
 - Avoid clickbait, but keep it edgy
-- {max_title_length} characters or less for titles
 
-This is for a { "YouTube Short" if is_short_form(script_text) else "full-length video" }.
+Reply with only a JSON object with these keys:
+- "title": string, {max_title_length} characters or less
+- "description": 1-2 sentence summary with a subtle CTA to try the tool or idea
+- "tags": array of 5-15 short lowercase tags"""
 
-Based on this script:
-\"\"\"
-{script_text}
-\"\"\"
 
-Return JSON:
-{{
-  "title": "string (max {max_title_length} characters)",
-  "description": "1-2 sentence summary with a subtle CTA to try the tool or idea",
-  "tags": ["tag1", "tag2", "..."] (max {max_tags} tags)
-}}
-"""
+def build_metadata_messages(script_text, settings=None):
+    settings = settings or get_metadata_settings()
+    script = script_text.strip()
+    if settings["mode"] == "compact":
+        script = compact_script(
+            script_text, settings["script_token_budget"], settings["model"]
+        )
+    video_type = "YouTube Short" if is_short_form(script_text) else "full-length video"
 
-    try:
-        response = client.chat.completions.create(
-            model=Config.get("api.openai.model"),
-            messages=[{"role": "user", "content": prompt}],
-            temperature=Config.get("api.openai.temperature", 0.7),
-            max_tokens=Config.get("api.openai.max_tokens", 2000),
+    return [
+        {"role": "system", "content": build_system_prompt()},
+        {
+            "role": "user",
+            "content": f'This is for a {video_type}.\n\nScript:\n"""\n{script}\n"""',
+        },
+    ]
+
+
+@functools.lru_cache(maxsize=None)
+def get_metadata_model():
+    import pydantic
+
+    # model_json_schema / model_validate are pydantic 2 APIs; under 1.x the
+    # import below fails with a less helpful message
+    if int(pydantic.VERSION.split(".")[0]) < 2:
+        raise ImportError(
+            f"Metadata validation needs pydantic>=2.0.0 (found {pydantic.VERSION}); "
+            "pip install -r requirements.txt"
         )
+    from pydantic import BaseModel, ConfigDict, field_validator
 
-        raw = response.choices[0].message.content
+    class VideoMetadata(BaseModel):
+        model_config = ConfigDict(extra="forbid")
 
-        # Extract JSON object from GPT response, ignoring markdown code fencing
-        json_match = re.search(r"\{.*\}", raw, re.DOTALL)
-        if json_match:
-            metadata = json.loads(json_match.group())
+        title: str
+        description: str
+        tags: List[str]
 
-            # Validate and truncate metadata based on configuration
-            if len(metadata["title"]) > max_title_length:
-                metadata["title"] = metadata["title"][:max_title_length]
+        @field_validator("title", "description")
+        @classmethod
+        def not_blank(cls, value):
+            value = value.strip()
+            if not value:
+                raise ValueError("must not be empty")
+            return value
 
-            if len(metadata["description"]) > max_description_length:
-                metadata["description"] = metadata["description"][
-                    :max_description_length
-                ]
+        @field_validator("tags")
+        @classmethod
+        def clean_tags(cls, value):
+            return [tag.strip() for tag in value if tag.strip()]
 
-            if len(metadata["tags"]) > max_tags:
-                metadata["tags"] = metadata["tags"][:max_tags]
+    return VideoMetadata
 
-            return metadata
+
+def get_response_format(settings):
+    response_format = settings["response_format"]
+    if response_format == "auto":
+        model = settings["model"] or ""
+        if model.startswith(JSON_SCHEMA_MODELS):
+            response_format = "json_schema"
+        elif model.startswith(JSON_OBJECT_MODELS):
+            response_format = "json_object"
         else:
-            raise ValueError("No valid JSON found in GPT response")
-    except Exception as e:
-        print(f"Error generating metadata: {str(e)}")
+            response_format = "none"
+
+    if response_format == "json_schema":
         return {
-            "title": "AI Video",
-            "description": "Generated by Try This AI",
-            "tags": ["ai", "video", "generation"],
+            "type": "json_schema",
+            "json_schema": {
+                "name": "video_metadata",
+                "strict": True,
+                "schema": get_metadata_model().model_json_schema(),
+            },
         }
+    if response_format == "json_object":
+        return {"type": "json_object"}
+    return None
+
+
+def is_reasoning_model(model):
+    return (model or "").startswith(REASONING_MODELS)
+
+
+def completion_limit(settings):
+    """The most completion tokens a metadata request may use."""
+    if is_reasoning_model(settings["model"]):
+        return settings["max_completion_tokens"]
+    return settings["max_tokens"]
+
+
+def metadata_request(script_text, settings):
+    """Keyword arguments for chat.completions.create."""
+    request = {
+        "model": settings["model"],
+        "messages": build_metadata_messages(script_text, settings),
+    }
+    if is_reasoning_model(settings["model"]):
+        request["max_completion_tokens"] = settings["max_completion_tokens"]
+    else:
+        request["temperature"] = settings["temperature"]
+        request["max_tokens"] = settings["max_tokens"]
+    response_format = get_response_format(settings)
+    if response_format:
+        request["response_format"] = response_format
+    return request
+
+
+def parse_metadata(raw):
+    """Validate a JSON reply against the metadata schema; raises ValueError."""
+    from pydantic import ValidationError
+
+    max_title_length = Config.get("youtube.metadata.max_title_length", 100)
+    max_description_length = Config.get("youtube.metadata.max_description_length", 5000)
+    max_tags = Config.get("youtube.metadata.max_tags", 500)
+
+    # Structured output is bare JSON; without it, skip any prose or code
+    # fence before the object
+    start = (raw or "").find("{")
+    if start == -1:
+        raise ValueError("No JSON object in response")
+    try:
+        data, _ = json.JSONDecoder().raw_decode(raw[start:])
+        metadata = get_metadata_model().model_validate(data).model_dump()
+    except (json.JSONDecodeError, ValidationError) as e:
+        raise ValueError(f"Invalid metadata response: {e}") from e
+
+    metadata["title"] = metadata["title"][:max_title_length]
+    metadata["description"] = metadata["description"][:max_description_length]
+    metadata["tags"] = metadata["tags"][:max_tags]
+    return metadata
+
+
+def parse_response(response):
+    choice = response.choices[0]
+    if getattr(choice, "finish_reason", None) == "length":
+        raise ValueError("Response was cut off by max_tokens")
+    return parse_metadata(choice.message.content)
+
+
+def get_metadata_cache():
+    global _metadata_cache
+    if _metadata_cache is None:
+        _metadata_cache = DiskCache(
+            Config.get("cache.metadata.directory", ".cache/metadata"),
+            max_bytes=Config.get("cache.metadata.max_size", 52428800),
+            ttl=Config.get("cache.metadata.ttl", 2592000),
+            suffix=".json",
+        )
+    return _metadata_cache
+
+
+def metadata_cache_key(script_text, settings):
+    return DiskCache.make_key(
+        script_text,
+        settings,
+        # Channel name and length limits are baked into the prompt as well
+        build_system_prompt(),
+    )
+
+
+def fallback_metadata():
+    return {**FALLBACK_METADATA, "tags": list(FALLBACK_METADATA["tags"])}
+
+
+def generate_video_metadata(script_text, refresh=False):
+    """Generate title, description and tags for a script.
+
+    Responses are cached per script text and metadata settings; pass
+    refresh=True to skip the cache and ask the model again. A reply that
+    fails validation is retried up to api.openai.metadata.retries times
+    before falling back to placeholder metadata.
+    """
+    settings = get_metadata_settings()
+    cache = get_metadata_cache() if Config.get("cache.metadata.enabled", True) else None
+    key = metadata_cache_key(script_text, settings) if cache else None
+
+    if cache and not refresh:
+        cached = cache.get_bytes(key)
+        if cached is not None:
+            print("♻️ Reusing cached metadata")
+            return json.loads(cached)
+
+    request = metadata_request(script_text, settings)
+    for attempt in range(settings["retries"] + 1):
+        try:
+            metadata = parse_response(get_client().chat.completions.create(**request))
+            break
+        except ValueError as e:
+            print(f"⚠️ Unusable metadata response (attempt {attempt + 1}): {e}")
+        except Exception as e:
+            print(f"Error generating metadata: {str(e)}")
+            return fallback_metadata()
+    else:
+        print("❌ Falling back to placeholder metadata")
+        return fallback_metadata()
+
+    if cache:
+        cache.put_bytes(key, json.dumps(metadata).encode("utf-8"))
+    return metadata
 
 
 if __name__ == "__main__":
@@ -0,0 +1,109 @@
+import math
+from typing import Dict, Optional, Tuple
+
+from config import Config
+
+_detector = None
+
+
+def get_growth_settings():
+    return {
+        "fast_halflife": Config.get("youtube.stats.growth.fast_halflife_hours", 1),
+        "slow_halflife": Config.get("youtube.stats.growth.slow_halflife_hours", 48),
+        "z_threshold": Config.get("youtube.stats.growth.z_threshold", 3.0),
+        "min_rate": Config.get("youtube.stats.growth.min_rate", 10),
+        "warmup": Config.get("youtube.stats.growth.warmup_samples", 4),
+        "cooldown": Config.get("youtube.stats.growth.cooldown_hours", 6),
+        "escalation": Config.get("youtube.stats.growth.escalation", 2.0),
+    }
+
+
+def decay(dt_hours: float, halflife_hours: float) -> float:
+    """EWMA weight for a new sample that arrives dt_hours after the last.
+
+    Time-based rather than per-sample, so irregular polling (minutes for
+    hot videos, a day for old ones) weighs history the same way.
+    """
+    return 1 - math.exp(-math.log(2) * dt_hours / halflife_hours)
+
+
+class GrowthDetector:
+    """Flags view-rate surges against each video's own baseline.
+
+    State per video is a handful of numbers: the last sample, a fast EWMA
+    of views/hour (what's happening now), and a slow EWMA mean and
+    variance (what's normal for this video). A sample alerts when the
+    fast rate sits z_threshold standard deviations above the slow mean
+    and above min_rate. Because the fast rate is smoothed, one noisy
+    sample doesn't trip it but a slow build-up does. After an alert, the
+    same video stays quiet for cooldown hours unless its rate reaches
+    escalation times the rate that alerted.
+    """
+
+    def __init__(self, settings: Optional[Dict] = None):
+        self.settings = settings or get_growth_settings()
+
+    def update(
+        self, state: Optional[Dict], t: float, views: int
+    ) -> Tuple[Dict, Optional[Dict]]:
+        """Fold one (epoch seconds, total views) sample in; O(1).
+
+        Returns the new state and an alert dict, or None.
+        """
+        if not state or "t" not in state:
+            return {"t": t, "views": views, "n": 0}, None
+        dt = (t - state["t"]) / 3600
+        if dt <= 0:
+            return state, None
+
+        s = self.settings
+        rate = max(0.0, (views - state["views"]) / dt)
+        state = dict(state, t=t, views=views, n=state["n"] + 1)
+        if state["n"] == 1:
+            state.update(fast=rate, mean=rate, var=0.0)
+            return state, None
+
+        a = decay(dt, s["fast_halflife"])
+        state["fast"] += a * (rate - state["fast"])
+
+        # Score against the baseline before it absorbs this sample
+        mean, var = state["mean"], state["var"]
+        # Floor the spread so a perfectly steady video isn't hair-triggered
+        std = max(math.sqrt(var), 0.1 * mean, 1.0)
+        z = (state["fast"] - mean) / std
+
+        a = decay(dt, s["slow_halflife"])
+        diff = rate - mean
+        state["mean"] = mean + a * diff
+        state["var"] = (1 - a) * (var + a * diff * diff)
+
+        alert = None
+        if (
+            state["n"] >= s["warmup"]
+            and z >= s["z_threshold"]
+            and state["fast"] >= s["min_rate"]
+        ):
+            last = state.get("alerted_at")
+            cooled = last is None or (t - last) / 3600 >= s["cooldown"]
+            escalated = state["fast"] >= s["escalation"] * state.get("alerted_rate", 0)
+            if cooled or escalated:
+                state["alerted_at"] = t
+                # The smoothed rate is still climbing when a jump first
+                # alerts; measuring escalation from the raw sample keeps
+                # that climb from re-alerting
+                state["alerted_rate"] = max(state["fast"], rate)
+                alert = {
+                    "rate": round(rate, 1),
+                    "smoothed": round(state["fast"], 1),
+                    "baseline": round(mean, 1),
+                    "z": round(z, 1),
+                    "escalated": not cooled,
+                }
+        return state, alert
+
+
+def get_growth_detector() -> GrowthDetector:
+    global _detector
+    if _detector is None:
+        _detector = GrowthDetector()
+    return _detector
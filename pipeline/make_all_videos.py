@@ -1,11 +1,20 @@
+import argparse
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from glob import glob
 
-from make_video import render_video
+from config import Config
+from pipeline.build_manifest import ADOPT, BUILD, format_plan
+from pipeline.make_video import plan_render, render_video
 
 SCRIPT_DIR = "scripts"
 VIDEO_DIR = "video"
 
+# A job whose worker process dies is retried this many times on its own
+MAX_CRASH_RETRIES = 1
+
 
 def get_script_files():
     return glob(os.path.join(SCRIPT_DIR, "*.md"))
@@ -16,25 +25,203 @@ def get_video_path(script_path):
     return os.path.join(VIDEO_DIR, f"{base_name}.mp4")
 
 
-def main():
+def get_worker_count():
+    workers = Config.get("batch.workers", 0) or 0
+    return workers if workers > 0 else (os.cpu_count() or 1)
+
+
+def render_job(script_path):
+    # Runs inside a worker process; never lets an exception escape so one bad
+    # script can't take the rest of the batch down with it.
+    started = time.perf_counter()
+    try:
+        video_path = render_video(script_path)
+        return {
+            "script": script_path,
+            "ok": True,
+            "video": video_path,
+            "seconds": time.perf_counter() - started,
+            "error": None,
+        }
+    except Exception as e:
+        return {
+            "script": script_path,
+            "ok": False,
+            "video": None,
+            "seconds": time.perf_counter() - started,
+            "error": f"{type(e).__name__}: {e}",
+        }
+
+
+def crashed_result(script_path):
+    return {
+        "script": script_path,
+        "ok": False,
+        "video": None,
+        "seconds": 0.0,
+        "error": "worker process crashed",
+    }
+
+
+def run_pool(scripts, workers, job, results):
+    """Run jobs in one pool; return the ones whose pool broke under them."""
+    crashed = []
+    with ProcessPoolExecutor(max_workers=min(workers, len(scripts))) as pool:
+        futures = {pool.submit(job, path): path for path in scripts}
+        for future in as_completed(futures):
+            script_path = futures[future]
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                crashed.append(script_path)
+                continue
+            report_job(result)
+            results[script_path] = result
+    return crashed
+
+
+def run_isolated(scripts, job, results):
+    """Run each job alone in its own one-process pool, several at a time.
+
+    A job that kills its worker then only breaks its own pool.
+    """
+    crashed = []
+    pools = {}
+    try:
+        for script_path in scripts:
+            pool = ProcessPoolExecutor(max_workers=1)
+            pools[pool.submit(job, script_path)] = (script_path, pool)
+        for future in as_completed(pools):
+            script_path = pools[future][0]
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                crashed.append(script_path)
+                continue
+            report_job(result)
+            results[script_path] = result
+    finally:
+        for _, pool in pools.values():
+            pool.shutdown()
+    return crashed
+
+
+def run_batch(scripts, workers, job=render_job):
+    if workers <= 1:
+        results = []
+        for script_path in scripts:
+            result = job(script_path)
+            report_job(result)
+            results.append(result)
+        return results
+
+    results = {}
+    # A worker that dies hard (segfault, OOM kill) fails every job still
+    # queued in the shared pool, so those are rerun one per pool, where
+    # only the job that really crashes is charged a retry
+    pending = run_pool(scripts, workers, job, results)
+    attempts = {script_path: 0 for script_path in pending}
+    while pending:
+        print(f"🔁 Retrying {len(pending)} job(s) in isolation after a worker crash")
+        crashed = []
+        for start in range(0, len(pending), workers):
+            crashed += run_isolated(pending[start : start + workers], job, results)
+
+        pending = []
+        for script_path in crashed:
+            attempts[script_path] += 1
+            if attempts[script_path] > MAX_CRASH_RETRIES:
+                result = crashed_result(script_path)
+                report_job(result)
+                results[script_path] = result
+            else:
+                pending.append(script_path)
+
+    return [results[script_path] for script_path in scripts]
+
+
+def report_job(result):
+    if result["ok"]:
+        print(f"✅ Rendered {result['video']} in {result['seconds']:.1f}s")
+    else:
+        print(f"❌ Failed to render {result['script']}: {result['error']}")
+
+
+def print_summary(results, elapsed):
+    succeeded = [r for r in results if r["ok"]]
+    failed = [r for r in results if not r["ok"]]
+
+    print("\n📊 Batch render summary")
+    print(f"   {len(succeeded)} succeeded, {len(failed)} failed in {elapsed:.1f}s")
+    for result in sorted(results, key=lambda r: r["seconds"], reverse=True):
+        status = "✅" if result["ok"] else "❌"
+        print(f"   {status} {result['seconds']:7.1f}s  {result['script']}")
+    for result in failed:
+        print(f"   ↳ {result['script']}: {result['error']}")
+
+
+def needs_build(plan):
+    return any(stage["action"] == BUILD for stage in plan.values())
+
+
+def main(workers=None, dry_run=False):
     scripts = get_script_files()
 
     if not scripts:
         print("⚠️ No markdown scripts found in /scripts.")
-        return
+        return []
 
+    todo = []
     for script_path in scripts:
-        video_path = get_video_path(script_path)
+        try:
+            plan = plan_render(script_path)
+        except Exception as e:
+            print(f"❌ Failed to plan {script_path}: {e}")
+            continue
 
-        if os.path.exists(video_path):
-            print(f"✅ Skipping already rendered: {video_path}")
+        if dry_run:
+            print(format_plan(script_path, plan))
+        elif not needs_build(plan):
+            if any(stage["action"] == ADOPT for stage in plan.values()):
+                # Only records fingerprints for pre-manifest artifacts
+                try:
+                    render_video(script_path)
+                except Exception as e:
+                    print(f"❌ Failed to adopt outputs for {script_path}: {e}")
+                    continue
+            print(f"✅ Up to date: {get_video_path(script_path)}")
             continue
 
-        try:
-            render_video(script_path)
-        except Exception as e:
-            print(f"❌ Failed to render {script_path}: {e}")
+        if needs_build(plan):
+            todo.append(script_path)
+
+    if dry_run:
+        print(f"\n🧾 Dry run: {len(todo)} of {len(scripts)} script(s) would rebuild")
+        return []
+
+    if not todo:
+        return []
+
+    workers = workers or get_worker_count()
+    print(f"🚀 Rendering {len(todo)} script(s) with {workers} worker(s)...")
+    started = time.perf_counter()
+    results = run_batch(todo, workers)
+    print_summary(results, time.perf_counter() - started)
+    return results
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Render every script in /scripts")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="parallel render processes (default: batch.workers or CPU count)",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="print which stages would rebuild for each script and exit",
+    )
+    args = parser.parse_args()
+    main(workers=args.workers, dry_run=args.dry_run)
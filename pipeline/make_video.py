@@ -1,37 +1,68 @@
-import json
 import os
 from datetime import datetime
 
-from dotenv import load_dotenv
-from moviepy.editor import AudioFileClip, CompositeVideoClip, ImageClip, TextClip
-
-from config import Config, Environment
-from pipeline.generate_metadata import generate_video_metadata
-from pipeline.text_to_speech import run_tts
-
-# Load configuration and environment variables
-Config.load_config(Environment.PRODUCTION)
-load_dotenv()
-
-# Get configuration values
-SCRIPT_DIR = Config.get("files.directories.scripts")
-AUDIO_DIR = Config.get("files.directories.audio")
-VIDEO_DIR = Config.get("files.directories.video")
-THUMBNAIL_DIR = Config.get("files.directories.thumbnails")
-METADATA_LOG = os.path.join(VIDEO_DIR, "metadata.jsonl")
-DEFAULT_BACKGROUND_IMG = os.path.join(THUMBNAIL_DIR, "thumb_001_A.png")
-
-# Video settings from config
-VIDEO_SETTINGS = {
-    "width": Config.get("video.resolution.width"),
-    "height": Config.get("video.resolution.height"),
-    "fps": Config.get("video.fps"),
-    "codec": Config.get("video.codec"),
-    "bitrate": Config.get("video.bitrate"),
-    "audio_bitrate": Config.get("video.audio.bitrate"),
-    "audio_sample_rate": Config.get("video.audio.sample_rate"),
-    "audio_channels": Config.get("video.audio.channels"),
-}
+from config import Config
+from pipeline.build_manifest import (
+    ADOPT,
+    BUILD,
+    BuildManifest,
+    fingerprint,
+    hash_file,
+    hash_text,
+)
+from pipeline.ffmpeg_utils import (
+    FFmpegError,
+    ffmpeg_available,
+    media_is_complete,
+    probe_duration,
+    run_ffmpeg,
+)
+from pipeline.generate_metadata import (
+    FALLBACK_METADATA,
+    generate_video_metadata,
+    get_metadata_settings,
+)
+from pipeline.metadata_store import get_metadata_store
+from pipeline.text_to_speech import get_chunking_settings, get_tts_settings, run_tts
+
+# Resolved from config on first use so importing this module stays cheap
+_paths = None
+_video_settings = None
+
+
+def get_paths():
+    global _paths
+    if _paths is None:
+        video_dir = Config.get("files.directories.video", "video")
+        thumbnail_dir = Config.get("files.directories.thumbnails", "thumbnails")
+        _paths = {
+            "scripts": Config.get("files.directories.scripts", "scripts"),
+            "audio": Config.get("files.directories.audio", "audio"),
+            "video": video_dir,
+            "thumbnails": thumbnail_dir,
+            "manifest": os.path.join(video_dir, ".manifest"),
+            "default_background": os.path.join(thumbnail_dir, "thumb_001_A.png"),
+        }
+    return _paths
+
+
+def get_video_settings():
+    global _video_settings
+    if _video_settings is None:
+        _video_settings = {
+            "width": Config.get("video.resolution.width"),
+            "height": Config.get("video.resolution.height"),
+            "fps": Config.get("video.fps"),
+            "codec": Config.get("video.codec"),
+            "bitrate": Config.get("video.bitrate"),
+            "audio_bitrate": Config.get("video.audio.bitrate"),
+            "audio_sample_rate": Config.get("video.audio.sample_rate"),
+            "audio_channels": Config.get("video.audio.channels"),
+            # "ffmpeg" renders a looped still directly; "moviepy" composites
+            # every frame
+            "engine": Config.get("video.render.engine", "ffmpeg"),
+        }
+    return _video_settings
 
 
 def get_script_text(path):
@@ -39,52 +70,174 @@ def get_script_text(path):
         return f.read().strip().replace("*", "")
 
 
-def log_metadata(entry):
-    os.makedirs(VIDEO_DIR, exist_ok=True)
-    # Prevent duplicate entries based on script and video filename
-    if os.path.exists(METADATA_LOG):
-        with open(METADATA_LOG, "r", encoding="utf-8") as f:
-            for line in f:
-                try:
-                    existing = json.loads(line)
-                    if (
-                        existing.get("script") == entry["script"]
-                        and existing.get("video") == entry["video"]
-                    ):
-                        print(
-                            f"⚠️ Metadata already logged for {entry['script']}, skipping log."
-                        )
-                        return
-                except json.JSONDecodeError:
-                    continue
-
-    with open(METADATA_LOG, "a", encoding="utf-8") as f:
-        f.write(json.dumps(entry) + "\n")
-    print(f"📝 Metadata logged to {METADATA_LOG}")
-
-
-def render_video(script_path, background_img=None):
+def find_metadata_entry(script_path, video_path):
+    return get_metadata_store().find_entry(script_path, video_path)
+
+
+def log_metadata(entry, replace=False):
+    # One indexed lookup and a single-row write, in one transaction
+    store = get_metadata_store()
+    action = store.upsert(entry, replace=replace)
+    if action == "skipped":
+        print(f"⚠️ Metadata already logged for {entry['script']}, skipping log.")
+    elif action == "updated":
+        print(f"📝 Metadata updated in {store.path}")
+    else:
+        print(f"📝 Metadata logged to {store.path}")
+
+
+def update_metadata_entry(entry):
+    get_metadata_store().upsert(entry, replace=True)
+
+
+def get_output_paths(script_path):
     base_name = os.path.splitext(os.path.basename(script_path))[0]
-    audio_path = os.path.join(AUDIO_DIR, f"{base_name}.mp3")
-    video_path = os.path.join(VIDEO_DIR, f"{base_name}.mp4")
+    audio_path = os.path.join(get_paths()["audio"], f"{base_name}.mp3")
+    video_path = os.path.join(get_paths()["video"], f"{base_name}.mp4")
+    return base_name, audio_path, video_path
 
-    # Use default background if none provided
-    if not background_img:
-        background_img = DEFAULT_BACKGROUND_IMG
 
-    # Generate audio if it doesn't exist
-    if not os.path.exists(audio_path):
-        script_text = get_script_text(script_path)
-        run_tts(script_text, audio_path)
+def audio_fingerprint(script_text):
+    return fingerprint(
+        {
+            "script": hash_text(script_text),
+            "tts": get_tts_settings(),
+            "chunking": get_chunking_settings(),
+        }
+    )
+
+
+def video_fingerprint(audio_path, background_img):
+    return fingerprint(
+        {
+            "audio": hash_file(audio_path),
+            "background": (
+                hash_file(background_img)
+                if os.path.exists(background_img)
+                else "missing"
+            ),
+            "render": get_video_settings(),
+        }
+    )
+
+
+def metadata_fingerprint(script_text):
+    return fingerprint(
+        {"script": hash_text(script_text), "llm": get_metadata_settings()}
+    )
+
+
+def _build_plan(script_path, background_img):
+    base_name, audio_path, video_path = get_output_paths(script_path)
+    script_text = get_script_text(script_path)
+    manifest = BuildManifest(base_name, get_paths()["manifest"])
+    plan = {}
+
+    audio_fp = audio_fingerprint(script_text)
+    action, reason = manifest.decide(
+        "audio",
+        audio_fp,
+        os.path.exists(audio_path),
+        lambda: media_is_complete(audio_path),
+    )
+    plan["audio"] = {"action": action, "reason": reason, "fingerprint": audio_fp}
+
+    if action == BUILD:
+        # The video's inputs include the audio bytes, which don't exist yet
+        plan["video"] = {
+            "action": BUILD,
+            "reason": "audio rebuilt",
+            "fingerprint": None,
+        }
+    else:
+        video_fp = video_fingerprint(audio_path, background_img)
+        action, reason = manifest.decide(
+            "video",
+            video_fp,
+            os.path.exists(video_path),
+            lambda: media_is_complete(video_path),
+        )
+        plan["video"] = {"action": action, "reason": reason, "fingerprint": video_fp}
+
+    metadata_fp = metadata_fingerprint(script_text)
+    action, reason = manifest.decide(
+        "metadata",
+        metadata_fp,
+        find_metadata_entry(script_path, video_path) is not None,
+    )
+    plan["metadata"] = {"action": action, "reason": reason, "fingerprint": metadata_fp}
+
+    return plan, manifest, script_text
+
+
+def plan_render(script_path, background_img=None):
+    """Return the per-stage build/reuse decision for a script without building."""
+    background_img = background_img or get_paths()["default_background"]
+    plan, _, _ = _build_plan(script_path, background_img)
+    return plan
+
+
+def render_still_ffmpeg(background_img, audio_path, video_path):
+    # The picture never changes, so loop one decoded image inside ffmpeg
+    # instead of generating and piping every frame from Python.
+    settings = get_video_settings()
+    duration = probe_duration(audio_path)
+    width, height = settings["width"], settings["height"]
+    codec = settings["codec"]
+    args = [
+        "-loop",
+        "1",
+        "-framerate",
+        str(settings["fps"]),
+        "-i",
+        background_img,
+        "-i",
+        audio_path,
+        "-t",
+        f"{duration:.3f}",
+        "-vf",
+        f"scale={width}:{height},setsar=1,format=yuv420p",
+        "-c:v",
+        codec,
+    ]
+    if codec == "libx264":
+        args += ["-tune", "stillimage"]
+    args += [
+        "-b:v",
+        settings["bitrate"],
+        "-r",
+        str(settings["fps"]),
+        "-c:a",
+        "aac",
+        "-b:a",
+        settings["audio_bitrate"],
+        "-ar",
+        str(settings["audio_sample_rate"]),
+        "-ac",
+        str(settings["audio_channels"]),
+        "-shortest",
+        "-movflags",
+        "+faststart",
+        video_path,
+    ]
+
+    os.makedirs(os.path.dirname(video_path) or ".", exist_ok=True)
+    print(f"🎞️ Rendering still-image video with ffmpeg ({duration:.1f}s)...")
+    run_ffmpeg(args)
+
+
+def render_composited_moviepy(background_img, audio_path, video_path):
+    # MoviePy is slow to import and only needed for this fallback path
+    from moviepy.editor import AudioFileClip, CompositeVideoClip, ImageClip
+
+    settings = get_video_settings()
 
     # Create video with configured settings
     audio = AudioFileClip(audio_path)
     background = ImageClip(background_img).set_duration(audio.duration)
 
     # Set video properties from configuration
-    background = background.resize(
-        width=VIDEO_SETTINGS["width"], height=VIDEO_SETTINGS["height"]
-    )
+    background = background.resize(width=settings["width"], height=settings["height"])
 
     # Create final video
     final = CompositeVideoClip([background])
@@ -93,31 +246,77 @@ def render_video(script_path, background_img=None):
     # Write video with configured settings
     final.write_videofile(
         video_path,
-        fps=VIDEO_SETTINGS["fps"],
-        codec=VIDEO_SETTINGS["codec"],
-        bitrate=VIDEO_SETTINGS["bitrate"],
-        audio_bitrate=VIDEO_SETTINGS["audio_bitrate"],
-        audio_fps=VIDEO_SETTINGS["audio_sample_rate"],
+        fps=settings["fps"],
+        codec=settings["codec"],
+        bitrate=settings["bitrate"],
+        audio_bitrate=settings["audio_bitrate"],
+        audio_fps=settings["audio_sample_rate"],
         audio_nbytes=2,  # 16-bit audio
-        audio_channels=VIDEO_SETTINGS["audio_channels"],
+        audio_channels=settings["audio_channels"],
     )
 
+
+def render_video(script_path, background_img=None, refresh_metadata=False):
+    base_name, audio_path, video_path = get_output_paths(script_path)
+
+    # Use default background if none provided
+    if not background_img:
+        background_img = get_paths()["default_background"]
+
+    plan, manifest, script_text = _build_plan(script_path, background_img)
+    if refresh_metadata:
+        plan["metadata"].update(action=BUILD, reason="refresh requested")
+
+    # Audio: rebuild only when the script text or voice settings changed
+    audio = plan["audio"]
+    if audio["action"] == BUILD:
+        run_tts(script_text, audio_path)
+    if audio["action"] in (BUILD, ADOPT):
+        manifest.record("audio", audio["fingerprint"], audio_path)
+
+    # Video: rebuild when the audio, background or render settings changed
+    video = plan["video"]
+    if video["fingerprint"] is None:
+        video["fingerprint"] = video_fingerprint(audio_path, background_img)
+    if video["action"] == BUILD:
+        engine = get_video_settings()["engine"]
+        if engine == "ffmpeg" and ffmpeg_available():
+            try:
+                render_still_ffmpeg(background_img, audio_path, video_path)
+            except FFmpegError as e:
+                print(f"⚠️ ffmpeg still render failed, falling back to MoviePy: {e}")
+                render_composited_moviepy(background_img, audio_path, video_path)
+        else:
+            render_composited_moviepy(background_img, audio_path, video_path)
+    if video["action"] in (BUILD, ADOPT):
+        manifest.record("video", video["fingerprint"], video_path)
+
+    render_info = {
+        "script": script_path,
+        "video": video_path,
+        "audio": audio_path,
+        "background": background_img,
+        "timestamp": datetime.now().isoformat(),
+    }
+
     # Log metadata
-    metadata = generate_video_metadata(get_script_text(script_path))
-    log_metadata(
-        {
-            "script": script_path,
-            "video": video_path,
-            "audio": audio_path,
-            "background": background_img,
-            "timestamp": datetime.now().isoformat(),
-            **metadata,
-        }
-    )
+    metadata = plan["metadata"]
+    if metadata["action"] == BUILD:
+        generated = generate_video_metadata(script_text, refresh=refresh_metadata)
+        log_metadata({**render_info, **generated}, replace=True)
+        # Don't pin the placeholder; retry generation on the next build
+        if generated != FALLBACK_METADATA:
+            manifest.record("metadata", metadata["fingerprint"])
+    else:
+        if video["action"] == BUILD:
+            # Keep the existing title/description, refresh what was rendered
+            log_metadata(render_info, replace=True)
+        if metadata["action"] == ADOPT:
+            manifest.record("metadata", metadata["fingerprint"])
 
     return video_path
 
 
 if __name__ == "__main__":
-    single_script = os.path.join(SCRIPT_DIR, "script_001.md")
+    single_script = os.path.join(get_paths()["scripts"], "script_001.md")
     render_video(single_script)
@@ -0,0 +1,449 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+from config import Config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    script TEXT,
+    video TEXT,
+    uploaded INTEGER NOT NULL DEFAULT 0,
+    youtube_video_id TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_script_video ON entries (script, video);
+CREATE INDEX IF NOT EXISTS entries_uploaded ON entries (uploaded, id);
+CREATE INDEX IF NOT EXISTS entries_youtube_video_id ON entries (youtube_video_id);
+"""
+
+ID_KEY = "_id"
+
+_store = None
+
+
+def _columns(entry: Dict) -> tuple:
+    return (
+        entry.get("script"),
+        entry.get("video"),
+        1 if entry.get("uploaded") else 0,
+        entry.get("youtube_video_id"),
+    )
+
+
+def _dumps(entry: Dict) -> str:
+    return json.dumps({k: v for k, v in entry.items() if k != ID_KEY})
+
+
+def _row_entry(row) -> Dict:
+    entry = json.loads(row[1])
+    entry[ID_KEY] = row[0]
+    return entry
+
+
+class MetadataStore:
+    """The video catalog in SQLite, one row per entry.
+
+    Entries are the same dicts that used to be lines of metadata.jsonl,
+    plus an "_id" key. script, video, uploaded and youtube_video_id are
+    indexed columns; the whole entry is kept as JSON. Writes touch only
+    the rows that changed, each batch in one transaction, and WAL mode
+    lets readers carry on while another process writes.
+    """
+
+    def __init__(
+        self, path: str, legacy_path: Optional[str] = None, timeout: float = 30
+    ):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.timeout = timeout
+        # What each entry looked like when it was last loaded, so a save
+        # only writes the fields this process actually changed
+        self._loaded: Dict[int, str] = {}
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._ready = False
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Autocommit; transactions are opened explicitly in _transaction
+            conn = sqlite3.connect(
+                self.path, timeout=self.timeout, isolation_level=None
+            )
+            conn.execute(f"PRAGMA busy_timeout = {int(self.timeout * 1000)}")
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._local.conn = conn
+        if not self._ready:
+            with self._init_lock:
+                if not self._ready:
+                    conn.executescript(SCHEMA)
+                    self._ready = True
+                    self._import_legacy(conn)
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        # Take the write lock up front so read-modify-write can't interleave
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _import_legacy(self, conn: sqlite3.Connection) -> None:
+        if not self.legacy_path or not os.path.exists(self.legacy_path):
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have imported it while we waited
+            if not os.path.exists(self.legacy_path):
+                conn.execute("ROLLBACK")
+                return
+            if conn.execute("SELECT 1 FROM entries LIMIT 1").fetchone():
+                conn.execute("ROLLBACK")
+                print(
+                    f"⚠️ {self.legacy_path} not imported: {self.path} already has "
+                    "entries. Use import_jsonl to merge it."
+                )
+                return
+            count = self._insert_jsonl(conn, self.legacy_path)
+            os.replace(self.legacy_path, f"{self.legacy_path}.migrated")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        print(f"📦 Imported {count} entries from {self.legacy_path} into {self.path}")
+
+    def _insert(self, conn: sqlite3.Connection, entry: Dict) -> int:
+        cursor = conn.execute(
+            "INSERT INTO entries (script, video, uploaded, youtube_video_id, data) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (*_columns(entry), _dumps(entry)),
+        )
+        return cursor.lastrowid
+
+    def _write(self, conn: sqlite3.Connection, entry_id: int, entry: Dict) -> None:
+        conn.execute(
+            "UPDATE entries SET script = ?, video = ?, uploaded = ?, "
+            "youtube_video_id = ?, data = ? WHERE id = ?",
+            (*_columns(entry), _dumps(entry), entry_id),
+        )
+
+    def _read(self, conn: sqlite3.Connection, entry_id: int) -> Optional[Dict]:
+        row = conn.execute(
+            "SELECT id, data FROM entries WHERE id = ?", (entry_id,)
+        ).fetchone()
+        return _row_entry(row) if row else None
+
+    def _insert_jsonl(self, conn: sqlite3.Connection, path: str) -> int:
+        count = 0
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"⚠️ Skipping unreadable line in {path}")
+                    continue
+                self._insert(conn, entry)
+                count += 1
+        return count
+
+    def _remember(self, entry: Dict) -> None:
+        self._loaded[entry[ID_KEY]] = _dumps(entry)
+
+    def load_entries(self) -> List[Dict]:
+        """Every entry, in the order they were added."""
+        rows = (
+            self._connection()
+            .execute("SELECT id, data FROM entries ORDER BY id")
+            .fetchall()
+        )
+        entries = [_row_entry(row) for row in rows]
+        for entry in entries:
+            self._remember(entry)
+        return entries
+
+    def save_entries(self, entries: Iterable[Dict]) -> int:
+        """Write the entries that changed since they were loaded.
+
+        New entries (no "_id") are added and given an id. For loaded
+        entries only the fields changed here are applied to the stored
+        row, so another process's update to other fields isn't lost.
+        Entries left out are kept; use delete_entries to remove them.
+        Returns the number of rows written.
+        """
+        changed = []
+        for entry in entries:
+            if ID_KEY not in entry or self._loaded.get(entry[ID_KEY]) != _dumps(entry):
+                changed.append(entry)
+        if not changed:
+            return 0
+
+        added = []
+        with self._transaction() as conn:
+            for entry in changed:
+                if ID_KEY not in entry:
+                    added.append((entry, self._insert(conn, entry)))
+                    continue
+                current = self._read(conn, entry[ID_KEY])
+                before = self._loaded.get(entry[ID_KEY])
+                if current is None or before is None:
+                    merged = entry
+                else:
+                    before = json.loads(before)
+                    merged = current
+                    for key, value in entry.items():
+                        if key != ID_KEY and before.get(key) != value:
+                            merged[key] = value
+                    for key in before:
+                        if key not in entry:
+                            merged.pop(key, None)
+                if current is None:
+                    # Deleted elsewhere since it was loaded; keep this copy
+                    added.append((entry, self._insert(conn, merged)))
+                else:
+                    self._write(conn, entry[ID_KEY], merged)
+        # Only hand out ids once the rows are committed
+        for entry, entry_id in added:
+            entry[ID_KEY] = entry_id
+        for entry in changed:
+            self._remember(entry)
+        return len(changed)
+
+    def update_entry(self, entry_id: int, fields: Dict) -> Optional[Dict]:
+        """Set some fields of one entry atomically and return it."""
+        with self._transaction() as conn:
+            entry = self._read(conn, entry_id)
+            if entry is None:
+                return None
+            entry.update(fields)
+            self._write(conn, entry_id, entry)
+        self._remember(entry)
+        return entry
+
+    def upsert(self, entry: Dict, replace: bool = True) -> str:
+        """Add an entry, or merge it into the one for the same script and video.
+
+        Returns "added", "updated", or "skipped" when one exists and
+        replace is False.
+        """
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT id, data FROM entries WHERE script IS ? AND video IS ? "
+                "ORDER BY id LIMIT 1",
+                (entry.get("script"), entry.get("video")),
+            ).fetchone()
+            if row is None:
+                self._insert(conn, entry)
+                return "added"
+            if not replace:
+                return "skipped"
+            existing = _row_entry(row)
+            existing.update({k: v for k, v in entry.items() if k != ID_KEY})
+            self._write(conn, row[0], existing)
+            return "updated"
+
+    def delete_entries(self, entry_ids: Iterable[int]) -> int:
+        entry_ids = list(entry_ids)
+        with self._transaction() as conn:
+            conn.executemany(
+                "DELETE FROM entries WHERE id = ?", [(i,) for i in entry_ids]
+            )
+        for entry_id in entry_ids:
+            self._loaded.pop(entry_id, None)
+        return len(entry_ids)
+
+    def find_entry(self, script: str, video: str) -> Optional[Dict]:
+        row = (
+            self._connection()
+            .execute(
+                "SELECT id, data FROM entries WHERE script = ? AND video = ? "
+                "ORDER BY id LIMIT 1",
+                (script, video),
+            )
+            .fetchone()
+        )
+        return _row_entry(row) if row else None
+
+    def find_by_video_id(self, youtube_video_id: str) -> Optional[Dict]:
+        row = (
+            self._connection()
+            .execute(
+                "SELECT id, data FROM entries WHERE youtube_video_id = ? LIMIT 1",
+                (youtube_video_id,),
+            )
+            .fetchone()
+        )
+        return _row_entry(row) if row else None
+
+    def find_uploaded_by_hash(self, content_hash: str) -> Optional[Dict]:
+        """An uploaded entry whose video file had this sha256, if any."""
+        row = (
+            self._connection()
+            .execute(
+                "SELECT id, data FROM entries WHERE uploaded = 1 "
+                "AND json_extract(data, '$.content_hash') = ? LIMIT 1",
+                (content_hash,),
+            )
+            .fetchone()
+        )
+        return _row_entry(row) if row else None
+
+    def next_unuploaded(self) -> Optional[Dict]:
+        """The oldest entry not uploaded yet."""
+        row = (
+            self._connection()
+            .execute(
+                "SELECT id, data FROM entries WHERE uploaded = 0 ORDER BY id LIMIT 1"
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        entry = _row_entry(row)
+        self._remember(entry)
+        return entry
+
+    def count_unuploaded(self) -> int:
+        return (
+            self._connection()
+            .execute("SELECT COUNT(*) FROM entries WHERE uploaded = 0")
+            .fetchone()[0]
+        )
+
+    def claim_next_unuploaded(
+        self,
+        owner: str,
+        lease_seconds: float = 3 * 3600,
+        skip: Iterable[int] = (),
+    ) -> Optional[Dict]:
+        """Atomically take the oldest queued entry nobody else is uploading.
+
+        The claim is stored on the entry with an expiry, so an entry held
+        by a worker that crashed goes back in the queue once it lapses.
+        Entries whose ids are in skip are passed over.
+        """
+        skip = set(skip)
+        now = time.time()
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT id, data FROM entries WHERE uploaded = 0 ORDER BY id"
+            )
+            for row in rows:
+                if row[0] in skip:
+                    continue
+                entry = _row_entry(row)
+                claim = entry.get("upload_claim")
+                if claim and claim.get("until", 0) > now:
+                    continue
+                entry["upload_claim"] = {"owner": owner, "until": now + lease_seconds}
+                self._write(conn, entry[ID_KEY], entry)
+                break
+            else:
+                return None
+        self._remember(entry)
+        return entry
+
+    def release_claim(self, entry_id: int, fields: Optional[Dict] = None) -> None:
+        """Drop an entry's upload claim, optionally setting other fields."""
+        with self._transaction() as conn:
+            entry = self._read(conn, entry_id)
+            if entry is None:
+                return
+            entry.pop("upload_claim", None)
+            entry.update(fields or {})
+            self._write(conn, entry_id, entry)
+        self._remember(entry)
+
+    def uploaded_entries(self) -> List[Dict]:
+        rows = (
+            self._connection()
+            .execute(
+                "SELECT id, data FROM entries WHERE uploaded = 1 "
+                "AND youtube_video_id IS NOT NULL ORDER BY id"
+            )
+            .fetchall()
+        )
+        entries = [_row_entry(row) for row in rows]
+        for entry in entries:
+            self._remember(entry)
+        return entries
+
+    def import_jsonl(self, path: str) -> int:
+        """Append every entry in a JSONL file; returns how many were read."""
+        with self._transaction() as conn:
+            return self._insert_jsonl(conn, path)
+
+    def export_jsonl(self, path: str) -> int:
+        """Write every entry to a JSONL file in the old metadata.jsonl format."""
+        rows = (
+            self._connection()
+            .execute("SELECT data FROM entries ORDER BY id")
+            .fetchall()
+        )
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for (data,) in rows:
+                f.write(data + "\n")
+        os.replace(tmp_path, path)
+        return len(rows)
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def get_metadata_store() -> MetadataStore:
+    global _store
+    if _store is None:
+        _store = MetadataStore(
+            Config.get("metadata_store.path", "video/metadata.db"),
+            legacy_path=Config.get(
+                "metadata_store.legacy_jsonl", "video/metadata.jsonl"
+            ),
+            timeout=Config.get("metadata_store.busy_timeout", 30),
+        )
+    return _store
+
+
+def load_entries() -> List[Dict]:
+    return get_metadata_store().load_entries()
+
+
+def save_entries(entries: Iterable[Dict]) -> int:
+    return get_metadata_store().save_entries(entries)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Import or export the video catalog")
+    parser.add_argument("action", choices=["import", "export"])
+    parser.add_argument("path", help="JSONL file in the metadata.jsonl format")
+    args = parser.parse_args()
+
+    store = get_metadata_store()
+    if args.action == "import":
+        print(f"📥 Imported {store.import_jsonl(args.path)} entries from {args.path}")
+    else:
+        print(f"📤 Exported {store.export_jsonl(args.path)} entries to {args.path}")
@@ -0,0 +1,229 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from config import Config
+
+# Quota units per call (YouTube Data API v3)
+COSTS = {
+    "videos.list": 1,
+    "videos.insert": 1600,
+    "thumbnails.set": 50,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    day TEXT PRIMARY KEY,
+    used INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS purpose_usage (
+    day TEXT NOT NULL,
+    purpose TEXT NOT NULL,
+    used INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, purpose)
+);
+"""
+
+_budget = None
+
+
+class QuotaExhausted(Exception):
+    """Today's quota budget can't cover the call."""
+
+
+def quota_timezone():
+    # The daily quota resets at midnight Pacific time
+    try:
+        from zoneinfo import ZoneInfo
+
+        return ZoneInfo("America/Los_Angeles")
+    except Exception:
+        # No tz database (e.g. Windows without tzdata): close enough
+        return timezone(timedelta(hours=-8))
+
+
+def quota_day(now: Optional[datetime] = None) -> str:
+    now = now or datetime.now(timezone.utc)
+    return now.astimezone(quota_timezone()).date().isoformat()
+
+
+def seconds_until_reset(now: Optional[datetime] = None) -> float:
+    now = (now or datetime.now(timezone.utc)).astimezone(quota_timezone())
+    midnight = (now + timedelta(days=1)).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    return (midnight - now).total_seconds()
+
+
+class QuotaBudget:
+    """Daily YouTube API quota shared by every process that calls the API.
+
+    Usage is kept per quota day in SQLite, and spend() checks and adds in
+    one transaction, so concurrent pollers and uploaders can't overdraw
+    the budget between them.
+    """
+
+    def __init__(self, path: str, daily_units: int = 10000, timeout: float = 30):
+        self.path = path
+        self.daily_units = daily_units
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(
+                self.path, timeout=self.timeout, isolation_level=None
+            )
+            conn.execute(f"PRAGMA busy_timeout = {int(self.timeout * 1000)}")
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def used(
+        self, now: Optional[datetime] = None, purpose: Optional[str] = None
+    ) -> int:
+        if purpose is None:
+            row = (
+                self._connection()
+                .execute("SELECT used FROM usage WHERE day = ?", (quota_day(now),))
+                .fetchone()
+            )
+        else:
+            row = (
+                self._connection()
+                .execute(
+                    "SELECT used FROM purpose_usage WHERE day = ? AND purpose = ?",
+                    (quota_day(now), purpose),
+                )
+                .fetchone()
+            )
+        return row[0] if row else 0
+
+    def remaining(self, now: Optional[datetime] = None) -> int:
+        return max(0, self.daily_units - self.used(now))
+
+    def spend(
+        self,
+        units: int,
+        now: Optional[datetime] = None,
+        purpose: Optional[str] = None,
+        cap: Optional[int] = None,
+    ) -> bool:
+        """Reserve units from today's budget; False (and nothing spent) if short.
+
+        With a purpose, the units are also counted against that purpose,
+        which may not go over cap units a day.
+        """
+        conn = self._connection()
+        day = quota_day(now)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT used FROM usage WHERE day = ?", (day,)
+            ).fetchone()
+            used = row[0] if row else 0
+            if used + units > self.daily_units:
+                conn.execute("ROLLBACK")
+                return False
+            if purpose is not None:
+                row = conn.execute(
+                    "SELECT used FROM purpose_usage WHERE day = ? AND purpose = ?",
+                    (day, purpose),
+                ).fetchone()
+                if cap is not None and (row[0] if row else 0) + units > cap:
+                    conn.execute("ROLLBACK")
+                    return False
+                conn.execute(
+                    "INSERT INTO purpose_usage (day, purpose, used) VALUES (?, ?, ?) "
+                    "ON CONFLICT(day, purpose) DO UPDATE "
+                    "SET used = used + excluded.used",
+                    (day, purpose, units),
+                )
+            conn.execute(
+                "INSERT INTO usage (day, used) VALUES (?, ?) "
+                "ON CONFLICT(day) DO UPDATE SET used = used + excluded.used",
+                (day, units),
+            )
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return True
+
+    def refund(
+        self,
+        units: int,
+        now: Optional[datetime] = None,
+        purpose: Optional[str] = None,
+    ) -> None:
+        """Give back units reserved for a call that was never made."""
+        conn = self._connection()
+        day = quota_day(now)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE usage SET used = MAX(0, used - ?) WHERE day = ?",
+                (units, day),
+            )
+            if purpose is not None:
+                conn.execute(
+                    "UPDATE purpose_usage SET used = MAX(0, used - ?) "
+                    "WHERE day = ? AND purpose = ?",
+                    (units, day, purpose),
+                )
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def share(self, purpose: str, fraction: float) -> "QuotaShare":
+        return QuotaShare(self, purpose, int(self.daily_units * fraction))
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class QuotaShare:
+    """The part of the daily budget one kind of work may use.
+
+    Same interface as QuotaBudget, so it can be passed wherever a budget
+    is; spending counts against both the share and the whole budget.
+    """
+
+    def __init__(self, budget: QuotaBudget, purpose: str, daily_units: int):
+        self.budget = budget
+        self.purpose = purpose
+        self.daily_units = daily_units
+
+    def used(self, now: Optional[datetime] = None) -> int:
+        return self.budget.used(now, self.purpose)
+
+    def remaining(self, now: Optional[datetime] = None) -> int:
+        left = self.daily_units - self.used(now)
+        return max(0, min(left, self.budget.remaining(now)))
+
+    def spend(self, units: int, now: Optional[datetime] = None) -> bool:
+        return self.budget.spend(units, now, self.purpose, self.daily_units)
+
+    def refund(self, units: int, now: Optional[datetime] = None) -> None:
+        self.budget.refund(units, now, self.purpose)
+
+
+def get_quota_budget() -> QuotaBudget:
+    global _budget
+    if _budget is None:
+        _budget = QuotaBudget(
+            Config.get("youtube.quota.path", "video/quota.db"),
+            daily_units=Config.get("youtube.quota.daily_units", 10000),
+        )
+    return _budget
@@ -0,0 +1,148 @@
+import json
+import os
+from typing import Callable, Dict, Optional, Tuple
+
+from config import Config
+
+# Resumable upload chunks must be a multiple of 256 KiB
+CHUNK_ALIGN = 256 * 1024
+
+
+def get_resumable_settings():
+    chunk_mb = Config.get("youtube.upload.chunk_size_mb", 8)
+    chunk_size = int(chunk_mb * 1024 * 1024) // CHUNK_ALIGN * CHUNK_ALIGN
+    return {
+        "chunk_size": max(CHUNK_ALIGN, chunk_size),
+        "retries": Config.get("youtube.upload.retries", 5),
+    }
+
+
+def session_status(http, uri: str, size: int) -> Optional[Tuple[int, Optional[Dict]]]:
+    """Ask YouTube how much of an interrupted upload it has received.
+
+    Returns (offset, None) to carry on from offset, (size, video resource)
+    when the upload had already finished, or None when the session has
+    expired and the upload must start over.
+    """
+    from googleapiclient.errors import HttpError
+
+    resp, content = http.request(
+        uri,
+        "PUT",
+        body=b"",
+        headers={"Content-Length": "0", "Content-Range": f"bytes */{size}"},
+    )
+    status = int(resp.status)
+    if status in (200, 201):
+        return size, json.loads(content)
+    if status == 308:
+        # "bytes=0-N": the server holds everything up to byte N
+        received = resp.get("range")
+        return (int(received.rsplit("-", 1)[1]) + 1 if received else 0), None
+    if status in (404, 410):
+        return None
+    raise HttpError(resp, content, uri=uri)
+
+
+def start_session(request, retries: int = 5) -> str:
+    """Create the upload session for a videos.insert request; no media yet.
+
+    This is the POST that YouTube charges quota for. googleapiclient does
+    it inside the first next_chunk() together with the first chunk, which
+    leaves no point at which the new session URI could be saved.
+    """
+    from googleapiclient.errors import ResumableUploadError
+    from googleapiclient.http import _retry_request
+
+    media = request.resumable
+    headers = dict(request.headers)
+    headers["X-Upload-Content-Type"] = media.mimetype()
+    if media.size() is not None:
+        headers["X-Upload-Content-Length"] = str(media.size())
+    headers["content-length"] = str(request.body_size)
+    resp, content = _retry_request(
+        request.http,
+        retries,
+        "resumable URI request",
+        request._sleep,
+        request._rand,
+        request.uri,
+        method=request.method,
+        body=request.body,
+        headers=headers,
+    )
+    if resp.status != 200 or "location" not in resp:
+        raise ResumableUploadError(resp, content)
+    request.resumable_uri = resp["location"]
+    return request.resumable_uri
+
+
+def send_resumable(
+    request,
+    path: str,
+    content_hash: str,
+    session: Optional[Dict] = None,
+    save_session: Optional[Callable[[Dict], None]] = None,
+    retries: int = 5,
+    on_insert: Optional[Callable[[], None]] = None,
+) -> Dict:
+    """Send a chunked videos.insert request, picking up an earlier session.
+
+    After every acknowledged chunk the session URI and byte offset are
+    handed to save_session, so a run that dies part way (or loses its
+    connection) can resume where the server left off. A saved session is
+    only reused for the same file contents; if the server says that
+    upload already finished, its video is returned instead of uploading
+    a duplicate.
+
+    on_insert is called just before a new session is requested, i.e. once
+    the insert's quota is about to be spent; the session URI is saved as
+    soon as YouTube returns it, before any media is sent.
+    """
+    size = os.path.getsize(path)
+    if (
+        session
+        and session.get("sha256") == content_hash
+        and session.get("size") == size
+    ):
+        status = session_status(request.http, session["uri"], size)
+        if status is None:
+            print("⚠️ Previous upload session expired; starting over")
+        else:
+            offset, response = status
+            if response is not None:
+                print(f"✅ Previous upload had already finished: {response['id']}")
+                return response
+            request.resumable_uri = session["uri"]
+            request.resumable_progress = offset
+            print(f"⏩ Resuming upload at {offset * 100 // size}%")
+
+    def save():
+        if save_session and request.resumable_uri:
+            save_session(
+                {
+                    "uri": request.resumable_uri,
+                    "offset": request.resumable_progress,
+                    "size": size,
+                    "sha256": content_hash,
+                }
+            )
+
+    if request.resumable_uri is None:
+        if on_insert:
+            on_insert()
+        start_session(request, retries)
+        save()
+
+    response = None
+    while response is None:
+        try:
+            status, response = request.next_chunk(num_retries=retries)
+        except BaseException:
+            # Keep the latest offset so a resume skips the sent chunks
+            save()
+            raise
+        if status:
+            save()
+            print(f"🔄 Upload progress: {int(status.progress() * 100)}%")
+    return response
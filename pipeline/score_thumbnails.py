@@ -1,39 +1,38 @@
-import json
-from collections import defaultdict
+import argparse
 
-VIDEO_LOG = "video/metadata.jsonl"
+from pipeline.metadata_store import load_entries
+from pipeline.thumbnail_leaderboard import get_leaderboard
 
 
-def load_entries():
-    with open(VIDEO_LOG, "r", encoding="utf-8") as f:
-        return [json.loads(line) for line in f if line.strip()]
+def summarize_top_thumbnails(entries=None, rebuild=False, top_n=10):
+    """Print the best thumbnails from the running leaderboard.
 
-
-def summarize_top_thumbnails(entries):
-    summary = defaultdict(lambda: {"uses": 0, "views": 0})
-
-    for entry in entries:
-        stats = entry.get("thumbnail_stats", {})
-        for thumb, data in stats.items():
-            summary[thumb]["uses"] += data.get("uses", 0)
-            summary[thumb]["views"] += data.get("views", 0)
-
-    for thumb, data in summary.items():
-        views = data["views"]
-        uses = data["uses"]
-        score = round(views / uses, 2) if uses > 0 else 0.0
-        summary[thumb]["score"] = score
-
-    # Sort by score descending
-    top = sorted(summary.items(), key=lambda x: x[1]["score"], reverse=True)
+    Visually identical thumbnails are ranked as one group. The
+    leaderboard is kept up to date as uses and views are recorded, so
+    entries are only scanned to build it the first time or on rebuild.
+    """
+    leaderboard = get_leaderboard(entries)
+    if rebuild:
+        leaderboard.rebuild(entries if entries is not None else load_entries())
+    top = leaderboard.top(top_n)
 
     print("\n🎯 Top Performing Thumbnails:")
-    for i, (thumb, data) in enumerate(top[:10]):
+    for i, data in enumerate(top):
+        copies = len(data["members"])
         print(
-            f"{i+1:2d}. {thumb} — Score: {data['score']} | Views: {data['views']} | Uses: {data['uses']}"
+            f"{i+1:2d}. {data['group']} — Score: {data['score']} "
+            f"| Views: {data['views']} | Uses: {data['uses']}"
+            + (f" | {copies} near-identical files" if copies > 1 else "")
         )
+    return top
 
 
 if __name__ == "__main__":
-    entries = load_entries()
-    summarize_top_thumbnails(entries)
+    parser = argparse.ArgumentParser(description="Show the top thumbnails")
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="recompute the leaderboard from the video catalog",
+    )
+    args = parser.parse_args()
+    summarize_top_thumbnails(load_entries(), rebuild=args.rebuild)
@@ -0,0 +1,414 @@
+import os
+import sqlite3
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Iterable, List, NamedTuple, Optional
+
+from config import Config
+
+if TYPE_CHECKING:
+    import numpy as np
+
+COLUMNS = ("t", "views", "likes", "comments")
+
+RAW, HOURLY, DAILY = 0, 1, 2
+BUCKET_SECONDS = {HOURLY: 3600, DAILY: 86400}
+DAY = 86400
+
+# Smallest signed type that holds every delta in a column; numpy itself is
+# imported on first use so scripts that only record samples start quickly
+DTYPES = ["int8", "int16", "int32", "int64"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    video_id TEXT NOT NULL,
+    t INTEGER NOT NULL,
+    views INTEGER NOT NULL,
+    likes INTEGER NOT NULL,
+    comments INTEGER NOT NULL,
+    PRIMARY KEY (video_id, t)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS chunks (
+    video_id TEXT NOT NULL,
+    tier INTEGER NOT NULL,
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (video_id, tier, start)
+);
+"""
+
+_history = None
+
+
+class Series(NamedTuple):
+    """One video's samples as parallel arrays, oldest first; t is epoch seconds."""
+
+    t: "np.ndarray"
+    views: "np.ndarray"
+    likes: "np.ndarray"
+    comments: "np.ndarray"
+
+    def __len__(self):
+        return len(self.t)
+
+
+def empty_series() -> Series:
+    import numpy as np
+
+    return Series(*(np.zeros(0, dtype=np.int64) for _ in COLUMNS))
+
+
+def encode(series: Series) -> bytes:
+    """Delta-encode each column into the narrowest integer type that fits.
+
+    Timestamps and counters both move in small steps, so most columns
+    pack into one or two bytes per sample instead of eight.
+    """
+    import numpy as np
+
+    count = len(series)
+    parts = [struct.pack("<I", count)]
+    for column in series:
+        deltas = np.diff(column)
+        code = 0
+        if count > 1:
+            low, high = int(deltas.min()), int(deltas.max())
+            while not (
+                np.iinfo(DTYPES[code]).min <= low and high <= np.iinfo(DTYPES[code]).max
+            ):
+                code += 1
+        parts.append(struct.pack("<qB", int(column[0]) if count else 0, code))
+        parts.append(deltas.astype(DTYPES[code]).tobytes())
+    return b"".join(parts)
+
+
+def decode(data: bytes) -> Series:
+    import numpy as np
+
+    (count,) = struct.unpack_from("<I", data)
+    offset = 4
+    columns = []
+    for _ in COLUMNS:
+        first, code = struct.unpack_from("<qB", data, offset)
+        offset += 9
+        dtype = np.dtype(DTYPES[code])
+        deltas = np.frombuffer(
+            data, dtype=dtype, count=max(count - 1, 0), offset=offset
+        )
+        offset += deltas.nbytes
+        column = np.empty(count, dtype=np.int64)
+        if count:
+            column[0] = first
+            np.cumsum(deltas, out=column[1:])
+            column[1:] += first
+        columns.append(column)
+    return Series(*columns)
+
+
+def concat(parts: Iterable[Series]) -> Series:
+    import numpy as np
+
+    parts = [p for p in parts if len(p)]
+    if not parts:
+        return empty_series()
+    return Series(*(np.concatenate(columns) for columns in zip(*parts)))
+
+
+def downsample(series: Series, bucket_seconds: int) -> Series:
+    """Keep the last sample in each time bucket.
+
+    Views, likes and comments are running totals, so the last value in a
+    bucket is exactly the total at that point; nothing is averaged away.
+    """
+    import numpy as np
+
+    if len(series) < 2:
+        return series
+    buckets = series.t // bucket_seconds
+    keep = np.append(buckets[1:] != buckets[:-1], True)
+    return Series(*(column[keep] for column in series))
+
+
+def clip(series: Series, start: Optional[int], end: Optional[int]) -> Series:
+    import numpy as np
+
+    lo = 0 if start is None else np.searchsorted(series.t, start, "left")
+    hi = len(series) if end is None else np.searchsorted(series.t, end, "right")
+    return Series(*(column[lo:hi] for column in series))
+
+
+def thin(series: Series, max_points: Optional[int]) -> Series:
+    """Downsample to at most about max_points samples for charting."""
+    if not max_points or len(series) <= max_points:
+        return series
+    span = int(series.t[-1] - series.t[0])
+    return downsample(series, max(1, -(-span // max_points)))
+
+
+def get_history_settings():
+    return {
+        "raw_days": Config.get("stats_history.raw_retention", 7),
+        "hourly_days": Config.get("stats_history.hourly_retention", 90),
+        "daily_days": Config.get("stats_history.daily_retention", 0),
+        "chunk_size": Config.get("stats_history.chunk_size", 512),
+        "chart_points": Config.get("stats_history.chart_points", 500),
+    }
+
+
+class StatsHistory:
+    """Per-video view/like/comment samples over time.
+
+    New samples are appended as plain rows. maintain() rolls samples past
+    the raw retention window into hourly points and hourly points past
+    theirs into daily points, stored as delta-encoded column chunks;
+    daily points older than daily_days (0 keeps them) are dropped. A
+    video polled every few minutes for a year stays a few kilobytes.
+    """
+
+    def __init__(self, path: str, settings: Optional[Dict] = None, timeout: float = 30):
+        self.path = path
+        self.settings = settings or get_history_settings()
+        self.timeout = timeout
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._ready = False
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(
+                self.path, timeout=self.timeout, isolation_level=None
+            )
+            conn.execute(f"PRAGMA busy_timeout = {int(self.timeout * 1000)}")
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._local.conn = conn
+        if not self._ready:
+            with self._init_lock:
+                if not self._ready:
+                    conn.executescript(SCHEMA)
+                    self._ready = True
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def record(
+        self,
+        video_id: str,
+        views: int,
+        likes: int = 0,
+        comments: int = 0,
+        at: Optional[float] = None,
+    ) -> None:
+        t = int(time.time() if at is None else at)
+        self._connection().execute(
+            "INSERT OR REPLACE INTO samples VALUES (?, ?, ?, ?, ?)",
+            (video_id, t, int(views), int(likes), int(comments)),
+        )
+
+    def record_many(self, samples: Iterable[Dict], at: Optional[float] = None) -> int:
+        """Append one sample per dict (video_id, views, likes, comments)."""
+        t = int(time.time() if at is None else at)
+        rows = [
+            (
+                s["video_id"],
+                int(s.get("t", t)),
+                int(s.get("views", 0)),
+                int(s.get("likes", 0)),
+                int(s.get("comments", 0)),
+            )
+            for s in samples
+        ]
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO samples VALUES (?, ?, ?, ?, ?)", rows
+            )
+        return len(rows)
+
+    def _raw(self, conn, video_id: str, start=None, end=None) -> Series:
+        import numpy as np
+
+        rows = conn.execute(
+            "SELECT t, views, likes, comments FROM samples WHERE video_id = ? "
+            "AND t >= ? AND t <= ? ORDER BY t",
+            (
+                video_id,
+                -(2**63) if start is None else int(start),
+                2**63 - 1 if end is None else int(end),
+            ),
+        ).fetchall()
+        if not rows:
+            return empty_series()
+        return Series(*np.array(rows, dtype=np.int64).T)
+
+    def _chunks(self, conn, video_id: str, tier: int, start=None, end=None) -> Series:
+        rows = conn.execute(
+            "SELECT data FROM chunks WHERE video_id = ? AND tier = ? "
+            "AND end >= ? AND start <= ? ORDER BY start",
+            (
+                video_id,
+                tier,
+                -(2**63) if start is None else int(start),
+                2**63 - 1 if end is None else int(end),
+            ),
+        ).fetchall()
+        return clip(concat(decode(data) for (data,) in rows), start, end)
+
+    def series(
+        self,
+        video_id: str,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        max_points: Optional[int] = None,
+    ) -> Series:
+        """Samples for one video between start and end (epoch seconds).
+
+        Older history comes back at the resolution it was kept at.
+        max_points thins the result evenly over time for charts.
+        """
+        conn = self._connection()
+        parts = [
+            self._chunks(conn, video_id, DAILY, start, end),
+            self._chunks(conn, video_id, HOURLY, start, end),
+            self._raw(conn, video_id, start, end),
+        ]
+        return thin(concat(parts), max_points)
+
+    def video_ids(self) -> List[str]:
+        rows = self._connection().execute(
+            "SELECT video_id FROM samples UNION SELECT video_id FROM chunks"
+        )
+        return sorted(row[0] for row in rows)
+
+    def latest(self, video_id: str, count: int = 2) -> Series:
+        """The newest count samples, for growth checks."""
+        import numpy as np
+
+        rows = (
+            self._connection()
+            .execute(
+                "SELECT t, views, likes, comments FROM samples WHERE video_id = ? "
+                "ORDER BY t DESC LIMIT ?",
+                (video_id, count),
+            )
+            .fetchall()
+        )
+        if len(rows) < count:
+            # Raw samples were rolled up; fall back to the full series
+            full = self.series(video_id)
+            return Series(*(column[-count:] for column in full))
+        return Series(*np.array(rows[::-1], dtype=np.int64).T)
+
+    def _append_chunks(self, conn, video_id: str, tier: int, points: Series) -> None:
+        # Top up the newest chunk so maintenance runs don't leave many tiny ones
+        chunk_size = self.settings["chunk_size"]
+        row = conn.execute(
+            "SELECT start, data FROM chunks WHERE video_id = ? AND tier = ? "
+            "ORDER BY start DESC LIMIT 1",
+            (video_id, tier),
+        ).fetchone()
+        if row and len(decode(row[1])) < chunk_size:
+            conn.execute(
+                "DELETE FROM chunks WHERE video_id = ? AND tier = ? AND start = ?",
+                (video_id, tier, row[0]),
+            )
+            points = concat([decode(row[1]), points])
+        # Counters are cumulative, so re-bucketing the join is lossless
+        points = downsample(points, BUCKET_SECONDS[tier])
+        for i in range(0, len(points), chunk_size):
+            part = Series(*(column[i : i + chunk_size] for column in points))
+            conn.execute(
+                "INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    video_id,
+                    tier,
+                    int(part.t[0]),
+                    int(part.t[-1]),
+                    len(part),
+                    encode(part),
+                ),
+            )
+
+    def maintain(self, now: Optional[float] = None) -> Dict[str, int]:
+        """Apply the retention policy; returns how many points moved or went."""
+        now = int(time.time() if now is None else now)
+        raw_cutoff = now - self.settings["raw_days"] * DAY
+        hourly_cutoff = now - self.settings["hourly_days"] * DAY
+        counts = {"raw_rolled": 0, "hourly_rolled": 0, "daily_dropped": 0}
+
+        with self._transaction() as conn:
+            videos = [
+                row[0]
+                for row in conn.execute(
+                    "SELECT DISTINCT video_id FROM samples WHERE t < ?", (raw_cutoff,)
+                )
+            ]
+            for video_id in videos:
+                old = self._raw(conn, video_id, end=raw_cutoff - 1)
+                self._append_chunks(conn, video_id, HOURLY, old)
+                conn.execute(
+                    "DELETE FROM samples WHERE video_id = ? AND t < ?",
+                    (video_id, raw_cutoff),
+                )
+                counts["raw_rolled"] += len(old)
+
+            stale = conn.execute(
+                "SELECT video_id, start, data FROM chunks WHERE tier = ? AND end < ?",
+                (HOURLY, hourly_cutoff),
+            ).fetchall()
+            by_video: Dict[str, List[Series]] = {}
+            for video_id, start, data in stale:
+                by_video.setdefault(video_id, []).append(decode(data))
+                conn.execute(
+                    "DELETE FROM chunks WHERE video_id = ? AND tier = ? AND start = ?",
+                    (video_id, HOURLY, start),
+                )
+            for video_id, parts in by_video.items():
+                points = concat(parts)
+                self._append_chunks(conn, video_id, DAILY, points)
+                counts["hourly_rolled"] += len(points)
+
+            if self.settings["daily_days"]:
+                daily_cutoff = now - self.settings["daily_days"] * DAY
+                dropped = conn.execute(
+                    "SELECT COALESCE(SUM(count), 0) FROM chunks "
+                    "WHERE tier = ? AND end < ?",
+                    (DAILY, daily_cutoff),
+                ).fetchone()[0]
+                conn.execute(
+                    "DELETE FROM chunks WHERE tier = ? AND end < ?",
+                    (DAILY, daily_cutoff),
+                )
+                counts["daily_dropped"] = dropped
+        return counts
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def get_stats_history() -> StatsHistory:
+    global _history
+    if _history is None:
+        _history = StatsHistory(
+            Config.get("stats_history.path", "video/stats_history.db")
+        )
+    return _history
@@ -0,0 +1,219 @@
+import math
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from config import Config
+from pipeline.metadata_store import get_metadata_store
+from pipeline.quota import get_quota_budget, seconds_until_reset
+from pipeline.track_video_stats import GROWTH_ALERT_THRESHOLD, update_stats
+from pipeline.youtube_client import get_youtube_service
+from pipeline.youtube_stats import get_stats_settings
+
+# [age under this many hours, poll every this many minutes]; older videos
+# fall through to max_interval_hours
+DEFAULT_TIERS = [[24, 10], [168, 60], [720, 360]]
+
+
+def get_schedule_settings():
+    return {
+        "tiers": Config.get("youtube.stats.schedule.tiers", DEFAULT_TIERS),
+        "min_interval": Config.get("youtube.stats.schedule.min_interval_minutes", 5)
+        * 60,
+        "max_interval": Config.get("youtube.stats.schedule.max_interval_hours", 24)
+        * 3600,
+        "hot_views_per_hour": Config.get(
+            "youtube.stats.schedule.hot_views_per_hour", GROWTH_ALERT_THRESHOLD
+        ),
+        "quota_share": Config.get("youtube.stats.schedule.quota_share", 0.5),
+        "tick": Config.get("youtube.stats.schedule.tick_seconds", 60),
+    }
+
+
+def parse_time(value: Optional[str]) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def video_age_hours(entry: Dict, now: datetime) -> Optional[float]:
+    published = parse_time(
+        entry.get("uploaded_at") or entry.get("thumbnail_used_at")
+    ) or parse_time(entry.get("timestamp"))
+    if published is None:
+        return None
+    return max(0.0, (now - published).total_seconds() / 3600)
+
+
+def recent_growth(entry: Dict) -> float:
+    """Smoothed views per hour from the entry's growth detector state."""
+    return entry.get("growth", {}).get("fast", 0.0)
+
+
+def poll_interval(age_hours: Optional[float], growth: float, settings: Dict) -> float:
+    """Seconds between checks: short for new or fast-growing videos.
+
+    Age picks the base interval from the tiers; growth then divides it,
+    halving it at hot_views_per_hour and shrinking it further above.
+    """
+    interval = settings["max_interval"]
+    if age_hours is not None:
+        for max_age, minutes in settings["tiers"]:
+            if age_hours < max_age:
+                interval = minutes * 60
+                break
+    interval /= 1 + growth / settings["hot_views_per_hour"]
+    return min(settings["max_interval"], max(settings["min_interval"], interval))
+
+
+def quota_stretch(intervals: List[float], allowance: float, page_size: int) -> float:
+    """Factor to lengthen every interval by so polling fits the allowance.
+
+    One videos.list call covers page_size videos, so a day's calls are
+    about the total checks per day divided by page_size.
+    """
+    if not intervals or allowance <= 0:
+        return 1.0
+    calls_per_day = sum(86400 / i for i in intervals) / page_size
+    return max(1.0, calls_per_day / allowance)
+
+
+class StatsScheduler:
+    """Polls each uploaded video on its own interval within a quota budget.
+
+    Every tick, videos whose next check is due are fetched together in
+    50-ID pages, most overdue first, and their intervals are recomputed
+    from age and latest growth. If the intervals would spend more than
+    quota_share of the daily budget, all of them are stretched evenly.
+    Polling may spend at most that share; pages beyond what's left of it
+    today wait for the next tick.
+    """
+
+    def __init__(
+        self,
+        youtube=None,
+        service_factory=None,
+        budget=None,
+        store=None,
+        settings: Optional[Dict] = None,
+    ):
+        self.service_factory = service_factory or get_youtube_service
+        self.youtube = youtube
+        self.budget = budget or get_quota_budget()
+        self.store = store or get_metadata_store()
+        self.settings = settings or get_schedule_settings()
+        # Polling never gets more than its share, so uploads keep the rest
+        self.poll_budget = self.budget.share("stats", self.settings["quota_share"])
+        self.page_size = get_stats_settings()["page_size"]
+        self.stretch = 1.0
+        # When each video was last tried, so a deleted video or a failed
+        # page waits for its interval instead of being retried every tick
+        self._tried: Dict[int, datetime] = {}
+
+    def interval_of(self, entry: Dict, now: datetime) -> float:
+        return entry.get("poll_interval") or poll_interval(
+            video_age_hours(entry, now), 0.0, self.settings
+        )
+
+    def due_in(self, entry: Dict, now: datetime) -> float:
+        """Seconds until entry should be checked; <= 0 means now."""
+        times = [
+            parse_time(entry.get("last_checked_at")),
+            self._tried.get(entry["_id"]),
+        ]
+        times = [t for t in times if t is not None]
+        if not times:
+            return -math.inf
+        last = max(times)
+        wait = self.interval_of(entry, now) * self.stretch
+        return wait - (now - last).total_seconds()
+
+    def tick(self, now: Optional[datetime] = None) -> Dict:
+        now = now or datetime.utcnow()
+        entries = self.store.uploaded_entries()
+        allowance = self.poll_budget.daily_units
+        self.stretch = quota_stretch(
+            [self.interval_of(e, now) for e in entries], allowance, self.page_size
+        )
+
+        waits = {e["_id"]: self.due_in(e, now) for e in entries}
+        due = sorted(
+            (e for e in entries if waits[e["_id"]] <= 0), key=lambda e: waits[e["_id"]]
+        )
+        affordable = self.poll_budget.remaining() * self.page_size
+        skipped = max(0, len(due) - affordable)
+        due = due[:affordable]
+
+        logs = []
+        if due:
+            if self.youtube is None:
+                self.youtube = self.service_factory()
+            logs = update_stats(
+                self.youtube,
+                due,
+                service_factory=self.service_factory,
+                budget=self.poll_budget,
+            )
+            for entry in due:
+                self._tried[entry["_id"]] = now
+                entry["poll_interval"] = round(
+                    poll_interval(
+                        video_age_hours(entry, now),
+                        recent_growth(entry),
+                        self.settings,
+                    )
+                )
+            self.store.save_entries(due)
+
+        waits = [self.due_in(e, now) for e in entries]
+        next_in = min(waits, default=self.settings["tick"])
+        if skipped:
+            # Nothing more can be fetched until some quota is freed or reset
+            next_in = self.settings["tick"]
+        return {
+            "checked": len(due),
+            "skipped": skipped,
+            "calls": math.ceil(len(due) / self.page_size),
+            "stretch": self.stretch,
+            "next_in": max(0.0, next_in),
+            "logs": logs,
+        }
+
+    def run(self, stop: Optional[threading.Event] = None) -> None:
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            result = self.tick()
+            if result["checked"]:
+                print(
+                    f"⏱️ Checked {result['checked']} videos in {result['calls']} calls "
+                    f"({self.poll_budget.remaining()} polling quota units left today)"
+                )
+            if result["skipped"]:
+                hours = seconds_until_reset() / 3600
+                print(
+                    f"⚠️ Quota budget reached; {result['skipped']} checks deferred "
+                    f"(resets in {hours:.1f}h)"
+                )
+            # Wake for the next due video, but at least once per tick
+            stop.wait(min(max(result["next_in"], 5), self.settings["tick"]))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Poll video stats on a schedule")
+    parser.add_argument(
+        "--once", action="store_true", help="check what's due now and exit"
+    )
+    args = parser.parse_args()
+
+    scheduler = StatsScheduler()
+    if args.once:
+        result = scheduler.tick()
+        print(f"✅ Checked {result['checked']} videos in {result['calls']} calls")
+    else:
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            print("👋 Scheduler stopped")
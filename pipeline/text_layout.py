@@ -0,0 +1,202 @@
+import functools
+from typing import List, NamedTuple, Optional, Tuple
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+# Tried in order when the configured face isn't installed
+FALLBACK_FACES = ("arialbd.ttf", "Arial Bold.ttf", "DejaVuSans-Bold.ttf")
+
+
+class TextLayout(NamedTuple):
+    font: ImageFont.ImageFont
+    size: int
+    lines: List[str]
+    line_height: int
+    width: int
+    height: int
+
+
+@functools.lru_cache(maxsize=256)
+def load_font(face: Optional[str], size: int) -> ImageFont.ImageFont:
+    """Load a font once per (face, size); later calls are a dict lookup."""
+    for candidate in (face, *FALLBACK_FACES):
+        if not candidate:
+            continue
+        try:
+            return ImageFont.truetype(candidate, size)
+        except OSError:
+            continue
+    try:
+        # Pillow >= 10.1 ships a scalable default font
+        return ImageFont.load_default(size)
+    except TypeError:
+        return ImageFont.load_default()
+
+
+@functools.lru_cache(maxsize=65536)
+def word_width(face: Optional[str], size: int, word: str) -> float:
+    # Titles share most of their words, so bulk re-renders mostly hit here
+    return load_font(face, size).getlength(word)
+
+
+@functools.lru_cache(maxsize=256)
+def line_height(face: Optional[str], size: int, spacing: float) -> int:
+    font = load_font(face, size)
+    if hasattr(font, "getmetrics"):
+        ascent, descent = font.getmetrics()
+    else:
+        ascent, descent = size, 0
+    return int(round((ascent + descent) * spacing))
+
+
+def wrap_words(
+    words: List[str], widths: List[float], space: float, max_width: float
+) -> Tuple[List[str], float]:
+    """Greedy word wrap from precomputed widths; returns lines and widest line."""
+    lines = []
+    current: List[str] = []
+    current_width = 0.0
+    widest = 0.0
+    for word, width in zip(words, widths):
+        extended = current_width + space + width if current else width
+        if current and extended > max_width:
+            lines.append(" ".join(current))
+            widest = max(widest, current_width)
+            current, current_width = [word], width
+        else:
+            current.append(word)
+            current_width = extended
+    if current:
+        lines.append(" ".join(current))
+        widest = max(widest, current_width)
+    return lines, widest
+
+
+def measure(
+    words: List[str],
+    face: Optional[str],
+    size: int,
+    max_width: float,
+    spacing: float,
+    stroke_width: int,
+) -> TextLayout:
+    widths = [word_width(face, size, word) for word in words]
+    space = word_width(face, size, " ")
+    # The stroke grows every glyph outward on both sides
+    padding = 2 * stroke_width
+    lines, widest = wrap_words(words, widths, space, max_width - padding)
+    height = line_height(face, size, spacing)
+    return TextLayout(
+        font=load_font(face, size),
+        size=size,
+        lines=lines,
+        line_height=height,
+        width=int(widest) + padding,
+        height=height * len(lines) + padding,
+    )
+
+
+def fits(layout: TextLayout, max_width: float, max_height: float) -> bool:
+    return layout.width <= max_width and layout.height <= max_height
+
+
+def fit_text(
+    text: str,
+    max_width: float,
+    max_height: float,
+    face: Optional[str] = None,
+    max_size: int = 96,
+    min_size: int = 24,
+    spacing: float = 1.1,
+    stroke_width: int = 0,
+) -> TextLayout:
+    """Lay text out at the largest font size that fits the box.
+
+    Larger sizes never fit better, so the size is binary searched. When
+    even min_size overflows, the min_size layout is returned as is.
+    """
+    words = text.split()
+    best = measure(words, face, min_size, max_width, spacing, stroke_width)
+    low, high = min_size + 1, max_size
+    while low <= high:
+        size = (low + high) // 2
+        layout = measure(words, face, size, max_width, spacing, stroke_width)
+        if fits(layout, max_width, max_height):
+            best = layout
+            low = size + 1
+        else:
+            high = size - 1
+    return best
+
+
+def draw_text(
+    img: Image.Image,
+    layout: TextLayout,
+    box: Tuple[int, int, int, int],
+    fill: str = "white",
+    stroke_width: int = 0,
+    stroke_fill: str = "black",
+    shadow_offset: int = 0,
+    shadow_fill: str = "black",
+    shadow_blur: int = 0,
+    valign: str = "bottom",
+) -> Image.Image:
+    """Draw a laid-out block centered horizontally within box.
+
+    box is (left, top, right, bottom); valign places the block at the
+    "top", "middle" or "bottom" of it. Returns an RGBA image.
+    """
+    img = img.convert("RGBA")
+    left, top, right, bottom = box
+    if valign == "top":
+        y = top
+    elif valign == "middle":
+        y = top + (bottom - top - layout.height) // 2
+    else:
+        y = bottom - layout.height
+    y += stroke_width
+
+    positions = []
+    for line in layout.lines:
+        width = layout.font.getlength(line)
+        positions.append((left + (right - left - width) / 2, y, line))
+        y += layout.line_height
+
+    if shadow_offset or shadow_blur:
+        # Only the strip under the text is blurred; blurring the whole
+        # image dominated the cost of an overlay
+        pad = stroke_width + shadow_offset + 3 * shadow_blur
+        region = (
+            max(0, left - pad),
+            max(0, positions[0][1] - stroke_width - pad) if positions else 0,
+            min(img.width, right + pad),
+            min(img.height, y + pad),
+        )
+        shadow = Image.new(
+            "RGBA", (region[2] - region[0], region[3] - region[1]), (0, 0, 0, 0)
+        )
+        shadow_draw = ImageDraw.Draw(shadow)
+        for x, line_y, line in positions:
+            shadow_draw.text(
+                (x + shadow_offset - region[0], line_y + shadow_offset - region[1]),
+                line,
+                font=layout.font,
+                fill=shadow_fill,
+                stroke_width=stroke_width,
+                stroke_fill=shadow_fill,
+            )
+        if shadow_blur:
+            shadow = shadow.filter(ImageFilter.GaussianBlur(shadow_blur))
+        img.alpha_composite(shadow, dest=region[:2])
+
+    draw = ImageDraw.Draw(img)
+    for x, line_y, line in positions:
+        draw.text(
+            (x, line_y),
+            line,
+            font=layout.font,
+            fill=fill,
+            stroke_width=stroke_width,
+            stroke_fill=stroke_fill,
+        )
+    return img
@@ -1,13 +1,25 @@
 import os
+import re
+import shutil
+import tempfile
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
 
 from dotenv import load_dotenv
-from elevenlabs import generate, save, set_api_key
 
-from config import Config, Environment
+from config import Config
+from pipeline.disk_cache import DiskCache
+from pipeline.ffmpeg_utils import run_ffmpeg
+from pipeline.tts_providers import create_provider
 
-# Load configuration
-Config.load_config(Environment.PRODUCTION)
-load_dotenv()
+_tts_cache = None
+_tts_settings = None
+_tts_provider = None
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+
+CHANNEL_LAYOUTS = {1: "mono", 2: "stereo"}
 
 
 def get_script_text(path):
@@ -15,32 +27,329 @@ def get_script_text(path):
         return f.read().strip().replace("*", "")
 
 
-def run_tts(script_text, output_path=None):
-    set_api_key(os.getenv("ELEVENLABS_API_KEY"))
+def get_tts_settings():
+    global _tts_settings
+    if _tts_settings is None:
+        _tts_settings = {
+            "provider": Config.get("api.elevenlabs.provider", "elevenlabs"),
+            "voice": Config.get("api.elevenlabs.default_voice", "Laura"),
+            "model": Config.get("api.elevenlabs.model"),
+            "stability": Config.get("api.elevenlabs.stability"),
+            "similarity_boost": Config.get("api.elevenlabs.similarity_boost"),
+        }
+    return dict(_tts_settings)
 
-    # Get configuration values
-    voice_id = Config.get("api.elevenlabs.default_voice", "Laura")
-    model = Config.get("api.elevenlabs.model")
-    stability = Config.get("api.elevenlabs.stability")
-    similarity_boost = Config.get("api.elevenlabs.similarity_boost")
 
-    print("🎤 Generating speech...")
-    audio = generate(
-        text=script_text,
-        voice=voice_id,
-        model=model,
-        stability=stability,
-        similarity_boost=similarity_boost,
+def get_tts_provider():
+    # One provider per process so batch jobs reuse its pooled connections
+    global _tts_provider
+    if _tts_provider is None:
+        load_dotenv()
+        _tts_provider = create_provider(
+            get_tts_settings()["provider"], Config.get("api.elevenlabs", {})
+        )
+    return _tts_provider
+
+
+def reset_tts_provider():
+    """Drop memoized settings and provider, e.g. after changing config."""
+    global _tts_settings, _tts_provider
+    _tts_settings = None
+    _tts_provider = None
+
+
+def get_tts_cache():
+    global _tts_cache
+    if _tts_cache is None:
+        _tts_cache = DiskCache(
+            Config.get("cache.tts.directory", ".cache/tts"),
+            max_bytes=Config.get("cache.tts.max_size", 524288000),
+            suffix=".mp3",
+        )
+    return _tts_cache
+
+
+def normalize_text(text):
+    # Whitespace and unicode form don't change the speech, so don't let them
+    # change the cache key either
+    text = unicodedata.normalize("NFC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def tts_cache_key(script_text, settings):
+    return DiskCache.make_key(
+        normalize_text(script_text),
+        settings["voice"],
+        settings["model"],
+        settings["stability"],
+        settings["similarity_boost"],
+        # Offline stand-in audio must never be served for real TTS requests
+        settings.get("provider", "elevenlabs"),
     )
 
-    if output_path:
-        # Ensure output directory exists
-        output_dir = os.path.dirname(output_path)
+
+def get_chunking_settings():
+    return {
+        "enabled": Config.get("api.elevenlabs.chunking.enabled", False),
+        "min_chars": Config.get("api.elevenlabs.chunking.min_chars", 1500),
+        "max_chars": Config.get("api.elevenlabs.chunking.max_chars", 800),
+        "max_concurrency": Config.get("api.elevenlabs.chunking.max_concurrency", 4),
+        "gap_ms": Config.get("api.elevenlabs.chunking.gap_ms", 350),
+    }
+
+
+def split_script(script_text, max_chars):
+    """Split a script into paragraph chunks of at most max_chars.
+
+    Paragraphs are kept whole so an edit only invalidates its own chunk;
+    oversized paragraphs are split at sentence, then word, boundaries.
+    """
+    chunks = []
+    for paragraph in re.split(r"\n\s*\n", script_text):
+        paragraph = normalize_text(paragraph)
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            chunks.append(paragraph)
+            continue
+
+        current = ""
+        for sentence in SENTENCE_BOUNDARY.split(paragraph):
+            pieces = [sentence]
+            if len(sentence) > max_chars:
+                pieces, piece = [], ""
+                for word in sentence.split():
+                    if piece and len(piece) + len(word) + 1 > max_chars:
+                        pieces.append(piece)
+                        piece = word
+                    else:
+                        piece = f"{piece} {word}".strip()
+                pieces.append(piece)
+
+            for piece in pieces:
+                if current and len(current) + len(piece) + 1 > max_chars:
+                    chunks.append(current)
+                    current = piece
+                else:
+                    current = f"{current} {piece}".strip()
+        if current:
+            chunks.append(current)
+    return chunks
+
+
+def write_audio(data, output_path):
+    # Ensure output directory exists
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    with open(output_path, "wb") as f:
+        f.write(data)
+    print(f"✅ Saved audio to {output_path}")
+
+
+def synthesize(script_text, settings, cache=None):
+    key = tts_cache_key(script_text, settings) if cache else None
+
+    if cache:
+        cached = cache.get_bytes(key)
+        if cached is not None:
+            print(
+                f"♻️ Reusing cached speech ({cache.hits} hits, {cache.misses} misses)"
+            )
+            return cached
+
+    print("🎤 Generating speech...")
+    audio = get_tts_provider().synthesize(script_text, settings)
+
+    if cache:
+        cache.put_bytes(key, audio)
+    return audio
+
+
+def stitch_audio(chunk_paths, output_path, gap_ms):
+    # Written beside the output and moved into place when complete: a
+    # truncated MP3 still decodes, so the build manifest would adopt it
+    part_path = f"{output_path}.part"
+    try:
+        _stitch_audio(chunk_paths, part_path, gap_ms)
+        os.replace(part_path, output_path)
+    except BaseException:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+
+
+def _stitch_audio(chunk_paths, output_path, gap_ms):
+    if len(chunk_paths) == 1:
+        shutil.copyfile(chunk_paths[0], output_path)
+        return
+
+    # Normalize every chunk to one format and pad all but the last with the
+    # same silence so paragraph breaks sound identical throughout
+    gap = gap_ms / 1000
+    sample_rate = Config.get("video.audio.sample_rate", 44100)
+    channels = Config.get("video.audio.channels", 2)
+    layout = CHANNEL_LAYOUTS.get(channels, f"{channels}c")
+    filters = []
+    for i in range(len(chunk_paths)):
+        pad = f",apad=pad_dur={gap}" if i < len(chunk_paths) - 1 else ""
+        filters.append(
+            f"[{i}:a]aformat=sample_fmts=fltp:sample_rates={sample_rate}:"
+            f"channel_layouts={layout}{pad}[a{i}]"
+        )
+    labels = "".join(f"[a{i}]" for i in range(len(chunk_paths)))
+    filters.append(f"{labels}concat=n={len(chunk_paths)}:v=0:a=1[out]")
+
+    args = []
+    for path in chunk_paths:
+        args += ["-i", path]
+    args += [
+        "-filter_complex",
+        ";".join(filters),
+        "-map",
+        "[out]",
+        "-c:a",
+        "libmp3lame",
+        "-b:a",
+        Config.get("video.audio.bitrate", "192k"),
+        # The .part name doesn't tell ffmpeg the container
+        "-f",
+        "mp3",
+        output_path,
+    ]
+    run_ffmpeg(args)
+
+
+def run_tts_chunked(chunks, settings, output_path, cache=None):
+    chunking = get_chunking_settings()
+    print(f"🎤 Generating speech in {len(chunks)} chunks...")
+
+    with tempfile.TemporaryDirectory() as work_dir:
+
+        def synthesize_chunk(index):
+            path = os.path.join(work_dir, f"chunk_{index:04d}.mp3")
+            with open(path, "wb") as f:
+                f.write(synthesize(chunks[index], settings, cache))
+            return path
+
+        workers = max(1, min(chunking["max_concurrency"], len(chunks)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            chunk_paths = list(pool.map(synthesize_chunk, range(len(chunks))))
+
+        target = output_path or os.path.join(work_dir, "stitched.mp3")
+        output_dir = os.path.dirname(target)
         if output_dir:
             os.makedirs(output_dir, exist_ok=True)
+        stitch_audio(chunk_paths, target, chunking["gap_ms"])
+
+        if not output_path:
+            with open(target, "rb") as f:
+                return f.read()
+
+    print(f"✅ Saved audio to {output_path}")
+    return None
+
+
+def print_stream_progress(bytes_written, elapsed, done=False):
+    status = "✅ Streamed" if done else "🔊 Streaming"
+    print(f"{status} {bytes_written / 1024:.1f} KB of speech in {elapsed:.1f}s")
+
+
+def stream_tts(
+    script_text,
+    output_path,
+    settings=None,
+    cache=None,
+    audio_stream=None,
+    progress=print_stream_progress,
+    progress_interval=1.0,
+):
+    """Write speech to output_path chunk by chunk as it is synthesized.
+
+    Only one network chunk is held in memory at a time. Bytes go to
+    output_path + ".part" (flushed after each chunk, so it can be probed
+    before synthesis finishes), which replaces output_path only once the
+    stream is complete, so a killed run never leaves truncated audio.
+    audio_stream may be any iterable of bytes; it defaults to the configured
+    provider's stream. Returns the number of bytes written.
+    """
+    settings = settings or get_tts_settings()
 
-        save(audio, output_path)
-        print(f"✅ Saved audio to {output_path}")
+    if audio_stream is None:
+        print("🎤 Streaming speech...")
+        audio_stream = get_tts_provider().stream(script_text, settings)
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    started = time.perf_counter()
+    last_report = started
+    bytes_written = 0
+    part_path = f"{output_path}.part"
+    try:
+        with open(part_path, "wb") as f:
+            for chunk in audio_stream:
+                if not chunk:
+                    continue
+                f.write(chunk)
+                f.flush()
+                bytes_written += len(chunk)
+
+                now = time.perf_counter()
+                if progress and now - last_report >= progress_interval:
+                    progress(bytes_written, now - started)
+                    last_report = now
+        os.replace(part_path, output_path)
+    except BaseException:
+        # A truncated file must never be mistaken for finished audio
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+
+    if progress:
+        progress(bytes_written, time.perf_counter() - started, done=True)
+
+    if cache:
+        cache.put_file(tts_cache_key(script_text, settings), output_path)
+    return bytes_written
+
+
+def run_tts(script_text, output_path=None, use_cache=True):
+    # Get configuration values
+    settings = get_tts_settings()
+    chunking = get_chunking_settings()
+
+    cache = (
+        get_tts_cache() if use_cache and Config.get("cache.tts.enabled", True) else None
+    )
+
+    # Short scripts read more naturally in one request
+    if chunking["enabled"] and len(script_text) >= chunking["min_chars"]:
+        chunks = split_script(script_text, chunking["max_chars"])
+        if len(chunks) > 1:
+            return run_tts_chunked(chunks, settings, output_path, cache)
+
+    if output_path and Config.get("api.elevenlabs.streaming", False):
+        cached = cache.get_path(tts_cache_key(script_text, settings)) if cache else None
+        if cached:
+            print(
+                f"♻️ Reusing cached speech ({cache.hits} hits, {cache.misses} misses)"
+            )
+            output_dir = os.path.dirname(output_path)
+            if output_dir:
+                os.makedirs(output_dir, exist_ok=True)
+            shutil.copyfile(cached, output_path)
+            print(f"✅ Saved audio to {output_path}")
+        else:
+            stream_tts(script_text, output_path, settings, cache)
+        return None
+
+    audio = synthesize(script_text, settings, cache)
+
+    if output_path:
+        write_audio(audio, output_path)
     else:
         return audio
 
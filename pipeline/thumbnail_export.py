@@ -0,0 +1,179 @@
+import os
+from io import BytesIO
+from typing import Dict, Optional, Tuple
+
+from PIL import Image, ImageFilter
+
+from config import Config
+
+# YouTube rejects custom thumbnails over 2MB
+DEFAULT_VARIANTS = {
+    "upload": {"width": 1280, "height": 720, "format": "jpeg", "max_bytes": 2000000},
+    "short": {"width": 1080, "height": 1920, "format": "jpeg", "max_bytes": 1000000},
+    "preview": {"width": 320, "height": 180, "format": "webp", "max_bytes": 30000},
+}
+
+EXTENSIONS = {"jpeg": ".jpg", "webp": ".webp", "png": ".png"}
+MIME_TYPES = {"jpeg": "image/jpeg", "webp": "image/webp", "png": "image/png"}
+
+
+def get_export_settings():
+    return {
+        "variants": Config.get("thumbnails.export.variants", DEFAULT_VARIANTS),
+        "min_quality": Config.get("thumbnails.export.min_quality", 40),
+        "max_quality": Config.get("thumbnails.export.max_quality", 90),
+        "backdrop_blur": Config.get("thumbnails.export.backdrop_blur", 40),
+    }
+
+
+def variant_path(source_path: str, name: str, fmt: str) -> str:
+    stem = os.path.splitext(source_path)[0]
+    return f"{stem}.{name}{EXTENSIONS[fmt]}"
+
+
+def fit_with_backdrop(
+    img: Image.Image, width: int, height: int, blur: int
+) -> Image.Image:
+    """Fit img inside width x height without cropping or distortion.
+
+    The empty bands are filled with a blurred, cover-scaled copy of the
+    image instead of flat bars. Same-aspect targets are a plain resize.
+    """
+    scale = min(width / img.width, height / img.height)
+    fg_size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+    if fg_size == (width, height):
+        return img.resize((width, height), Image.LANCZOS)
+
+    # Blur at low resolution and scale up: same look, a fraction of the cost
+    cover = max(width / img.width, height / img.height)
+    small = (
+        max(1, round(img.width * cover / 8)),
+        max(1, round(img.height * cover / 8)),
+    )
+    backdrop = img.resize(small, Image.BILINEAR).filter(
+        ImageFilter.GaussianBlur(max(1, blur // 8))
+    )
+    backdrop = backdrop.resize(
+        (round(img.width * cover), round(img.height * cover)), Image.BILINEAR
+    )
+    left = (backdrop.width - width) // 2
+    top = (backdrop.height - height) // 2
+    canvas = backdrop.crop((left, top, left + width, top + height))
+    canvas.paste(
+        img.resize(fg_size, Image.LANCZOS),
+        ((width - fg_size[0]) // 2, (height - fg_size[1]) // 2),
+    )
+    return canvas
+
+
+def _encode(img: Image.Image, fmt: str, quality: int) -> bytes:
+    buffer = BytesIO()
+    if fmt == "jpeg":
+        img.save(buffer, "JPEG", quality=quality, optimize=True, progressive=True)
+    elif fmt == "webp":
+        img.save(buffer, "WEBP", quality=quality, method=4)
+    else:
+        img.save(buffer, "PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def encode_under_budget(
+    img: Image.Image,
+    fmt: str,
+    max_bytes: Optional[int],
+    min_quality: int = 40,
+    max_quality: int = 90,
+) -> Tuple[bytes, int]:
+    """Encode at the highest quality whose output fits max_bytes.
+
+    Size grows with quality, so the quality is binary searched. If even
+    min_quality is too big, the min_quality encoding is returned.
+    """
+    if fmt == "png":
+        return _encode(img, fmt, 0), 0
+
+    top = _encode(img, fmt, max_quality)
+    if max_bytes is None or len(top) <= max_bytes:
+        # The usual case: the best quality already fits
+        return top, max_quality
+
+    best = _encode(img, fmt, min_quality)
+    best_quality = min_quality
+
+    low, high = min_quality + 1, max_quality - 1
+    while low <= high:
+        quality = (low + high) // 2
+        data = _encode(img, fmt, quality)
+        if len(data) <= max_bytes:
+            best, best_quality = data, quality
+            low = quality + 1
+        else:
+            high = quality - 1
+    return best, best_quality
+
+
+def export_variants(
+    img: Image.Image, source_path: str, settings=None
+) -> Dict[str, str]:
+    """Write every configured variant of one composed thumbnail.
+
+    The image is flattened once, and a variant with the same aspect as a
+    larger one is scaled from it rather than from the full-size source.
+    Returns {variant name: path}.
+    """
+    settings = settings or get_export_settings()
+    if img.mode != "RGB":
+        rgba = img.convert("RGBA")
+        img = Image.new("RGB", rgba.size, "black")
+        img.paste(rgba, mask=rgba.getchannel("A"))
+
+    variants = sorted(
+        settings["variants"].items(),
+        key=lambda item: item[1]["width"] * item[1]["height"],
+        reverse=True,
+    )
+    rendered: Dict[Tuple[int, int], Image.Image] = {}
+    paths = {}
+    for name, spec in variants:
+        width, height = spec["width"], spec["height"]
+        source = img
+        for (w, h), done in rendered.items():
+            if w * height == h * width and w >= width:
+                source = done
+                break
+        frame = fit_with_backdrop(source, width, height, settings["backdrop_blur"])
+        rendered.setdefault((width, height), frame)
+
+        data, _ = encode_under_budget(
+            frame,
+            spec["format"],
+            spec.get("max_bytes"),
+            settings["min_quality"],
+            settings["max_quality"],
+        )
+        path = variant_path(source_path, name, spec["format"])
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        paths[name] = path
+    return paths
+
+
+def ensure_variant(source_path: str, name: str, settings=None) -> Tuple[str, str]:
+    """Path and MIME type of one variant, exporting it if missing or stale.
+
+    Falls back to the source file when the variant isn't configured.
+    """
+    settings = settings or get_export_settings()
+    spec = settings["variants"].get(name)
+    if not spec:
+        return source_path, "image/png"
+
+    path = variant_path(source_path, name, spec["format"])
+    if not (
+        os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(source_path)
+    ):
+        with Image.open(source_path) as img:
+            export_variants(img, source_path, settings)
+    return path, MIME_TYPES[spec["format"]]
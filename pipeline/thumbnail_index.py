@@ -0,0 +1,259 @@
+import json
+import os
+import tempfile
+import threading
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+from PIL import Image
+
+from config import Config
+
+if TYPE_CHECKING:
+    import numpy as np
+
+HASH_SIZE = 8  # 8x8 low-frequency DCT block -> 64-bit hash
+SAMPLE_SIZE = 32
+
+_index = None
+# The shared index is updated from upload and thumbnail worker threads
+index_lock = threading.RLock()
+
+
+# numpy is imported on first use: scripts that only import this module
+# for the upload path shouldn't pay for it
+@lru_cache(maxsize=None)
+def _dct_matrix(n: int) -> "np.ndarray":
+    import numpy as np
+
+    # Orthonormal DCT-II basis; D @ X @ D.T is the 2-D DCT of X
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+@lru_cache(maxsize=None)
+def _bit_weights() -> "np.ndarray":
+    import numpy as np
+
+    return np.uint64(1) << np.arange(HASH_SIZE * HASH_SIZE, dtype=np.uint64)
+
+
+def image_pixels(img: Image.Image) -> "np.ndarray":
+    import numpy as np
+
+    small = img.convert("L").resize((SAMPLE_SIZE, SAMPLE_SIZE), Image.LANCZOS)
+    return np.asarray(small, dtype=np.float64)
+
+
+def phash_many(pixels: "np.ndarray") -> "np.ndarray":
+    """Perceptual hashes for a stack of 32x32 grayscale images, as uint64.
+
+    Each bit says whether one low-frequency DCT coefficient is above the
+    image's median, so re-encodes, resizes and small edits barely move it.
+    """
+    import numpy as np
+
+    dct = _dct_matrix(SAMPLE_SIZE)
+    coefficients = np.einsum("ij,njk,lk->nil", dct, pixels, dct)
+    low = coefficients[:, :HASH_SIZE, :HASH_SIZE].reshape(len(pixels), -1)
+    # The DC term is overall brightness, not structure
+    median = np.median(low[:, 1:], axis=1, keepdims=True)
+    bits = (low > median).astype(np.uint64)
+    return (bits * _bit_weights()).sum(axis=1, dtype=np.uint64)
+
+
+def phash(img: Image.Image) -> int:
+    return int(phash_many(image_pixels(img)[None])[0])
+
+
+def hamming(hashes: "np.ndarray", value: int) -> "np.ndarray":
+    """Bit distance from value to every hash in the array."""
+    import numpy as np
+
+    diff = hashes ^ np.uint64(value)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(diff).astype(np.int64)
+    return np.unpackbits(diff.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+class ThumbnailIndex:
+    """Persistent path -> perceptual hash index with near-duplicate lookup.
+
+    Files are re-hashed only when their size or mtime changes. Lookups
+    compare against every hash at once with vectorized XOR/popcount.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: str, max_distance: int = 6):
+        self.path = path
+        self.max_distance = max_distance
+        self.entries: Dict[str, Dict] = {}
+        self._paths: Optional[List[str]] = None
+        self._hashes: Optional["np.ndarray"] = None
+        self._clusters: Dict[int, Dict[str, str]] = {}
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        if data.get("version") == self.VERSION:
+            self.entries = data.get("entries", {})
+
+    def save(self) -> None:
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"version": self.VERSION, "entries": self.entries}, f)
+        os.replace(tmp_path, self.path)
+
+    def _arrays(self) -> Tuple[List[str], "np.ndarray"]:
+        import numpy as np
+
+        if self._paths is None:
+            self._paths = list(self.entries)
+            self._hashes = np.array(
+                [int(self.entries[p]["hash"], 16) for p in self._paths], dtype=np.uint64
+            )
+        return self._paths, self._hashes
+
+    def _changed(self) -> None:
+        self._paths = None
+        self._hashes = None
+        self._clusters = {}
+
+    def add(self, path: str, value: int) -> None:
+        stat = os.stat(path)
+        self.entries[path] = {
+            "hash": f"{value:016x}",
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+        }
+        self._changed()
+
+    def update(self, paths: Iterable[str]) -> int:
+        """Hash new or modified files and drop ones that no longer exist.
+
+        Returns how many index entries were added, refreshed or dropped.
+        """
+        import numpy as np
+
+        stale = []
+        for path in set(paths):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            known = self.entries.get(path)
+            if not known or (known["size"], known["mtime"]) != (
+                stat.st_size,
+                stat.st_mtime,
+            ):
+                stale.append(path)
+
+        missing = [p for p in self.entries if not os.path.exists(p)]
+        for path in missing:
+            del self.entries[path]
+            self._changed()
+
+        readable = []
+        pixels = []
+        for path in stale:
+            try:
+                with Image.open(path) as img:
+                    pixels.append(image_pixels(img))
+                readable.append(path)
+            except OSError as e:
+                print(f"⚠️ Could not hash {path}: {e}")
+        if readable:
+            for path, value in zip(readable, phash_many(np.stack(pixels))):
+                self.add(path, int(value))
+        return len(readable) + len(missing)
+
+    def hash_of(self, path: str) -> Optional[int]:
+        entry = self.entries.get(path)
+        return int(entry["hash"], 16) if entry else None
+
+    def nearest(
+        self, value: int, max_distance: Optional[int] = None, exclude=()
+    ) -> List[Tuple[str, int]]:
+        """Indexed paths within max_distance bits of value, closest first."""
+        import numpy as np
+
+        max_distance = self.max_distance if max_distance is None else max_distance
+        paths, hashes = self._arrays()
+        if not paths:
+            return []
+        distances = hamming(hashes, value)
+        matches = np.flatnonzero(distances <= max_distance)
+        found = [(paths[i], int(distances[i])) for i in matches]
+        return sorted(
+            [(p, d) for p, d in found if p not in exclude], key=lambda x: (x[1], x[0])
+        )
+
+    def clusters(self, max_distance: Optional[int] = None) -> Dict[str, str]:
+        """Map every indexed path to a representative of its duplicate group.
+
+        Near-duplicates are linked transitively; the representative is the
+        group's alphabetically first path so it is stable between runs.
+        """
+        import numpy as np
+
+        max_distance = self.max_distance if max_distance is None else max_distance
+        if max_distance in self._clusters:
+            return self._clusters[max_distance]
+        paths, hashes = self._arrays()
+        parent = list(range(len(paths)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for i in range(len(paths)):
+            # One vectorized row at a time keeps memory linear in N
+            for j in np.flatnonzero(
+                hamming(hashes[i + 1 :], hashes[i]) <= max_distance
+            ):
+                a, b = find(i), find(i + 1 + int(j))
+                if a != b:
+                    parent[max(a, b)] = min(a, b)
+
+        groups: Dict[int, List[str]] = {}
+        for i, path in enumerate(paths):
+            groups.setdefault(find(i), []).append(path)
+        clusters = {path: min(group) for group in groups.values() for path in group}
+        self._clusters[max_distance] = clusters
+        return clusters
+
+
+def get_thumbnail_index():
+    global _index
+    if _index is None:
+        _index = ThumbnailIndex(
+            Config.get("thumbnails.index.path", ".cache/thumbnail_index.json"),
+            max_distance=Config.get("thumbnails.index.max_distance", 6),
+        )
+    return _index
+
+
+def thumbnail_clusters(thumbnails: Iterable[str]) -> Dict[str, str]:
+    """Duplicate-group representative for each thumbnail path.
+
+    Paths that can't be hashed (missing files) map to themselves.
+    """
+    thumbnails = list(thumbnails)
+    with index_lock:
+        index = get_thumbnail_index()
+        if index.update(thumbnails):
+            index.save()
+        clusters = index.clusters()
+    return {thumb: clusters.get(thumb, thumb) for thumb in thumbnails}
@@ -0,0 +1,362 @@
+import heapq
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional
+
+LEADERBOARD_DIR = "video"
+SNAPSHOT_FILE = "thumbnail_scores.json"
+EVENTS_FILE = "thumbnail_events.jsonl"
+TOP_PERFORMERS_FILE = "top_performers.jsonl"
+LEGACY_TOP_PERFORMERS_FILE = "top_performers.json"
+
+# Fold the event log into the snapshot once it gets this long
+COMPACT_AFTER_EVENTS = 5000
+
+_leaderboard = None
+
+
+def score_of(uses: int, views: int) -> float:
+    return round(views / uses, 2) if uses > 0 else 0.0
+
+
+def default_group_of(thumb: str, members: Dict[str, str]) -> str:
+    """Group a new thumbnail with an already-ranked visual duplicate."""
+    from pipeline.thumbnail_index import get_thumbnail_index, index_lock
+
+    with index_lock:
+        index = get_thumbnail_index()
+        if index.update([thumb]):
+            index.save()
+        value = index.hash_of(thumb)
+        if value is None:
+            return thumb
+        nearest = index.nearest(value, exclude={thumb})
+    for path, _ in nearest:
+        if path in members:
+            return members[path]
+    return thumb
+
+
+class ThumbnailLeaderboard:
+    """Running uses/views/score per thumbnail group with a cached top-N.
+
+    Visual duplicates share a group, fixed when a thumbnail is first seen.
+    Every change is one appended line in an event log, replayed on top of
+    a periodically compacted snapshot. Scores live in a max-heap with lazy
+    deletion, so an update is O(log n), and the top-N list is cached until
+    a change could affect it; reading it is O(1) in the common case.
+
+    Several processes (uploads, stats polling, the dashboard) share the
+    files. Appends and compaction happen under a lock file, and each
+    process first folds in whatever the others appended since its last
+    read, so nothing is lost on compaction and top() stays current.
+    """
+
+    def __init__(
+        self,
+        directory: str = LEADERBOARD_DIR,
+        top_n: int = 10,
+        group_of: Optional[Callable[[str, Dict[str, str]], str]] = None,
+    ):
+        self.directory = directory
+        self.top_n = top_n
+        self.group_of = group_of or default_group_of
+        self.groups: Dict[str, Dict] = {}
+        self.members: Dict[str, str] = {}
+        self._heap: List = []
+        self._versions: Dict[str, int] = {}
+        self._top: Optional[List[Dict]] = None
+        self._events = 0
+        # How far into the event log this process has read, and which
+        # snapshot that offset belongs to
+        self._offset = 0
+        self._snapshot_id = None
+        self._lock = threading.Lock()
+        self._reload()
+
+    @property
+    def snapshot_path(self) -> str:
+        return os.path.join(self.directory, SNAPSHOT_FILE)
+
+    @property
+    def events_path(self) -> str:
+        return os.path.join(self.directory, EVENTS_FILE)
+
+    def _file_lock(self):
+        from pipeline.youtube_client import file_lock
+
+        os.makedirs(self.directory, exist_ok=True)
+        return file_lock(f"{self.events_path}.lock", timeout=60, stale=60)
+
+    def _current_snapshot_id(self):
+        # Compaction replaces the snapshot file, so this changes with it
+        try:
+            stat = os.stat(self.snapshot_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _reload(self) -> None:
+        self.groups = {}
+        self.members = {}
+        self._snapshot_id = self._current_snapshot_id()
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            self.groups = snapshot.get("groups", {})
+            self.members = snapshot.get("members", {})
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+
+        self._offset = 0
+        self._events = 0
+        self._read_events()
+        self._versions = {}
+        self._heap = []
+        for group in self.groups:
+            self._push(group)
+        self._top = None
+
+    def _read_events(self) -> List[str]:
+        """Apply complete lines appended since the last read; return groups."""
+        try:
+            with open(self.events_path, "rb") as f:
+                f.seek(self._offset)
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        # A line still being written (or torn by a crash) is left for later
+        data = data[: data.rfind(b"\n") + 1]
+        self._offset += len(data)
+        groups = []
+        for line in data.splitlines():
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                # A torn line from a crash mid-append
+                continue
+            groups.append(self._apply(event))
+            self._events += 1
+        return groups
+
+    def _sync(self) -> None:
+        """Catch up with events other processes have written.
+
+        Callers hold the file lock, so a compaction is never half done.
+        """
+        try:
+            size = os.path.getsize(self.events_path)
+        except FileNotFoundError:
+            size = 0
+        if self._current_snapshot_id() != self._snapshot_id or size < self._offset:
+            # Someone compacted: their snapshot holds everything we had
+            self._reload()
+            return
+        if size == self._offset:
+            return
+        for group in self._read_events():
+            self._push(group)
+            if self._affects_top(group):
+                self._top = None
+
+    def _apply(self, event: Dict) -> str:
+        group = event["group"]
+        self.members[event["thumb"]] = group
+        totals = self.groups.setdefault(
+            group, {"uses": 0, "views": 0, "score": 0.0, "members": []}
+        )
+        if event["thumb"] not in totals["members"]:
+            totals["members"].append(event["thumb"])
+        totals["uses"] += event.get("uses", 0)
+        totals["views"] += event.get("views", 0)
+        totals["score"] = score_of(totals["uses"], totals["views"])
+        return group
+
+    def _push(self, group: str) -> None:
+        version = self._versions.get(group, 0) + 1
+        self._versions[group] = version
+        totals = self.groups[group]
+        heapq.heappush(self._heap, (-totals["score"], -totals["views"], group, version))
+        # Stale heap items are skipped on read; rebuild once they dominate
+        if len(self._heap) > 2 * len(self.groups) + 64:
+            self._heap = [
+                (-t["score"], -t["views"], g, self._versions[g])
+                for g, t in self.groups.items()
+            ]
+            heapq.heapify(self._heap)
+
+    def _affects_top(self, group: str) -> bool:
+        if self._top is None:
+            return False
+        if len(self._top) < self.top_n:
+            return True
+        if any(row["group"] == group for row in self._top):
+            return True
+        last = self._top[-1]
+        totals = self.groups[group]
+        return (totals["score"], totals["views"]) >= (last["score"], last["views"])
+
+    def record(self, thumb: str, uses: int = 0, views: int = 0) -> Dict:
+        """Add uses/views for a thumbnail and return its group's totals."""
+        with self._lock, self._file_lock():
+            self._sync()
+            group = self.members.get(thumb) or self.group_of(thumb, self.members)
+            event = {
+                "thumb": thumb,
+                "group": group,
+                "uses": uses,
+                "views": views,
+                "at": datetime.utcnow().isoformat(),
+            }
+            line = json.dumps(event) + "\n"
+            with open(self.events_path, "ab") as f:
+                if f.tell() > self._offset:
+                    # Bytes past our offset are a torn line; end it first
+                    line = "\n" + line
+                f.write(line.encode("utf-8"))
+                self._offset = f.tell()
+            self._events += 1
+
+            self._apply(event)
+            self._push(group)
+            if self._affects_top(group):
+                self._top = None
+            if self._events >= COMPACT_AFTER_EVENTS:
+                self._compact()
+            return dict(self.groups[group], group=group)
+
+    def totals(self, thumb: str) -> Optional[Dict]:
+        with self._lock, self._file_lock():
+            self._sync()
+            group = self.members.get(thumb)
+            if group is None:
+                return None
+            return dict(self.groups[group], group=group)
+
+    def top(self, n: Optional[int] = None) -> List[Dict]:
+        """The n best groups by score (then views), best first."""
+        n = n or self.top_n
+        with self._lock, self._file_lock():
+            self._sync()
+            if n > self.top_n:
+                return self._collect(n)
+            if self._top is None:
+                self._top = self._collect(self.top_n)
+            return self._top[:n]
+
+    def _collect(self, n: int) -> List[Dict]:
+        # Pop until n live items are found, then put them back: O(n log size)
+        popped = []
+        rows = []
+        while self._heap and len(rows) < n:
+            item = heapq.heappop(self._heap)
+            _, _, group, version = item
+            if self._versions.get(group) != version:
+                continue
+            popped.append(item)
+            rows.append(dict(self.groups[group], group=group))
+        for item in popped:
+            heapq.heappush(self._heap, item)
+        return rows
+
+    def rebuild(self, entries: Iterable[Dict]) -> None:
+        """Recompute everything from entries' thumbnail_stats (one full scan)."""
+        with self._lock, self._file_lock():
+            self.groups = {}
+            self.members = {}
+            for entry in entries:
+                for thumb, data in entry.get("thumbnail_stats", {}).items():
+                    group = self.members.get(thumb) or self.group_of(
+                        thumb, self.members
+                    )
+                    self._apply(
+                        {
+                            "thumb": thumb,
+                            "group": group,
+                            "uses": data.get("uses", 0),
+                            "views": data.get("views", 0),
+                        }
+                    )
+            self._versions = {}
+            self._heap = []
+            for group in self.groups:
+                self._push(group)
+            self._top = None
+            self._compact()
+
+    def compact(self) -> None:
+        with self._lock, self._file_lock():
+            self._sync()
+            self._compact()
+
+    def _compact(self) -> None:
+        # Callers hold the file lock and have synced, so this process has
+        # every event in the log
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"groups": self.groups, "members": self.members}, f)
+        os.replace(tmp_path, self.snapshot_path)
+        # Everything in the log is now in the snapshot
+        open(self.events_path, "w").close()
+        self._events = 0
+        self._offset = 0
+        self._snapshot_id = self._current_snapshot_id()
+
+    def exists(self) -> bool:
+        return os.path.exists(self.snapshot_path) or os.path.exists(self.events_path)
+
+
+def get_leaderboard(entries: Optional[Iterable[Dict]] = None) -> ThumbnailLeaderboard:
+    """Shared leaderboard; built from entries with one scan the first time."""
+    global _leaderboard
+    if _leaderboard is None:
+        _leaderboard = ThumbnailLeaderboard()
+        if not _leaderboard.exists() and entries is not None:
+            _leaderboard.rebuild(entries)
+    return _leaderboard
+
+
+def migrate_top_performers(directory: str = LEADERBOARD_DIR) -> None:
+    """Convert the old JSON array file into the append-only ledger."""
+    legacy = os.path.join(directory, LEGACY_TOP_PERFORMERS_FILE)
+    if not os.path.exists(legacy):
+        return
+    try:
+        with open(legacy, "r", encoding="utf-8") as f:
+            records = json.load(f)
+    except json.JSONDecodeError as e:
+        # Earlier r+ rewrites could leave trailing garbage; keep what parses
+        with open(legacy, "r", encoding="utf-8") as f:
+            text = f.read()
+        try:
+            records, _ = json.JSONDecoder().raw_decode(text)
+        except json.JSONDecodeError:
+            print(f"⚠️ Could not migrate {legacy}: {e}")
+            return
+
+    with open(os.path.join(directory, TOP_PERFORMERS_FILE), "a", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+    os.replace(legacy, f"{legacy}.migrated")
+
+
+def append_top_performer(record: Dict, directory: str = LEADERBOARD_DIR) -> None:
+    migrate_top_performers(directory)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, TOP_PERFORMERS_FILE), "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def load_top_performers(directory: str = LEADERBOARD_DIR) -> List[Dict]:
+    migrate_top_performers(directory)
+    try:
+        with open(
+            os.path.join(directory, TOP_PERFORMERS_FILE), "r", encoding="utf-8"
+        ) as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
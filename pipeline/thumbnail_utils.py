@@ -1,80 +1,381 @@
 import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from io import BytesIO
 
-import requests
 from dotenv import load_dotenv
-from openai import Client
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image
 
-load_dotenv()
-client = Client(api_key=os.getenv("OPENAI_API_KEY"))
+from config import Config
+from pipeline.disk_cache import DiskCache
+from pipeline.text_layout import draw_text, fit_text
+from pipeline.thumbnail_export import export_variants
+from pipeline.thumbnail_index import get_thumbnail_index, index_lock, phash
 
 THUMBNAIL_DIR = "thumbnails"
-os.makedirs(THUMBNAIL_DIR, exist_ok=True)
 
+_client = None
+_session = None
+_base_image_cache = None
+_session_lock = threading.Lock()
 
-def generate_image(prompt):
+
+def get_client():
+    global _client
+    if _client is None:
+        from openai import Client
+
+        load_dotenv()
+        _client = Client(api_key=os.getenv("OPENAI_API_KEY"))
+    return _client
+
+
+def get_thumbnail_settings():
+    return {
+        "model": Config.get("thumbnails.model", "dall-e-3"),
+        "size": Config.get("thumbnails.size", "1024x1024"),
+        "quality": Config.get("thumbnails.quality", "standard"),
+        "concurrency": Config.get("thumbnails.concurrency", 4),
+        "timeout": Config.get("thumbnails.download.timeout", 60),
+        "pool_size": Config.get("thumbnails.download.pool_size", 8),
+        "chunk_size": Config.get("thumbnails.download.chunk_size", 262144),
+    }
+
+
+def get_session():
+    """One keep-alive session for every image download, safe across threads."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            settings = get_thumbnail_settings()
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=4,
+                pool_maxsize=settings["pool_size"],
+                max_retries=Retry(
+                    total=3,
+                    backoff_factor=0.5,
+                    status_forcelist=(429, 500, 502, 503, 504),
+                ),
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+    return _session
+
+
+def download_bytes(url, settings=None):
+    settings = settings or get_thumbnail_settings()
+    buffer = BytesIO()
+    with get_session().get(url, stream=True, timeout=settings["timeout"]) as response:
+        response.raise_for_status()
+        for chunk in response.iter_content(chunk_size=settings["chunk_size"]):
+            buffer.write(chunk)
+    return buffer.getvalue()
+
+
+def download_image(url, settings=None):
+    return Image.open(BytesIO(download_bytes(url, settings))).convert("RGBA")
+
+
+def request_image(prompt, settings=None):
+    """Ask the image model for a picture and return its URL."""
+    settings = settings or get_thumbnail_settings()
     print(f"🎨 Generating image for: {prompt}")
-    response = client.images.generate(
-        model="dall-e-3", prompt=prompt, size="1024x1024", quality="standard", n=1
+    response = get_client().images.generate(
+        model=settings["model"],
+        prompt=prompt,
+        size=settings["size"],
+        quality=settings["quality"],
+        n=1,
     )
-    image_url = response.data[0].url
-    image_data = requests.get(image_url).content
-    return Image.open(BytesIO(image_data)).convert("RGBA")
+    return response.data[0].url
 
 
-def overlay_text(img, text):
-    draw = ImageDraw.Draw(img)
-    font_size = 80
-    try:
-        font = ImageFont.truetype("arialbd.ttf", font_size)
-    except IOError:
-        font = ImageFont.load_default()
-
-    max_width = img.width - 100
-    lines = []
-    words = text.split()
-    line = ""
-
-    for word in words:
-        test_line = f"{line} {word}".strip()
-        if draw.textlength(test_line, font=font) <= max_width:
-            line = test_line
-        else:
-            lines.append(line)
-            line = word
-    lines.append(line)
-
-    y_text = img.height - len(lines) * font_size - 100
-    for line in lines:
-        width = draw.textlength(line, font=font)
-        position = ((img.width - width) // 2, y_text)
-        draw.text(position, line, font=font, fill="white")
-        y_text += font_size + 10
-
-    return img
+def generate_image(prompt, settings=None):
+    return download_image(request_image(prompt, settings), settings)
+
+
+def get_base_image_cache():
+    global _base_image_cache
+    if _base_image_cache is None:
+        _base_image_cache = DiskCache(
+            Config.get("cache.thumbnails.directory", ".cache/thumbnails"),
+            max_bytes=Config.get("cache.thumbnails.max_size", 1073741824),
+            suffix=".png",
+        )
+    return _base_image_cache
+
+
+def base_image_key(prompt, settings):
+    return DiskCache.make_key(
+        prompt, settings["model"], settings["size"], settings["quality"]
+    )
+
+
+def get_base_image(prompt, settings, timings=None):
+    """Return the un-captioned image for a prompt, generating it on a miss.
+
+    The paid API call only happens once per prompt, model, size and
+    quality; title and styling changes re-caption the cached copy.
+    """
+    timings = {} if timings is None else timings
+    cache = (
+        get_base_image_cache() if Config.get("cache.thumbnails.enabled", True) else None
+    )
+    key = base_image_key(prompt, settings)
+
+    step = time.perf_counter()
+    cached = cache.get_path(key) if cache else None
+    if cached:
+        with Image.open(cached) as img:
+            base = img.convert("RGBA")
+        timings["cache"] = time.perf_counter() - step
+        return base
+
+    url = request_image(prompt, settings)
+    timings["generate"] = time.perf_counter() - step
+
+    step = time.perf_counter()
+    data = download_bytes(url, settings)
+    if cache:
+        cache.put_bytes(key, data)
+    timings["download"] = time.perf_counter() - step
+    return Image.open(BytesIO(data)).convert("RGBA")
+
+
+def is_base_image_cached(prompt, settings):
+    if not Config.get("cache.thumbnails.enabled", True):
+        return False
+    return os.path.exists(
+        get_base_image_cache().path_for(base_image_key(prompt, settings))
+    )
+
+
+def get_overlay_style():
+    return {
+        "font": Config.get("thumbnails.overlay.font", "arialbd.ttf"),
+        "max_size": Config.get("thumbnails.overlay.max_size", 96),
+        "min_size": Config.get("thumbnails.overlay.min_size", 28),
+        "line_spacing": Config.get("thumbnails.overlay.line_spacing", 1.1),
+        "margin": Config.get("thumbnails.overlay.margin", 50),
+        "max_height": Config.get("thumbnails.overlay.max_height", 0.4),
+        "fill": Config.get("thumbnails.overlay.fill", "white"),
+        "stroke_width": Config.get("thumbnails.overlay.stroke_width", 4),
+        "stroke_fill": Config.get("thumbnails.overlay.stroke_fill", "black"),
+        "shadow_offset": Config.get("thumbnails.overlay.shadow_offset", 4),
+        "shadow_blur": Config.get("thumbnails.overlay.shadow_blur", 3),
+    }
+
+
+def overlay_text(img, text, style=None):
+    """Caption the bottom of an image, sized to fit within the margins."""
+    style = style or get_overlay_style()
+    margin = style["margin"]
+    box = (margin, margin, img.width - margin, img.height - margin * 2)
+    max_height = min(box[3] - box[1], int(img.height * style["max_height"]))
+
+    layout = fit_text(
+        text,
+        box[2] - box[0],
+        max_height,
+        face=style["font"],
+        max_size=style["max_size"],
+        min_size=style["min_size"],
+        spacing=style["line_spacing"],
+        stroke_width=style["stroke_width"],
+    )
+    return draw_text(
+        img,
+        layout,
+        box,
+        fill=style["fill"],
+        stroke_width=style["stroke_width"],
+        stroke_fill=style["stroke_fill"],
+        shadow_offset=style["shadow_offset"],
+        shadow_blur=style["shadow_blur"],
+    )
 
 
 def slugify(text):
     return "".join(c if c.isalnum() else "_" for c in text.lower())[:40]
 
 
-def generate_thumbnails(entries):
-    for entry in entries:
-        if entry.get("thumbnail") and os.path.exists(entry["thumbnail"]):
-            continue
+def thumbnail_prompt(entry):
+    # Pinned once generated, so retitling an entry reuses its image
+    return (
+        entry.get("thumbnail_prompt")
+        or f"{entry['title']} as a dramatic AI-generated scene"
+    )
 
-        prompt = f"{entry['title']} as a dramatic AI-generated scene"
-        try:
-            img = generate_image(prompt)
-            img = overlay_text(img, entry["title"])
 
-            filename = os.path.join(
-                THUMBNAIL_DIR, f"{slugify(entry['title'])}_thumb.png"
-            )
-            img.save(filename)
-            entry["thumbnail"] = filename
-            print(f"✅ Saved thumbnail: {filename}")
-        except Exception as e:
-            print(f"❌ Failed to generate thumbnail for {entry['title']}: {e}")
+def overlay_fingerprint(style):
+    return DiskCache.make_key(style)[:16]
+
+
+def needs_thumbnail(entry, style_key):
+    """True when the entry has no thumbnail or its caption is out of date."""
+    if not (entry.get("thumbnail") and os.path.exists(entry["thumbnail"])):
+        return True
+    # Entries made before captions were tracked are left alone
+    if "thumbnail_title" not in entry:
+        return False
+    return (
+        entry["thumbnail_title"] != entry["title"]
+        or entry.get("thumbnail_style") != style_key
+    )
+
+
+def render_thumbnail(entry, settings, style=None):
+    """Get the base image, caption it and save one thumbnail.
+
+    Runs on a worker thread and never raises, so one failed entry can't
+    stop the rest of the batch.
+    """
+    style = style or get_overlay_style()
+    timings = {}
+    started = time.perf_counter()
+    prompt = thumbnail_prompt(entry)
+    try:
+        img = get_base_image(prompt, settings, timings)
+
+        step = time.perf_counter()
+        img = overlay_text(img, entry["title"], style)
+        filename = os.path.join(THUMBNAIL_DIR, f"{slugify(entry['title'])}_thumb.png")
+        img.save(filename)
+        timings["compose"] = time.perf_counter() - step
+
+        step = time.perf_counter()
+        variants = export_variants(img, filename)
+        timings["export"] = time.perf_counter() - step
+        image_hash = phash(img)
+        return {
+            "title": entry["title"],
+            "ok": True,
+            "thumbnail": filename,
+            "variants": variants,
+            "phash": image_hash,
+            "prompt": prompt,
+            "cached": "cache" in timings,
+            "seconds": time.perf_counter() - started,
+            "timings": timings,
+            "error": None,
+        }
+    except Exception as e:
+        return {
+            "title": entry.get("title"),
+            "ok": False,
+            "thumbnail": None,
+            "variants": {},
+            "phash": None,
+            "prompt": prompt,
+            "cached": "cache" in timings,
+            "seconds": time.perf_counter() - started,
+            "timings": timings,
+            "error": f"{type(e).__name__}: {e}",
+        }
+
+
+def record_duplicate(index, entry, result):
+    """Index a new thumbnail and flag it if it looks like an existing one."""
+    matches = index.nearest(
+        result["phash"], exclude={result["thumbnail"], entry.get("thumbnail")}
+    )
+    if matches:
+        duplicate, distance = matches[0]
+        entry["thumbnail_duplicate_of"] = duplicate
+        print(
+            f"♻️ {result['thumbnail']} is a near-duplicate of {duplicate} "
+            f"({distance} bits apart); their stats will be merged"
+        )
+    else:
+        entry.pop("thumbnail_duplicate_of", None)
+    index.add(result["thumbnail"], result["phash"])
+
+
+def print_thumbnail_progress(done, total, result):
+    if result["ok"]:
+        source = " from cached image" if result["cached"] else ""
+        print(
+            f"✅ [{done}/{total}] Saved thumbnail{source}: {result['thumbnail']} "
+            f"({result['seconds']:.1f}s)"
+        )
+    else:
+        print(
+            f"❌ [{done}/{total}] Failed to generate thumbnail for "
+            f"{result['title']}: {result['error']}"
+        )
+
+
+def generate_thumbnails(
+    entries,
+    concurrency=None,
+    progress=print_thumbnail_progress,
+    allow_generate=True,
+):
+    """Make thumbnails for entries without one or with a stale caption.
+
+    Up to `concurrency` entries run at once (default
+    thumbnails.concurrency). Base images come from the prompt-keyed cache
+    when possible, so a retitled entry is only re-captioned; with
+    allow_generate=False, entries that would need a new paid image are
+    skipped. Successful entries get their "thumbnail" path and caption
+    details set. Returns one result per processed entry, in input order,
+    with total seconds and per-step timings. `progress(done, total,
+    result)` is called as each one finishes.
+    """
+    os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+    settings = get_thumbnail_settings()
+    style = get_overlay_style()
+    style_key = overlay_fingerprint(style)
+    todo = [entry for entry in entries if needs_thumbnail(entry, style_key)]
+    if not allow_generate:
+        todo = [
+            entry
+            for entry in todo
+            if is_base_image_cached(thumbnail_prompt(entry), settings)
+        ]
+    if not todo:
+        return []
+
+    # The index is shared with uploads and other generators; every read
+    # and change goes through index_lock, but not the slow rendering
+    with index_lock:
+        index = get_thumbnail_index()
+        index.update(entry["thumbnail"] for entry in entries if entry.get("thumbnail"))
+    workers = max(1, min(concurrency or settings["concurrency"], len(todo)))
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(render_thumbnail, entry, settings, style): i
+            for i, entry in enumerate(todo)
+        }
+        for future in as_completed(futures):
+            position = futures[future]
+            result = future.result()
+            # Entries are only touched here, on the calling thread
+            if result["ok"]:
+                with index_lock:
+                    record_duplicate(index, todo[position], result)
+                todo[position].update(
+                    {
+                        "thumbnail": result["thumbnail"],
+                        "thumbnail_variants": result["variants"],
+                        "thumbnail_prompt": result["prompt"],
+                        "thumbnail_title": result["title"],
+                        "thumbnail_style": style_key,
+                    }
+                )
+            results[position] = result
+            if progress:
+                progress(len(results), len(todo), result)
+
+    with index_lock:
+        index.save()
+    return [results[i] for i in range(len(todo))]
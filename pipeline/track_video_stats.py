@@ -1,109 +1,123 @@
-import json
-import os
-import pickle
-from datetime import datetime
-
-from dotenv import load_dotenv
-from google.auth.transport.requests import Request
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+import time
+from datetime import datetime, timezone
 
 from pipeline.generate_thumbnail import generate_thumbnails
-
-load_dotenv()
+from pipeline.growth_detector import get_growth_detector
+from pipeline.metadata_store import load_entries, save_entries
+from pipeline.quota import get_quota_budget
+from pipeline.stats_history import get_stats_history
+from pipeline.thumbnail_leaderboard import get_leaderboard
+from pipeline.youtube_client import get_youtube_service
+from pipeline.youtube_stats import fetch_statistics
 
 # Config
-API_SERVICE_NAME = "youtube"
-API_VERSION = "v3"
-VIDEO_LOG = "video/metadata.jsonl"
-CREDENTIALS_FILE = "client_secret.json"
-TOKEN_PICKLE = "yt_tokens.pkl"
-SCOPES = [
-    "https://www.googleapis.com/auth/youtube.readonly",
-    "https://www.googleapis.com/auth/youtube.force-ssl",
-]
-GROWTH_ALERT_THRESHOLD = 50  # views/hour
-
-
-def get_authenticated_service():
-    creds = None
-    if os.path.exists(TOKEN_PICKLE):
-        with open(TOKEN_PICKLE, "rb") as token:
-            creds = pickle.load(token)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS_FILE, SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open(TOKEN_PICKLE, "wb") as token:
-            pickle.dump(creds, token)
-    return build(API_SERVICE_NAME, API_VERSION, credentials=creds)
-
-
-def load_entries():
-    with open(VIDEO_LOG, "r", encoding="utf-8") as f:
-        return [json.loads(line) for line in f if line.strip()]
-
-
-def save_entries(entries):
-    with open(VIDEO_LOG, "w", encoding="utf-8") as f:
-        for entry in entries:
-            f.write(json.dumps(entry) + "\n")
-
-
-def update_stats(youtube, entries):
-    for entry in entries:
-        if not entry.get("uploaded") or not entry.get("youtube_video_id"):
+GROWTH_ALERT_THRESHOLD = 50  # views/hour that counts as a hot video for polling
+
+
+def epoch(timestamp):
+    # Timestamps in entries are naive UTC ISO strings
+    return datetime.fromisoformat(timestamp).replace(tzinfo=timezone.utc).timestamp()
+
+
+def credit_thumbnail_views(entry, new_views):
+    """Attribute views gained since the last check to the live thumbnail.
+
+    Before the first check the previous count is 0, so that check credits
+    every view the video has had since it went up.
+    """
+    thumb = entry.get("thumbnail_used")
+    if not thumb or new_views <= 0:
+        return
+    stats = entry.setdefault("thumbnail_stats", {}).setdefault(
+        thumb, {"uses": 0, "views": 0, "score": 0.0}
+    )
+    stats["views"] = stats.get("views", 0) + new_views
+    uses = stats.get("uses", 0)
+    stats["score"] = round(stats["views"] / uses, 2) if uses > 0 else 0.0
+    get_leaderboard().record(thumb, views=new_views)
+
+
+def update_stats(youtube, entries, concurrency=None, service_factory=None, budget=None):
+    """Refresh views/likes/comments for every uploaded entry.
+
+    Stats come from batched videos.list calls (50 videos per request).
+    Returns the log lines, which are also printed.
+    """
+    logs = []
+
+    def log(line):
+        print(line)
+        logs.append(line)
+
+    tracked = [e for e in entries if e.get("uploaded") and e.get("youtube_video_id")]
+    fetched, errors = fetch_statistics(
+        youtube,
+        [e["youtube_video_id"] for e in tracked],
+        concurrency=concurrency,
+        service_factory=service_factory,
+        budget=budget,
+    )
+
+    for entry in tracked:
+        video_id = entry["youtube_video_id"]
+        if video_id in errors:
+            log(f"❌ Failed to fetch stats for {video_id}: {errors[video_id]}")
             continue
-
-        try:
-            response = (
-                youtube.videos()
-                .list(part="statistics", id=entry["youtube_video_id"])
-                .execute()
+        stats = fetched.get(video_id)
+        if stats is None:
+            # Keep the last known numbers; the video may be private for a while
+            entry.setdefault("missing_since", datetime.utcnow().isoformat())
+            log(f"⚠️ {entry['title']} ({video_id}) not found: deleted or private")
+            continue
+        entry.pop("missing_since", None)
+
+        views, likes, comments = stats["views"], stats["likes"], stats["comments"]
+        last_views = entry.get("views", 0)
+        last_check = entry.get("last_checked_at")
+
+        credit_thumbnail_views(entry, views - last_views)
+
+        entry["views"] = views
+        entry["likes"] = likes
+        entry["comments"] = comments
+        entry["last_checked_at"] = datetime.utcnow().isoformat()
+        get_stats_history().record(video_id, views, likes, comments)
+
+        log(f"📈 Stats for {entry['title']}: {views} views, {likes} likes")
+
+        # 🚨 Growth alerts against this video's own baseline
+        state = entry.get("growth")
+        if state is None and last_check:
+            # Start from the previous check so the first poll isn't wasted
+            state = {"t": epoch(last_check), "views": last_views, "n": 0}
+        state, alert = get_growth_detector().update(state, time.time(), views)
+        entry["growth"] = state
+        if alert:
+            kind = "escalating" if alert["escalated"] else "new surge"
+            log(
+                f"🚨 Growth alert ({kind}): {entry['title']} — "
+                f"{alert['rate']:.1f} views/hr vs usual {alert['baseline']:.1f} "
+                f"(z={alert['z']})"
             )
 
-            stats = response["items"][0]["statistics"]
-            views = int(stats.get("viewCount", 0))
-            likes = int(stats.get("likeCount", 0))
-            comments = int(stats.get("commentCount", 0))
-
-            last_views = entry.get("views", 0)
-            last_check = entry.get("last_checked_at")
-
-            entry["views"] = views
-            entry["likes"] = likes
-            entry["comments"] = comments
-            entry["last_checked_at"] = datetime.utcnow().isoformat()
-
-            print(f"📈 Stats for {entry['title']}: {views} views, {likes} likes")
-
-            # 🚨 Growth Alert Logic
-            if last_check:
-                try:
-                    prev_time = datetime.fromisoformat(last_check)
-                    hours_elapsed = (
-                        datetime.utcnow() - prev_time
-                    ).total_seconds() / 3600
-                    growth = (
-                        (views - last_views) / hours_elapsed if hours_elapsed > 0 else 0
-                    )
-                    if growth > GROWTH_ALERT_THRESHOLD:
-                        print(
-                            f"🚨 Growth alert: {entry['title']} — {views - last_views} new views in {hours_elapsed:.2f}h — {growth:.1f} views/hr"
-                        )
-                except Exception as e:
-                    print(f"⚠️ Could not compute growth for {entry['title']}: {e}")
-
-        except Exception as e:
-            print(f"❌ Failed to fetch stats for {entry.get('youtube_video_id')}: {e}")
+    return logs
 
 
 if __name__ == "__main__":
-    youtube = get_authenticated_service()
+    youtube = get_youtube_service()
     entries = load_entries()
-    update_stats(youtube, entries)
+    update_stats(
+        youtube,
+        entries,
+        service_factory=get_youtube_service,
+        budget=get_quota_budget(),
+    )
     generate_thumbnails(entries)
     save_entries(entries)
+    rolled = get_stats_history().maintain()
+    if rolled["raw_rolled"] or rolled["hourly_rolled"]:
+        print(
+            f"🗜️ Stats history: {rolled['raw_rolled']} samples rolled up to hourly, "
+            f"{rolled['hourly_rolled']} hourly points to daily"
+        )
     print("✅ All video stats updated.")
@@ -0,0 +1,219 @@
+import io
+import math
+import os
+import re
+import struct
+import threading
+import wave
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterator, Optional
+
+from pipeline.ffmpeg_utils import ffmpeg_available, transcode_bytes
+
+VOICE_ID_PATTERN = re.compile(r"^[A-Za-z0-9]{20}$")
+
+
+class TTSProvider(ABC):
+    """Turns text into encoded audio bytes.
+
+    Providers are long-lived: construct one per process and reuse it so any
+    connections or lookups it holds are shared across calls.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def stream(self, text: str, settings: Dict[str, Any]) -> Iterator[bytes]:
+        """Yield encoded audio as it arrives."""
+
+    def synthesize(self, text: str, settings: Dict[str, Any]) -> bytes:
+        return b"".join(self.stream(text, settings))
+
+
+def post_safe_retry(total: int = 3, backoff_factor: float = 1):
+    """urllib3 Retry that never resends a billed synthesis request.
+
+    A POST the server may have processed is not retried: only connection
+    failures and 429s are. GETs also retry on 5xx.
+    """
+    from urllib3.util.retry import Retry
+
+    class PostSafeRetry(Retry):
+        def is_retry(self, method, status_code, has_retry_after=False):
+            if method and method.upper() == "POST" and status_code != 429:
+                return False
+            return super().is_retry(method, status_code, has_retry_after)
+
+    return PostSafeRetry(
+        total=total,
+        connect=total,
+        # A read timeout means the request was sent and may have been billed
+        read=0,
+        backoff_factor=backoff_factor,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=None,
+    )
+
+
+class ElevenLabsProvider(TTSProvider):
+    """ElevenLabs REST API over one pooled, keep-alive HTTP session."""
+
+    name = "elevenlabs"
+    API_URL = "https://api.elevenlabs.io/v1"
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        timeout: float = 30,
+        pool_size: int = 8,
+        output_format: str = "mp3_44100_128",
+        stream_chunk_size: int = 4096,
+    ):
+        if not api_key:
+            raise ValueError("ELEVENLABS_API_KEY is not set")
+
+        self.timeout = timeout
+        self.output_format = output_format
+        self.stream_chunk_size = stream_chunk_size
+        self._voice_ids: Dict[str, str] = {}
+        self._voice_lock = threading.Lock()
+
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.session = requests.Session()
+        self.session.headers.update({"xi-api-key": api_key, "accept": "audio/mpeg"})
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            max_retries=post_safe_retry(),
+        )
+        self.session.mount("https://", adapter)
+
+    def resolve_voice(self, voice: str) -> str:
+        """Map a voice name to its ID, listing voices at most once."""
+        if VOICE_ID_PATTERN.match(voice):
+            return voice
+
+        with self._voice_lock:
+            if not self._voice_ids:
+                response = self.session.get(
+                    f"{self.API_URL}/voices",
+                    headers={"accept": "application/json"},
+                    timeout=self.timeout,
+                )
+                response.raise_for_status()
+                self._voice_ids = {
+                    v["name"]: v["voice_id"] for v in response.json()["voices"]
+                }
+
+        if voice not in self._voice_ids:
+            raise ValueError(f"Voice '{voice}' not found.")
+        return self._voice_ids[voice]
+
+    def _request(self, text: str, settings: Dict[str, Any], stream: bool):
+        voice_id = self.resolve_voice(settings["voice"])
+        suffix = "/stream" if stream else ""
+        response = self.session.post(
+            f"{self.API_URL}/text-to-speech/{voice_id}{suffix}",
+            params={"output_format": self.output_format},
+            json={
+                "text": text,
+                "model_id": settings["model"],
+                "voice_settings": {
+                    "stability": settings["stability"],
+                    "similarity_boost": settings["similarity_boost"],
+                },
+            },
+            timeout=self.timeout,
+            stream=stream,
+        )
+        response.raise_for_status()
+        return response
+
+    def synthesize(self, text: str, settings: Dict[str, Any]) -> bytes:
+        return self._request(text, settings, stream=False).content
+
+    def stream(self, text: str, settings: Dict[str, Any]) -> Iterator[bytes]:
+        with self._request(text, settings, stream=True) as response:
+            for chunk in response.iter_content(chunk_size=self.stream_chunk_size):
+                if chunk:
+                    yield chunk
+
+
+class LocalToneProvider(TTSProvider):
+    """Offline stand-in that emits a tone (or silence) as long as the speech.
+
+    Duration comes from the word count at a typical speaking rate, so render
+    throughput can be load-tested without network calls or TTS credits.
+    """
+
+    name = "local"
+
+    def __init__(
+        self,
+        words_per_minute: int = 150,
+        tone_hz: int = 0,
+        sample_rate: int = 22050,
+        stream_chunk_size: int = 65536,
+    ):
+        self.words_per_minute = words_per_minute
+        self.tone_hz = tone_hz
+        self.sample_rate = sample_rate
+        self.stream_chunk_size = stream_chunk_size
+
+    def duration_for(self, text: str) -> float:
+        words = len(text.split())
+        return max(0.5, words / self.words_per_minute * 60)
+
+    def _pcm(self, seconds: float) -> bytes:
+        total = int(seconds * self.sample_rate)
+        if not self.tone_hz:
+            return bytes(total * 2)
+
+        # An integer frequency repeats exactly every second, so build one
+        # second of 16-bit samples and tile it
+        one_second = struct.pack(
+            f"<{self.sample_rate}h",
+            *(
+                int(8000 * math.sin(2 * math.pi * self.tone_hz * i / self.sample_rate))
+                for i in range(self.sample_rate)
+            ),
+        )
+        repeats, remainder = divmod(total, self.sample_rate)
+        return one_second * repeats + one_second[: remainder * 2]
+
+    def synthesize(self, text: str, settings: Dict[str, Any]) -> bytes:
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(self.sample_rate)
+            wav.writeframes(self._pcm(self.duration_for(text)))
+
+        if not ffmpeg_available():
+            return buffer.getvalue()
+        # Keep the same container as real TTS output so .mp3 paths stay honest
+        return transcode_bytes(buffer.getvalue(), ["-f", "mp3", "-b:a", "64k"])
+
+    def stream(self, text: str, settings: Dict[str, Any]) -> Iterator[bytes]:
+        audio = self.synthesize(text, settings)
+        for start in range(0, len(audio), self.stream_chunk_size):
+            yield audio[start : start + self.stream_chunk_size]
+
+
+def create_provider(name: str, options: Dict[str, Any]) -> TTSProvider:
+    if name == "elevenlabs":
+        return ElevenLabsProvider(
+            os.getenv("ELEVENLABS_API_KEY"),
+            timeout=options.get("timeout", 30),
+            pool_size=options.get("pool_size", 8),
+            output_format=options.get("output_format", "mp3_44100_128"),
+        )
+    if name == "local":
+        local = options.get("local") or {}
+        return LocalToneProvider(
+            words_per_minute=local.get("words_per_minute", 150),
+            tone_hz=local.get("tone_hz", 0),
+        )
+    raise ValueError(f"Unknown TTS provider: {name}")
@@ -1,57 +1,24 @@
-import json
-import os
 import random
 from datetime import datetime
 
-from dotenv import load_dotenv
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaFileUpload
-
-load_dotenv()
-
-# YouTube API setup
-API_SERVICE_NAME = "youtube"
-API_VERSION = "v3"
-VIDEO_LOG = "video/metadata.jsonl"
-TOP_PERFORMERS_FILE = "video/top_performers.json"
-
-import pickle
-
-from google.auth.transport.requests import Request
-
-# Authentication assumes token.json already created via OAuth
-from google_auth_oauthlib.flow import InstalledAppFlow
-
-SCOPES = ["https://www.googleapis.com/auth/youtube.upload"]
-CREDENTIALS_FILE = "client_secret.json"
-TOKEN_PICKLE = "yt_tokens.pkl"
+from pipeline.build_manifest import hash_file
+from pipeline.metadata_store import (
+    ID_KEY,
+    get_metadata_store,
+    load_entries,
+    save_entries,
+)
+from pipeline.resumable_upload import get_resumable_settings, send_resumable
+from pipeline.thumbnail_export import ensure_variant
+from pipeline.thumbnail_index import thumbnail_clusters
+from pipeline.thumbnail_leaderboard import append_top_performer, get_leaderboard
 
 MAX_REUSE = 2
 LOCK_SCORE_THRESHOLD = 4.5
 
 
-def get_authenticated_service():
-    creds = None
-    if os.path.exists(TOKEN_PICKLE):
-        with open(TOKEN_PICKLE, "rb") as token:
-            creds = pickle.load(token)
-
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS_FILE, SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open(TOKEN_PICKLE, "wb") as token:
-            pickle.dump(creds, token)
-
-    return build(API_SERVICE_NAME, API_VERSION, credentials=creds)
-
-
 def load_next_video():
-    with open(VIDEO_LOG, "r", encoding="utf-8") as f:
-        entries = [json.loads(line) for line in f if line.strip()]
+    entries = load_entries()
 
     for i, entry in enumerate(entries):
         if not entry.get("uploaded", False):
@@ -60,9 +27,52 @@ def load_next_video():
     return None, None, entries
 
 
-def choose_thumbnail(entry):
-    thumbs = entry.get("thumbnails", [])
+def merged_thumbnail_stats(thumbs, stats):
+    """Pick one thumbnail per group of visual duplicates, with pooled stats.
+
+    Uses and views are summed across the group; it counts as locked or
+    reusable if any copy is, and disabled only if every copy is.
+    """
+    clusters = thumbnail_clusters(thumbs)
+    groups = {}
+    for thumb in thumbs:
+        groups.setdefault(clusters[thumb], []).append(thumb)
+
+    merged = {}
+    for group in groups.values():
+        group_stats = [stats.get(t, {}) for t in group]
+        # The most used copy represents the group, so its history continues
+        chosen = max(group, key=lambda t: stats.get(t, {}).get("uses", 0))
+        merged[chosen] = {
+            "uses": sum(s.get("uses", 0) for s in group_stats),
+            "views": sum(s.get("views", 0) for s in group_stats),
+            "locked": any(s.get("locked") is True for s in group_stats),
+            "reuse": any(s.get("reuse") is True for s in group_stats),
+            "disabled": all(s.get("disabled") for s in group_stats),
+        }
+    return list(merged), merged
+
+
+def pooled_views_and_uses(entry, thumb):
     stats = entry.get("thumbnail_stats", {})
+    clusters = thumbnail_clusters(stats)
+    group = [t for t in stats if clusters[t] == clusters[thumb]]
+    return (
+        sum(stats[t].get("views", 0) for t in group),
+        sum(stats[t].get("uses", 0) for t in group),
+    )
+
+
+def choose_thumbnail(entry):
+    """Pick a thumbnail to upload with, or None when the entry has none.
+
+    Entries with several candidates keep them in "thumbnails"; ones made
+    by generate_thumbnails only have a single "thumbnail".
+    """
+    candidates = entry.get("thumbnails") or [t for t in [entry.get("thumbnail")] if t]
+    if not candidates:
+        return None
+    thumbs, stats = merged_thumbnail_stats(candidates, entry.get("thumbnail_stats", {}))
 
     locked = [t for t in thumbs if stats.get(t, {}).get("locked") is True]
     reusable = [
@@ -84,7 +94,46 @@ def choose_thumbnail(entry):
         return random.choice(thumbs)  # fallback
 
 
-def upload_video(youtube, entry):
+def prepare_thumbnail(entry):
+    """Choose the thumbnail and export its upload variant before uploading.
+
+    Returns (thumbnail, (path, mime type)), or (None, None) when there is
+    nothing usable; the video then goes up without a custom thumbnail.
+    """
+    chosen_thumb = choose_thumbnail(entry)
+    if chosen_thumb is None:
+        print("⚠️ No thumbnail for this entry; uploading without one")
+        return None, None
+    try:
+        return chosen_thumb, ensure_variant(chosen_thumb, "upload")
+    except OSError as e:
+        print(f"⚠️ Thumbnail {chosen_thumb} is unusable ({e}); uploading without one")
+        return None, None
+
+
+def upload_video(youtube, entry, store=None, on_insert=None):
+    """Upload one entry's video and return its YouTube id.
+
+    on_insert is called once a new videos.insert has been sent, so the
+    caller knows its quota was spent even if the upload then fails.
+    """
+    from googleapiclient.http import MediaFileUpload
+
+    store = store or get_metadata_store()
+    content_hash = hash_file(entry["video"])
+    duplicate = store.find_uploaded_by_hash(content_hash)
+    if duplicate and duplicate[ID_KEY] != entry.get(ID_KEY):
+        # Same file queued twice: point at the existing video
+        print(
+            f"♻️ {entry['video']} is already on YouTube as "
+            f"{duplicate['youtube_video_id']}"
+        )
+        entry["content_hash"] = content_hash
+        entry["duplicate_of"] = duplicate[ID_KEY]
+        return duplicate["youtube_video_id"]
+
+    chosen_thumb, variant = prepare_thumbnail(entry)
+
     print(f"📤 Uploading: {entry['video']}")
     body = {
         "snippet": {
@@ -96,30 +145,72 @@ def upload_video(youtube, entry):
         "status": {"privacyStatus": "public"},
     }
 
-    media = MediaFileUpload(entry["video"], chunksize=-1, resumable=True)
+    settings = get_resumable_settings()
+    media = MediaFileUpload(
+        entry["video"], chunksize=settings["chunk_size"], resumable=True
+    )
     request = youtube.videos().insert(
         part=",".join(body.keys()), body=body, media_body=media
     )
-    chosen_thumb = choose_thumbnail(entry)
+
+    def save_session(session):
+        entry["upload_session"] = session
+        if ID_KEY in entry:
+            store.update_entry(entry[ID_KEY], {"upload_session": session})
+
+    response = send_resumable(
+        request,
+        entry["video"],
+        content_hash,
+        entry.get("upload_session"),
+        save_session,
+        settings["retries"],
+        on_insert,
+    )
+    video_id = response["id"]
+    print(f"✅ Upload complete! Video ID: {video_id}")
+
+    # The video is on YouTube now: record that before anything else can
+    # fail, so a retry finds it by hash instead of uploading it again
+    entry.pop("upload_session", None)
+    uploaded = {
+        "uploaded": True,
+        "youtube_video_id": video_id,
+        "uploaded_at": datetime.utcnow().isoformat(),
+        "content_hash": content_hash,
+    }
+    entry.update(uploaded)
+    if ID_KEY in entry:
+        store.update_entry(entry[ID_KEY], uploaded)
+
+    if chosen_thumb is not None:
+        try:
+            set_thumbnail(youtube, entry, chosen_thumb, variant, video_id)
+        except Exception as e:
+            print(f"⚠️ Uploaded, but recording the thumbnail failed: {e}")
+    return video_id
+
+
+def set_thumbnail(youtube, entry, chosen_thumb, variant, video_id):
+    """Set the custom thumbnail and credit it with one use."""
+    from googleapiclient.errors import HttpError
+    from googleapiclient.http import MediaFileUpload
+
+    # Counted only once the video is up, so a resumed upload counts once
     entry["thumbnail_used"] = chosen_thumb
     entry["thumbnail_used_at"] = datetime.utcnow().isoformat()
     entry.setdefault("thumbnail_stats", {}).setdefault(
         chosen_thumb, {"uses": 0, "views": 0, "score": 0.0}
     )
     entry["thumbnail_stats"][chosen_thumb]["uses"] += 1
+    ranked = get_leaderboard().record(chosen_thumb, uses=1)
 
-    response = None
-    while response is None:
-        status, response = request.next_chunk()
-        if status:
-            print(f"🔄 Upload progress: {int(status.progress() * 100)}%")
-
-    print(f"✅ Upload complete! Video ID: {response['id']}")
-
-    # Set the chosen thumbnail after upload
+    # Set as the compact 1280x720 export chosen before the upload
     try:
+        thumb_path, thumb_type = variant
         thumb_request = youtube.thumbnails().set(
-            videoId=response["id"], media_body=MediaFileUpload(chosen_thumb)
+            videoId=video_id,
+            media_body=MediaFileUpload(thumb_path, mimetype=thumb_type),
         )
         thumb_request.execute()
         print(f"🖼️ Thumbnail set: {chosen_thumb}")
@@ -127,16 +218,20 @@ def upload_video(youtube, entry):
         print(f"⚠️ Failed to set thumbnail: {e}")
 
     # Initialize performance score
-    entry["thumbnail_stats"][chosen_thumb]["last_used_video_id"] = response["id"]
+    entry["thumbnail_stats"][chosen_thumb]["last_used_video_id"] = video_id
     entry["thumbnail_stats"][chosen_thumb][
         "last_used_at"
     ] = datetime.utcnow().isoformat()
 
-    # Recalculate score: views / uses
-    views = entry["thumbnail_stats"][chosen_thumb]["views"]
-    uses = entry["thumbnail_stats"][chosen_thumb]["uses"]
+    # Recalculate score: views / uses, pooled over visual duplicates
+    views, uses = pooled_views_and_uses(entry, chosen_thumb)
     score = round(views / uses, 2) if uses > 0 else 0.0
     entry["thumbnail_stats"][chosen_thumb]["score"] = score
+    top = get_leaderboard().top()
+    for rank, row in enumerate(top, start=1):
+        if row["group"] == ranked["group"]:
+            print(f"🏆 {chosen_thumb} is #{rank} on the thumbnail leaderboard")
+            break
 
     # Auto-lock top performers
     if score >= LOCK_SCORE_THRESHOLD:
@@ -152,44 +247,30 @@ def upload_video(youtube, entry):
             "views": views,
             "uses": uses,
             "title": entry.get("title"),
-            "video_id": response["id"],
+            "video_id": video_id,
             "timestamp": datetime.utcnow().isoformat(),
         }
         append_to_top_performers(top_record)
 
-    return response["id"]
-
 
 def append_to_top_performers(record):
-    if not os.path.exists(TOP_PERFORMERS_FILE):
-        with open(TOP_PERFORMERS_FILE, "w") as f:
-            json.dump([record], f, indent=2)
-    else:
-        with open(TOP_PERFORMERS_FILE, "r+") as f:
-            data = json.load(f)
-            data.append(record)
-            f.seek(0)
-            json.dump(data, f, indent=2)
+    append_top_performer(record)
 
 
 def mark_uploaded(index, entries, video_id):
     entries[index]["uploaded"] = True
     entries[index]["youtube_video_id"] = video_id
-    with open(VIDEO_LOG, "w", encoding="utf-8") as f:
-        for entry in entries:
-            f.write(json.dumps(entry) + "\n")
+    entries[index]["uploaded_at"] = datetime.utcnow().isoformat()
+    # Only this entry changed; the store writes just its row
+    save_entries([entries[index]])
 
 
 if __name__ == "__main__":
-    youtube = get_authenticated_service()
-    entry, index, entries = load_next_video()
+    from pipeline.upload_worker import drain_queue
 
-    if not entry:
+    # Claims the entry like the batch worker, so the two never collide
+    if not load_next_video()[0]:
         print("🎉 All videos have been uploaded!")
         exit(0)
-
-    try:
-        video_id = upload_video(youtube, entry)
-        mark_uploaded(index, entries, video_id)
-    except HttpError as e:
-        print(f"❌ Upload failed: {e}")
+    if not drain_queue(concurrency=1, limit=1):
+        print("⚠️ Not enough quota left today for another upload")
@@ -1,19 +1,8 @@
 import json
 import os
 
-from dotenv import load_dotenv
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-
-# Load secrets from .env
-load_dotenv()
-
-# OAuth vars
-CLIENT_ID = os.getenv("YT_CLIENT_ID")
-CLIENT_SECRET = os.getenv("YT_CLIENT_SECRET")
-REFRESH_TOKEN = os.getenv("YT_REFRESH_TOKEN")
-TOKEN_URI = "https://oauth2.googleapis.com/token"
+from pipeline.thumbnail_export import ensure_variant
+from pipeline.youtube_client import get_upload_service
 
 # Video config
 VIDEO_FILE = "video/script_001.mp4"
@@ -25,19 +14,9 @@ CATEGORY_ID = "28"  # Tech
 PRIVACY_STATUS = "public"  # or "unlisted", "private"
 
 
-def get_youtube_service():
-    creds = Credentials(
-        None,
-        refresh_token=REFRESH_TOKEN,
-        client_id=CLIENT_ID,
-        client_secret=CLIENT_SECRET,
-        token_uri=TOKEN_URI,
-        scopes=["https://www.googleapis.com/auth/youtube.upload"],
-    )
-    return build("youtube", "v3", credentials=creds)
-
-
 def upload_video(youtube):
+    from googleapiclient.http import MediaFileUpload
+
     media = MediaFileUpload(VIDEO_FILE, mimetype="video/mp4", resumable=True)
 
     request = youtube.videos().insert(
@@ -70,15 +49,18 @@ def set_thumbnail(youtube, video_id):
         print("⚠️ No thumbnail found, skipping...")
         return
 
+    from googleapiclient.http import MediaFileUpload
+
     print("📸 Uploading thumbnail...")
+    thumb_path, thumb_type = ensure_variant(THUMBNAIL_FILE, "upload")
     request = youtube.thumbnails().set(
-        videoId=video_id, media_body=MediaFileUpload(THUMBNAIL_FILE)
+        videoId=video_id, media_body=MediaFileUpload(thumb_path, mimetype=thumb_type)
     )
     request.execute()
     print("✅ Thumbnail set.")
 
 
 if __name__ == "__main__":
-    youtube = get_youtube_service()
+    youtube = get_upload_service()
     video_id = upload_video(youtube)
     set_thumbnail(youtube, video_id)
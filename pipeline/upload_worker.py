@@ -0,0 +1,184 @@
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from config import Config
+from pipeline.metadata_store import get_metadata_store
+from pipeline.quota import COSTS, get_quota_budget
+from pipeline.upload_next_video import upload_video
+from pipeline.youtube_client import get_upload_service
+
+# One upload is the video plus its custom thumbnail
+UPLOAD_COST = COSTS["videos.insert"] + COSTS["thumbnails.set"]
+
+
+def get_upload_settings():
+    return {
+        "concurrency": Config.get("youtube.upload.concurrency", 3),
+        "claim_timeout": Config.get("youtube.upload.claim_timeout_hours", 3) * 3600,
+    }
+
+
+def is_quota_error(message: Optional[str]) -> bool:
+    # HttpError 403 with reason quotaExceeded / uploadLimitExceeded
+    return bool(message) and (
+        "quotaExceeded" in message or "uploadLimitExceeded" in message
+    )
+
+
+def print_upload_progress(done, total, result):
+    if result["ok"]:
+        print(
+            f"✅ [{done}/{total}] Uploaded {result['title']} as {result['video_id']} "
+            f"({result['seconds']:.1f}s)"
+        )
+    else:
+        print(f"❌ [{done}/{total}] {result['title']}: {result['error']}")
+
+
+def upload_claimed(entry: Dict, store, service_factory: Callable) -> Dict:
+    """Upload one claimed entry and record the outcome; never raises.
+
+    "charged" says whether a new videos.insert was sent in this attempt,
+    i.e. whether the quota spent on it is gone. Resuming an earlier
+    session or finding a duplicate costs nothing.
+    """
+    started = time.perf_counter()
+    result = {
+        "title": entry.get("title"),
+        "video": entry.get("video"),
+        "ok": False,
+        "charged": False,
+        "video_id": None,
+        "error": None,
+        "seconds": 0.0,
+    }
+
+    def charged():
+        result["charged"] = True
+
+    try:
+        video_id = upload_video(service_factory(), entry, store, on_insert=charged)
+        entry.pop("upload_claim", None)
+        entry.pop("upload_error", None)
+        entry.update(
+            {
+                "uploaded": True,
+                "youtube_video_id": video_id,
+                "uploaded_at": datetime.utcnow().isoformat(),
+            }
+        )
+        # Also keeps the thumbnail choice and stats upload_video recorded
+        store.save_entries([entry])
+        result.update(ok=True, video_id=video_id)
+    except Exception as e:
+        result["error"] = str(e)
+        # Back in the queue for the next run
+        store.release_claim(entry["_id"], {"upload_error": str(e)})
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+
+def drain_queue(
+    concurrency: Optional[int] = None,
+    limit: Optional[int] = None,
+    progress: Optional[Callable] = print_upload_progress,
+    budget=None,
+    store=None,
+    service_factory: Callable = get_upload_service,
+) -> List[Dict]:
+    """Upload queued videos with several uploads in flight at once.
+
+    Each worker pays for an upload from the shared daily quota budget,
+    then atomically claims the oldest queued entry, so parallel workers
+    (here or in other processes) never upload the same video. When the
+    budget can't cover another upload, or YouTube reports the quota is
+    used up, workers stop and the remaining videos stay queued. A video
+    that fails is tried once per run, and its quota is refunded if
+    YouTube never started the upload. limit counts successful uploads.
+    Returns one result dict per attempted upload.
+    """
+    settings = get_upload_settings()
+    budget = budget or get_quota_budget()
+    store = store or get_metadata_store()
+    queued = store.count_unuploaded()
+    total = min(queued, limit or queued)
+    if total <= 0 or budget.remaining() < UPLOAD_COST:
+        return []
+
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    stop = threading.Event()
+    lock = threading.Lock()
+    results: List[Dict] = []
+    # Each entry is tried once per run; a failure waits for the next run
+    # rather than being claimed straight back by the next worker
+    tried = set()
+    uploaded = [0]
+    active = [0]
+
+    def worker():
+        while not stop.is_set():
+            with lock:
+                if uploaded[0] + active[0] >= total:
+                    return
+                active[0] += 1
+            try:
+                if not budget.spend(UPLOAD_COST):
+                    stop.set()
+                    return
+                with lock:
+                    skip = set(tried)
+                entry = store.claim_next_unuploaded(
+                    owner, settings["claim_timeout"], skip=skip
+                )
+                if entry is None:
+                    budget.refund(UPLOAD_COST)
+                    return
+                with lock:
+                    tried.add(entry["_id"])
+                result = upload_claimed(entry, store, service_factory)
+                if not result["charged"]:
+                    budget.refund(UPLOAD_COST)
+            finally:
+                with lock:
+                    active[0] -= 1
+            if is_quota_error(result["error"]):
+                stop.set()
+            with lock:
+                uploaded[0] += result["ok"]
+                results.append(result)
+                done = len(results)
+            if progress:
+                progress(done, total, result)
+
+    workers = max(1, min(concurrency or settings["concurrency"], total))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(worker) for _ in range(workers)]
+    for future in futures:
+        # Surface errors from the budget or the store instead of dropping them
+        future.result()
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Upload every queued video")
+    parser.add_argument("--concurrency", type=int, help="uploads in flight at once")
+    parser.add_argument("--limit", type=int, help="stop after this many uploads")
+    args = parser.parse_args()
+
+    results = drain_queue(concurrency=args.concurrency, limit=args.limit)
+    left = get_metadata_store().count_unuploaded()
+    uploaded = sum(r["ok"] for r in results)
+    if not results and left:
+        print(
+            f"⚠️ {left} videos queued but today's quota budget has "
+            f"{get_quota_budget().remaining()} units left ({UPLOAD_COST} per upload)"
+        )
+    else:
+        print(f"🎉 Uploaded {uploaded} of {len(results)} attempted; {left} still queued")
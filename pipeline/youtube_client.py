@@ -0,0 +1,313 @@
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterable, Optional
+
+from config import Config
+
+API_SERVICE_NAME = "youtube"
+API_VERSION = "v3"
+DISCOVERY_URL = "https://www.googleapis.com/discovery/v1/apis/youtube/v3/rest"
+TOKEN_URI = "https://oauth2.googleapis.com/token"
+
+# One token covers everything: force-ssl also allows videos.insert and
+# thumbnails.set, so stats and uploads no longer fight over yt_tokens.pkl
+SCOPES = [
+    "https://www.googleapis.com/auth/youtube.readonly",
+    "https://www.googleapis.com/auth/youtube.force-ssl",
+]
+UPLOAD_SCOPES = ["https://www.googleapis.com/auth/youtube.upload"]
+
+# Broader scopes that include narrower ones, for tokens minted with less
+# than SCOPES (google-auth only compares scope strings)
+IMPLIED_SCOPES = {
+    "https://www.googleapis.com/auth/youtube": {
+        "https://www.googleapis.com/auth/youtube.readonly",
+        "https://www.googleapis.com/auth/youtube.upload",
+        "https://www.googleapis.com/auth/youtube.force-ssl",
+    },
+    "https://www.googleapis.com/auth/youtube.force-ssl": {
+        "https://www.googleapis.com/auth/youtube.readonly",
+        "https://www.googleapis.com/auth/youtube.upload",
+    },
+}
+
+# Refresh a little early so a token doesn't expire mid-request
+REFRESH_MARGIN = 300  # seconds
+
+_credentials = None
+_discovery_doc = None
+_lock = threading.RLock()
+_local = threading.local()
+
+
+def get_client_settings():
+    return {
+        "client_secrets": Config.get(
+            "youtube.auth.client_secrets", "client_secret.json"
+        ),
+        "token_file": Config.get("youtube.auth.token_file", "yt_tokens.pkl"),
+        "discovery_cache": Config.get(
+            "youtube.auth.discovery_cache", ".cache/discovery/youtube.v3.json"
+        ),
+        "timeout": Config.get("youtube.auth.timeout", 60),
+        "lock_timeout": Config.get("youtube.auth.lock_timeout", 120),
+    }
+
+
+@contextmanager
+def keep_lock_alive(path: str, interval: float = 30):
+    """Touch a held lock file every interval seconds.
+
+    For holders that may legitimately outlast file_lock's stale limit,
+    such as a person working through the browser consent screen.
+    """
+    done = threading.Event()
+
+    def touch():
+        while not done.wait(interval):
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                return
+
+    thread = threading.Thread(target=touch, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        done.set()
+        thread.join()
+
+
+@contextmanager
+def file_lock(path: str, timeout: float = 120, stale: float = 300):
+    """Cross-process lock: whoever creates path first holds it.
+
+    A lock file older than stale seconds is assumed to belong to a
+    crashed process and is taken over.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) > stale:
+                    os.remove(path)
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Timed out waiting for {path}")
+            time.sleep(0.1)
+    try:
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        yield
+    finally:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _needs_refresh(creds) -> bool:
+    if not creds.token or creds.expiry is None:
+        return not creds.valid
+    from datetime import datetime
+
+    # google-auth keeps expiry as naive UTC
+    return (creds.expiry - datetime.utcnow()).total_seconds() < REFRESH_MARGIN
+
+
+def _load_token(path: str):
+    try:
+        with open(path, "rb") as token:
+            return pickle.load(token)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        return None
+
+
+def _save_token(path: str, creds) -> None:
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "wb") as token:
+        pickle.dump(creds, token)
+    os.replace(tmp_path, path)
+
+
+def _covers(creds, scopes) -> bool:
+    if creds.has_scopes(scopes):
+        return True
+    granted = set(getattr(creds, "scopes", None) or ())
+    for scope in list(granted):
+        granted |= IMPLIED_SCOPES.get(scope, set())
+    return set(scopes) <= granted
+
+
+def _env_credentials(scopes):
+    """Credentials from YT_REFRESH_TOKEN, with the scopes it was granted.
+
+    A refresh token can't be widened at refresh time (Google answers
+    invalid_scope), so the credentials carry YT_SCOPES, defaulting to the
+    youtube.upload scope generate_refresh_token.py asks for. A token that
+    doesn't cover the requested scopes must be minted again with them.
+    """
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    if not os.getenv("YT_REFRESH_TOKEN"):
+        return None
+    from google.oauth2.credentials import Credentials
+
+    granted = os.getenv("YT_SCOPES", "").replace(",", " ").split() or UPLOAD_SCOPES
+    creds = Credentials(
+        None,
+        refresh_token=os.getenv("YT_REFRESH_TOKEN"),
+        client_id=os.getenv("YT_CLIENT_ID"),
+        client_secret=os.getenv("YT_CLIENT_SECRET"),
+        token_uri=TOKEN_URI,
+        scopes=granted,
+    )
+    if not _covers(creds, scopes):
+        raise RuntimeError(
+            f"YT_REFRESH_TOKEN was granted {' '.join(granted)}, not "
+            f"{' '.join(scopes)}; mint a new one with those scopes and set "
+            "YT_SCOPES to match"
+        )
+    return creds
+
+
+def get_credentials(scopes: Optional[Iterable[str]] = None):
+    """OAuth credentials shared by every client in this process.
+
+    The saved token is read once. Refreshing (or the first browser
+    consent) happens under a lock file next to the token, and the token
+    is re-read inside the lock, so when several processes start with an
+    expired token only one of them refreshes it and the rest reuse it.
+    """
+    global _credentials
+    scopes = list(scopes or SCOPES)
+    with _lock:
+        creds = _credentials
+        if creds is not None and _covers(creds, scopes) and not _needs_refresh(creds):
+            return creds
+
+        settings = get_client_settings()
+        token_file = settings["token_file"]
+        if creds is None:
+            creds = _load_token(token_file)
+        if creds is not None and _covers(creds, scopes) and not _needs_refresh(creds):
+            _credentials = creds
+            return creds
+
+        lock_path = f"{token_file}.lock"
+        with file_lock(lock_path, timeout=settings["lock_timeout"]):
+            # Another process may have refreshed it while we waited
+            creds = _load_token(token_file)
+            if creds is None or not _covers(creds, scopes):
+                creds = _env_credentials(scopes)
+            if creds is not None and _needs_refresh(creds) and creds.refresh_token:
+                from google.auth.transport.requests import Request
+
+                creds.refresh(Request())
+            elif creds is None or not creds.valid:
+                from google_auth_oauthlib.flow import InstalledAppFlow
+
+                flow = InstalledAppFlow.from_client_secrets_file(
+                    settings["client_secrets"], scopes
+                )
+                # Consent can take longer than the lock's stale limit; keep
+                # other processes from taking the lock over meanwhile
+                with keep_lock_alive(lock_path):
+                    creds = flow.run_local_server(port=0)
+            _save_token(token_file, creds)
+        _credentials = creds
+        return creds
+
+
+def get_discovery_document() -> dict:
+    """The YouTube API description, parsed once and cached on disk.
+
+    Recent client libraries ship it; older ones fetch it over HTTP. Either
+    way it's read from the disk cache after the first time.
+    """
+    global _discovery_doc
+    with _lock:
+        if _discovery_doc is not None:
+            return _discovery_doc
+        path = get_client_settings()["discovery_cache"]
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                _discovery_doc = json.load(f)
+                return _discovery_doc
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+
+        text = None
+        try:
+            from googleapiclient.discovery_cache import get_static_doc
+
+            text = get_static_doc(API_SERVICE_NAME, API_VERSION)
+        except ImportError:
+            pass
+        if text is None:
+            import httplib2
+
+            _, content = httplib2.Http(timeout=30).request(DISCOVERY_URL)
+            text = content.decode("utf-8")
+        _discovery_doc = json.loads(text)
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+        return _discovery_doc
+
+
+def build_transport(timeout: float = 60):
+    """Keep-alive HTTP for API calls and chunked uploads.
+
+    Resumable uploads answer each chunk, and each "how much do you have"
+    probe, with 308 Resume Incomplete and no Location header; httplib2
+    treats 308 as a redirect and fails on those unless it's excluded.
+    """
+    import httplib2
+
+    http = httplib2.Http(timeout=timeout)
+    http.redirect_codes = http.redirect_codes - {308}
+    return http
+
+
+def get_youtube_service(scopes: Optional[Iterable[str]] = None):
+    """A YouTube API client for the calling thread.
+
+    API clients aren't thread-safe, so each thread gets its own, built
+    once from the cached discovery document over its own keep-alive HTTP
+    connection. Credentials are shared and refreshed before they expire.
+    """
+    creds = get_credentials(scopes)
+    service = getattr(_local, "service", None)
+    if service is not None and _local.credentials is creds:
+        return service
+
+    from google_auth_httplib2 import AuthorizedHttp
+    from googleapiclient.discovery import build_from_document
+
+    http = AuthorizedHttp(creds, http=build_transport(get_client_settings()["timeout"]))
+    service = build_from_document(get_discovery_document(), http=http)
+    _local.service = service
+    _local.credentials = creds
+    return service
+
+
+def get_upload_service():
+    """A client that only needs upload access (videos.insert, thumbnails.set)."""
+    return get_youtube_service(UPLOAD_SCOPES)
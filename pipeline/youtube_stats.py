@@ -0,0 +1,100 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from config import Config
+from pipeline.quota import COSTS, QuotaExhausted
+
+# videos.list takes at most 50 comma-separated IDs and costs 1 quota unit
+# per call however many IDs it carries
+MAX_PAGE_SIZE = 50
+
+
+def get_stats_settings():
+    return {
+        "page_size": min(Config.get("youtube.stats.page_size", 50), MAX_PAGE_SIZE),
+        "concurrency": Config.get("youtube.stats.concurrency", 1),
+    }
+
+
+def pages(video_ids: Iterable[str], page_size: int = MAX_PAGE_SIZE) -> List[List[str]]:
+    """Unique IDs in first-seen order, split into pages of page_size."""
+    unique = list(dict.fromkeys(video_ids))
+    return [unique[i : i + page_size] for i in range(0, len(unique), page_size)]
+
+
+def parse_statistics(item: Dict) -> Dict:
+    stats = item.get("statistics", {})
+    # Counts hidden by the owner are simply absent
+    return {
+        "views": int(stats.get("viewCount", 0)),
+        "likes": int(stats.get("likeCount", 0)),
+        "comments": int(stats.get("commentCount", 0)),
+    }
+
+
+def fetch_page(youtube, video_ids: List[str]) -> Dict[str, Optional[Dict]]:
+    response = (
+        youtube.videos()
+        .list(part="statistics", id=",".join(video_ids), maxResults=len(video_ids))
+        .execute()
+    )
+    found = {item["id"]: parse_statistics(item) for item in response.get("items", [])}
+    # Deleted, private or mistyped IDs are left out of the response
+    return {video_id: found.get(video_id) for video_id in video_ids}
+
+
+def fetch_statistics(
+    youtube,
+    video_ids: Iterable[str],
+    concurrency: Optional[int] = None,
+    service_factory: Optional[Callable] = None,
+    page_size: Optional[int] = None,
+    budget=None,
+) -> Tuple[Dict[str, Optional[Dict]], Dict[str, str]]:
+    """Statistics for many videos, 50 IDs per videos.list call.
+
+    Returns (stats, errors): stats maps each ID to its views/likes/comments,
+    or None when YouTube no longer has the video; IDs on a page whose
+    request failed are left out of stats and mapped to the error instead.
+
+    API clients aren't thread-safe, so pages are only fetched concurrently
+    when service_factory is given; each worker thread then builds its own
+    client with it. With a QuotaBudget, each call is paid for first and
+    pages that don't fit in today's budget fail without a request.
+    """
+    settings = get_stats_settings()
+    concurrency = concurrency or settings["concurrency"]
+    batches = pages(video_ids, page_size or settings["page_size"])
+    stats: Dict[str, Optional[Dict]] = {}
+    errors: Dict[str, str] = {}
+
+    def paid_fetch(client, batch):
+        if budget is not None and not budget.spend(COSTS["videos.list"]):
+            raise QuotaExhausted("daily quota budget used up")
+        return fetch_page(client, batch)
+
+    if concurrency <= 1 or service_factory is None or len(batches) <= 1:
+        for batch in batches:
+            try:
+                stats.update(paid_fetch(youtube, batch))
+            except Exception as e:
+                errors.update({video_id: str(e) for video_id in batch})
+        return stats, errors
+
+    local = threading.local()
+
+    def fetch(batch):
+        if not hasattr(local, "youtube"):
+            local.youtube = service_factory()
+        return paid_fetch(local.youtube, batch)
+
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(batches))) as pool:
+        futures = [(batch, pool.submit(fetch, batch)) for batch in batches]
+        # Results are merged on this thread only
+        for batch, future in futures:
+            try:
+                stats.update(future.result())
+            except Exception as e:
+                errors.update({video_id: str(e) for video_id in batch})
+    return stats, errors
@@ -0,0 +1,99 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+DEFAULT_MODULES = [
+    "config",
+    "pipeline.make_video",
+    "pipeline.make_all_videos",
+    "pipeline.text_to_speech",
+    "pipeline.generate_metadata",
+    "pipeline.bulk_metadata",
+    "pipeline.thumbnail_utils",
+    "pipeline.track_video_stats",
+    "pipeline.upload_next_video",
+    "pipeline.upload_video",
+]
+
+# "import time: self [us] | cumulative | imported package"
+IMPORTTIME_PATTERN = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure(module):
+    """Import a module in a fresh interpreter and report what it cost."""
+    env = dict(os.environ)
+    # Nothing should need credentials just to be imported
+    for key in ("OPENAI_API_KEY", "ELEVENLABS_API_KEY"):
+        env.pop(key, None)
+
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    wall = time.perf_counter() - started
+
+    top_level = {}
+    packages = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_PATTERN.match(line)
+        if not match:
+            continue
+        cumulative, indent, name = int(match.group(2)), match.group(3), match.group(4)
+        if len(indent) == 1:
+            top_level[name] = cumulative
+            if name != module:
+                # Children are listed before their parent; drop interpreter
+                # startup imports (site and friends)
+                packages = {}
+        elif "." not in name:
+            # Nested top-level packages show which dependency the time went to
+            packages[name] = max(packages.get(name, 0), cumulative)
+
+    return {
+        "module": module,
+        "ok": result.returncode == 0,
+        "wall": wall,
+        "import_us": top_level.get(module, 0),
+        "heaviest": sorted(packages.items(), key=lambda x: x[1], reverse=True)[:3],
+        "error": result.stderr.strip().splitlines()[-1] if result.returncode else None,
+    }
+
+
+def main(modules, repeat=3):
+    print(f"⏱️ Cold import cost (best of {repeat}, fresh interpreter each run)\n")
+    print(f"   {'module':32} {'import':>10} {'process':>10}  heaviest dependencies")
+    for module in modules:
+        runs = [measure(module) for _ in range(repeat)]
+        best = min(runs, key=lambda r: r["wall"])
+        if not best["ok"]:
+            print(f"❌ {module:32} {best['error']}")
+            continue
+        heaviest = ", ".join(
+            f"{name} {us / 1000:.0f}ms" for name, us in best["heaviest"]
+        )
+        print(
+            f"   {module:32} {best['import_us'] / 1000:8.1f}ms "
+            f"{best['wall'] * 1000:8.1f}ms  {heaviest}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Report cold-import cost per pipeline module"
+    )
+    parser.add_argument("modules", nargs="*", help="modules to import (default: all)")
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="runs per module; the fastest is kept"
+    )
+    args = parser.parse_args()
+    main(args.modules or DEFAULT_MODULES, repeat=args.repeat)
@@ -0,0 +1,85 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from pipeline.build_manifest import (
+    ADOPT,
+    BUILD,
+    REUSE,
+    BuildManifest,
+    fingerprint,
+    hash_file,
+)
+from pipeline.ffmpeg_utils import ffmpeg_available, media_is_complete, run_ffmpeg
+
+
+class TestBuildManifest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.manifest = BuildManifest("demo", os.path.join(self.tmp, "manifests"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def script_fingerprint(self, text):
+        script = os.path.join(self.tmp, "demo.md")
+        with open(script, "w", encoding="utf-8") as f:
+            f.write(text)
+        return fingerprint({"script": hash_file(script), "voice": "Laura"})
+
+    @unittest.skipUnless(ffmpeg_available(), "ffmpeg not installed")
+    def test_01_half_written_output_is_not_adopted(self):
+        """Test that a truncated pre-manifest video is rebuilt, not adopted"""
+        video = os.path.join(self.tmp, "demo.mp4")
+        run_ffmpeg(
+            ["-f", "lavfi", "-i", "color=d=1:s=64x64", "-pix_fmt", "yuv420p", video]
+        )
+        check = lambda: media_is_complete(video)  # noqa: E731
+        self.assertEqual(self.manifest.decide("video", "fp", True, check)[0], ADOPT)
+
+        with open(video, "rb") as f:
+            head = f.read(os.path.getsize(video) // 2)
+        with open(video, "wb") as f:
+            f.write(head)
+        action, reason = self.manifest.decide("video", "fp", True, check)
+        self.assertEqual((action, reason), (BUILD, "existing output incomplete"))
+
+    def test_02_matching_inputs_are_reused(self):
+        """Test that a stage recorded with the same fingerprint is reused"""
+        fp = self.script_fingerprint("Hello there.")
+        self.manifest.record("audio", fp, "demo.mp3")
+
+        reopened = BuildManifest("demo", os.path.join(self.tmp, "manifests"))
+        action = reopened.decide("audio", self.script_fingerprint("Hello there."), True)
+        self.assertEqual(action, (REUSE, "up to date"))
+
+    def test_03_changed_inputs_are_rebuilt(self):
+        """Test that editing the script rebuilds the stage, or a missing output"""
+        self.manifest.record("audio", self.script_fingerprint("Hello there."))
+
+        fp = self.script_fingerprint("Hello there, edited.")
+        self.assertEqual(
+            self.manifest.decide("audio", fp, True), (BUILD, "inputs changed")
+        )
+        self.manifest.record("audio", fp)
+        self.assertEqual(self.manifest.decide("audio", fp, True)[0], REUSE)
+        self.assertEqual(
+            self.manifest.decide("audio", fp, False), (BUILD, "output missing")
+        )
+
+    def test_04_unrecorded_output_is_adopted(self):
+        """Test that an output made before the manifest existed is adopted once"""
+        fp = self.script_fingerprint("Hello there.")
+        self.assertEqual(
+            self.manifest.decide("audio", fp, True),
+            (ADOPT, "adopting existing output"),
+        )
+        self.assertEqual(self.manifest.decide("audio", fp, False)[0], BUILD)
+
+        self.manifest.record("audio", fp, "demo.mp3")
+        self.assertEqual(self.manifest.decide("audio", fp, True)[0], REUSE)
+
+
+if __name__ == "__main__":
+    unittest.main()
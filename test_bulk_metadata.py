@@ -0,0 +1,118 @@
+import asyncio
+import json
+import os
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import httpx
+from openai import RateLimitError
+
+from config import Config
+from pipeline import generate_metadata
+from pipeline.bulk_metadata import TokenBucket, generate_metadata_bulk
+
+
+def completion(content):
+    message = SimpleNamespace(content=content)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class FakeCompletions:
+    """Stand-in for client.chat.completions that echoes the script back"""
+
+    def __init__(self, rate_limit_first=0):
+        self.rate_limit_first = rate_limit_first
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        if self.rate_limit_first > 0:
+            self.rate_limit_first -= 1
+            request = httpx.Request("POST", "https://api.openai.com/v1/chat")
+            response = httpx.Response(
+                429, request=request, headers={"retry-after-ms": "10"}
+            )
+            raise RateLimitError("slow down", response=response, body=None)
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        # Finish later requests first to prove results keep input order
+        prompt = kwargs["messages"][-1]["content"]
+        script_id = int(prompt.split("SCRIPT-")[1].split()[0])
+        await asyncio.sleep(0.05 / (script_id + 1))
+        self.in_flight -= 1
+        return completion(
+            json.dumps({"title": f"Title {script_id}", "description": "d", "tags": []})
+        )
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_01_waits_for_refill(self):
+        """Test that acquiring past capacity waits for tokens to refill"""
+
+        async def run():
+            bucket = TokenBucket(rate_per_minute=600, capacity=5)  # 10/s
+            started = time.monotonic()
+            for _ in range(7):
+                await bucket.acquire()
+            return time.monotonic() - started
+
+        elapsed = asyncio.run(run())
+        self.assertGreaterEqual(elapsed, 0.15)
+        self.assertLess(elapsed, 1.0)
+
+
+class TestBulkMetadata(unittest.TestCase):
+    def setUp(self):
+        Config.set("cache.metadata.enabled", False)
+
+    def tearDown(self):
+        Config.set("cache.metadata.enabled", True)
+
+    def run_bulk(self, completions, scripts, **kwargs):
+        client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        return generate_metadata_bulk(scripts, client=client, **kwargs)
+
+    def test_01_results_in_input_order(self):
+        """Test that results line up with the input scripts"""
+        completions = FakeCompletions()
+        scripts = [f"SCRIPT-{i} text" for i in range(6)]
+
+        results = self.run_bulk(completions, scripts, concurrency=3)
+
+        self.assertEqual(
+            [r["title"] for r in results], [f"Title {i}" for i in range(6)]
+        )
+        self.assertLessEqual(completions.max_in_flight, 3)
+
+    def test_02_retries_rate_limits(self):
+        """Test that 429 responses are retried instead of failing"""
+        completions = FakeCompletions(rate_limit_first=2)
+
+        results = self.run_bulk(completions, ["SCRIPT-0 text"], max_retries=3)
+
+        self.assertEqual(results[0]["title"], "Title 0")
+        self.assertEqual(completions.calls, 3)
+
+    def test_03_default_client_reads_the_env_file(self):
+        """Test that the bulk path's own client gets the key from .env"""
+
+        def load_dotenv():
+            os.environ["OPENAI_API_KEY"] = "sk-from-dotenv"
+
+        with mock.patch.dict(os.environ), mock.patch.object(
+            generate_metadata, "load_dotenv", load_dotenv
+        ):
+            os.environ.pop("OPENAI_API_KEY", None)
+            client = generate_metadata.get_async_client(max_retries=0)
+
+        self.assertEqual(client.api_key, "sk-from-dotenv")
+        self.assertEqual(client.max_retries, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
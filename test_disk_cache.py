@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from pipeline.disk_cache import DiskCache
+
+
+class TestDiskCache(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_01_hit_and_miss_counters(self):
+        """Test that gets are counted as hits or misses"""
+        cache = DiskCache(self.cache_dir)
+        key = DiskCache.make_key("hello", "Laura")
+
+        self.assertIsNone(cache.get_bytes(key))
+        cache.put_bytes(key, b"audio")
+        self.assertEqual(cache.get_bytes(key), b"audio")
+
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["entries"], 1)
+
+    def test_02_keys_depend_on_every_part(self):
+        """Test that changing any key part changes the key"""
+        base = DiskCache.make_key("text", "Laura", 0.5)
+        self.assertEqual(base, DiskCache.make_key("text", "Laura", 0.5))
+        self.assertNotEqual(base, DiskCache.make_key("text", "Rachel", 0.5))
+        self.assertNotEqual(base, DiskCache.make_key("text", "Laura", 0.6))
+
+    def test_03_evicts_least_recently_used(self):
+        """Test that eviction keeps the cache under its size limit"""
+        cache = DiskCache(self.cache_dir, max_bytes=20)
+        cache.put_bytes("a" * 64, b"x" * 10)
+        cache.put_bytes("b" * 64, b"x" * 10)
+
+        # Make "a" the most recently used entry
+        old = time.time() - 100
+        os.utime(cache.path_for("b" * 64), (old, old))
+        self.assertIsNotNone(cache.get_path("a" * 64))
+
+        cache.put_bytes("c" * 64, b"x" * 10)
+
+        self.assertTrue(os.path.exists(cache.path_for("a" * 64)))
+        self.assertFalse(os.path.exists(cache.path_for("b" * 64)))
+        self.assertTrue(os.path.exists(cache.path_for("c" * 64)))
+        self.assertLessEqual(cache.stats()["bytes"], 20)
+
+    def test_04_expires_entries_after_ttl(self):
+        """Test that entries older than the TTL are treated as misses"""
+        cache = DiskCache(self.cache_dir, ttl=60)
+        key = DiskCache.make_key("script", "gpt-4", 0.7, 1)
+        cache.put_bytes(key, b'{"title": "t"}')
+        self.assertIsNotNone(cache.get_bytes(key))
+
+        # Reading an entry must not extend its lifetime
+        written = time.time() - 120
+        os.utime(cache.path_for(key), (time.time(), written))
+
+        self.assertIsNone(cache.get_bytes(key))
+        self.assertFalse(os.path.exists(cache.path_for(key)))
+
+    def test_05_counters_hold_up_under_threads(self):
+        """Test that concurrent gets and puts keep exact counts and size"""
+        cache = DiskCache(self.cache_dir, max_bytes=10_000)
+        keys = [DiskCache.make_key("chunk", i % 50) for i in range(2000)]
+
+        def use(key):
+            if cache.get_bytes(key) is None:
+                cache.put_bytes(key, b"x" * 100)
+
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            list(pool.map(use, keys))
+
+        stats = cache.stats()
+        self.assertEqual(stats["hits"] + stats["misses"], len(keys))
+        self.assertEqual(cache._size, stats["bytes"])
+        self.assertLessEqual(stats["bytes"], 10_000)
+
+
+if __name__ == "__main__":
+    unittest.main()
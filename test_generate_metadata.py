@@ -0,0 +1,97 @@
+import json
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from config import Config
+from pipeline import generate_metadata
+from pipeline.generate_metadata import (
+    build_metadata_messages,
+    compact_script,
+    count_tokens,
+    generate_video_metadata,
+    get_metadata_settings,
+    metadata_request,
+    parse_metadata,
+)
+
+
+def completion(content, finish_reason="stop"):
+    message = SimpleNamespace(content=content)
+    choice = SimpleNamespace(message=message, finish_reason=finish_reason)
+    return SimpleNamespace(choices=[choice])
+
+
+class TestPromptCompaction(unittest.TestCase):
+    def test_01_long_scripts_fit_the_budget(self):
+        """Test that long scripts are compacted to the token budget"""
+        paragraph = "This tool changes everything. " + "Filler detail here. " * 40
+        script = "\n\n".join(f"# Part {i}\n{paragraph}" for i in range(20))
+
+        compacted = compact_script(script, budget=300)
+
+        self.assertLessEqual(count_tokens(compacted), 300)
+        self.assertTrue(compacted.startswith("Part 0"))
+        self.assertIn("This tool changes everything.", compacted)
+
+    def test_02_system_prompt_is_shared(self):
+        """Test that the static instructions are identical for every script"""
+        settings = get_metadata_settings()
+        first = build_metadata_messages("Script one.", settings)
+        second = build_metadata_messages("Another script.", settings)
+
+        self.assertEqual(first[0], second[0])
+        self.assertEqual(first[0]["role"], "system")
+        self.assertIn("Another script.", second[-1]["content"])
+
+
+class TestStructuredMetadata(unittest.TestCase):
+    def setUp(self):
+        Config.set("cache.metadata.enabled", False)
+
+    def tearDown(self):
+        Config.set("cache.metadata.enabled", True)
+
+    def test_01_rejects_responses_missing_fields(self):
+        """Test that replies without every schema field are rejected"""
+        with self.assertRaises(ValueError):
+            parse_metadata('{"title": "Only a title"}')
+        with self.assertRaises(ValueError):
+            parse_metadata("Sorry, I can't help with that.")
+
+        metadata = parse_metadata(
+            '```json\n{"title": " Hi ", "description": "d", "tags": ["ai", " "]}\n```'
+        )
+        self.assertEqual(metadata, {"title": "Hi", "description": "d", "tags": ["ai"]})
+
+    def test_02_retries_invalid_replies(self):
+        """Test that an invalid reply is retried before falling back"""
+        valid = json.dumps({"title": "T", "description": "D", "tags": ["ai"]})
+        create = mock.Mock(
+            side_effect=[completion('{"title": "T", "desc'), completion(valid)]
+        )
+        client = SimpleNamespace(
+            chat=SimpleNamespace(completions=SimpleNamespace(create=create))
+        )
+
+        with mock.patch.object(generate_metadata, "get_client", return_value=client):
+            metadata = generate_video_metadata("A short script.")
+
+        self.assertEqual(metadata["title"], "T")
+        self.assertEqual(create.call_count, 2)
+        self.assertLessEqual(create.call_args.kwargs["max_tokens"], 300)
+
+    def test_03_reasoning_models_get_their_own_limits(self):
+        """Test that o-series and gpt-5 requests skip temperature and max_tokens"""
+        self.addCleanup(Config.set, "api.openai.model", Config.get("api.openai.model"))
+        Config.set("api.openai.model", "o3-mini")
+        request = metadata_request("A short script.", get_metadata_settings())
+
+        self.assertNotIn("temperature", request)
+        self.assertNotIn("max_tokens", request)
+        self.assertEqual(request["max_completion_tokens"], 2000)
+        self.assertEqual(request["response_format"]["type"], "json_schema")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import random
+import unittest
+
+from pipeline.growth_detector import GrowthDetector
+
+SETTINGS = {
+    "fast_halflife": 1,
+    "slow_halflife": 48,
+    "z_threshold": 3.0,
+    "min_rate": 10,
+    "warmup": 4,
+    "cooldown": 6,
+    "escalation": 2.0,
+}
+
+
+class TestGrowthDetector(unittest.TestCase):
+    def setUp(self):
+        self.detector = GrowthDetector(SETTINGS)
+        self.rng = random.Random(7)
+        self.state = None
+        self.t = 0.0
+        self.views = 0
+
+    def feed(self, hours, rate, step=0.25, noise=0.2):
+        """Poll every step hours at about rate views/hour; return the alerts."""
+        alerts = []
+        for _ in range(int(hours / step)):
+            self.t += step * 3600
+            self.views += int(rate * step * self.rng.uniform(1 - noise, 1 + noise))
+            self.state, alert = self.detector.update(self.state, self.t, self.views)
+            if alert:
+                alerts.append(alert)
+        return alerts
+
+    def test_01_steady_noisy_growth_stays_quiet(self):
+        """Test that normal noise around a video's own rate never alerts"""
+        self.assertEqual(self.feed(24 * 5, 100), [])
+        self.assertAlmostEqual(self.state["mean"], 100, delta=15)
+        self.assertEqual(set(self.state), {"t", "views", "n", "fast", "mean", "var"})
+
+    def test_02_spike_alerts_once_then_escalates(self):
+        """Test that a surge alerts once per cooldown unless it keeps growing"""
+        self.feed(24 * 3, 100)
+
+        first = self.feed(3, 1000)
+        self.assertEqual(len(first), 1)
+        self.assertFalse(first[0]["escalated"])
+        self.assertGreater(first[0]["rate"], first[0]["baseline"] * 3)
+
+        more = self.feed(2, 6000)
+        self.assertEqual(len(more), 1)
+        self.assertTrue(more[0]["escalated"])
+
+    def test_03_slow_surge_is_caught(self):
+        """Test that a gradual build-up alerts, not just a sudden jump"""
+        self.feed(24 * 3, 100)
+        alerts = []
+        # +30 views/hour every hour; no single poll looks like a jump
+        for hour in range(6):
+            alerts += self.feed(1, 100 + 30 * hour)
+        self.assertEqual(len(alerts), 1)
+
+    def test_04_small_videos_need_a_real_rate(self):
+        """Test that going from 1 to 8 views/hour is not an alert"""
+        self.feed(24 * 3, 1)
+        self.assertEqual(self.feed(4, 8), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import unittest
+from unittest import mock
+
+from pipeline import make_all_videos
+from pipeline.build_manifest import ADOPT, REUSE
+from pipeline.make_all_videos import run_batch
+
+
+def fake_render(script_path):
+    if script_path == "crash.md":
+        # Like a segfault: the worker process dies without raising
+        os._exit(1)
+    return {
+        "script": script_path,
+        "ok": True,
+        "video": script_path.replace(".md", ".mp4"),
+        "seconds": 0.0,
+        "error": None,
+    }
+
+
+class TestMakeAllVideos(unittest.TestCase):
+    def test_01_crashing_job_is_isolated(self):
+        """Test that only the script that kills its worker is reported as crashed"""
+        scripts = ["a.md", "crash.md", "b.md", "c.md", "d.md"]
+        results = run_batch(scripts, workers=2, job=fake_render)
+
+        self.assertEqual([r["script"] for r in results], scripts)
+        failed = [r["script"] for r in results if not r["ok"]]
+        self.assertEqual(failed, ["crash.md"])
+        self.assertEqual(results[1]["error"], "worker process crashed")
+
+    def test_02_failed_adopt_does_not_stop_the_batch(self):
+        """Test that one unreadable pre-manifest artifact only skips its script"""
+        adopted = []
+
+        def render_video(script_path):
+            if script_path == "bad.md":
+                raise OSError("unreadable video")
+            adopted.append(script_path)
+
+        plan = {"audio": {"action": ADOPT}, "video": {"action": REUSE}}
+        patches = {
+            "get_script_files": lambda: ["a.md", "bad.md", "b.md"],
+            "plan_render": lambda script_path: plan,
+            "render_video": render_video,
+            "get_video_path": lambda script_path: script_path,
+        }
+        with mock.patch.multiple(make_all_videos, **patches):
+            self.assertEqual(make_all_videos.main(), [])
+
+        self.assertEqual(adopted, ["a.md", "b.md"])
+
+
+if __name__ == "__main__":
+    unittest.main()
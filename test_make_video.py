@@ -0,0 +1,71 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+from pipeline import make_video
+from pipeline.ffmpeg_utils import (
+    ffmpeg_available,
+    media_is_complete,
+    probe_duration,
+    run_ffmpeg,
+)
+
+SETTINGS = {
+    "width": 64,
+    "height": 36,
+    "fps": 5,
+    "codec": "libx264",
+    "bitrate": "50k",
+    "audio_bitrate": "32k",
+    "audio_sample_rate": 22050,
+    "audio_channels": 1,
+    "engine": "ffmpeg",
+}
+
+
+class TestRenderStillFFmpeg(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.image = os.path.join(self.tmp, "background.png")
+        Image.new("RGB", (128, 72), (30, 90, 160)).save(self.image)
+        self.audio = os.path.join(self.tmp, "speech.wav")
+        self.video = os.path.join(self.tmp, "out", "video.mp4")
+        patch = mock.patch.object(make_video, "_video_settings", dict(SETTINGS))
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_01_loops_the_image_for_the_audio_duration(self):
+        """Test that the still is looped in ffmpeg with the configured output"""
+        with mock.patch.object(
+            make_video, "probe_duration", return_value=12.5
+        ), mock.patch.object(make_video, "run_ffmpeg") as run:
+            make_video.render_still_ffmpeg(self.image, self.audio, self.video)
+
+        args = run.call_args[0][0]
+        self.assertEqual(args[:6], ["-loop", "1", "-framerate", "5", "-i", self.image])
+        self.assertEqual(args[args.index("-t") + 1], "12.500")
+        self.assertEqual(args[args.index("-tune") + 1], "stillimage")
+        self.assertIn("scale=64:36", args[args.index("-vf") + 1])
+        self.assertEqual(args[args.index("-ar") + 1], "22050")
+        self.assertEqual(args[-1], self.video)
+
+    @unittest.skipUnless(ffmpeg_available(), "ffmpeg not installed")
+    def test_02_renders_a_playable_video(self):
+        """Test that a tiny render decodes fully and lasts as long as the audio"""
+        run_ffmpeg(["-f", "lavfi", "-i", "sine=frequency=440:duration=1", self.audio])
+
+        make_video.render_still_ffmpeg(self.image, self.audio, self.video)
+
+        self.assertTrue(media_is_complete(self.video))
+        self.assertAlmostEqual(probe_duration(self.video), 1.0, delta=0.25)
+
+
+if __name__ == "__main__":
+    unittest.main()
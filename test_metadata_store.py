@@ -0,0 +1,88 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from pipeline.metadata_store import MetadataStore
+
+
+class TestMetadataStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.legacy = os.path.join(self.tmp, "metadata.jsonl")
+        with open(self.legacy, "w", encoding="utf-8") as f:
+            for i in range(3):
+                entry = {"script": f"scripts/{i}.md", "video": f"video/{i}.mp4"}
+                f.write(json.dumps({**entry, "title": f"Video {i}"}) + "\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def store(self):
+        return MetadataStore(os.path.join(self.tmp, "metadata.db"), self.legacy)
+
+    def test_01_imports_legacy_jsonl_once(self):
+        """Test that the old JSONL log is imported in order and retired"""
+        entries = self.store().load_entries()
+
+        self.assertEqual(
+            [e["title"] for e in entries], ["Video 0", "Video 1", "Video 2"]
+        )
+        self.assertFalse(os.path.exists(self.legacy))
+        self.assertEqual(len(self.store().load_entries()), 3)
+
+        exported = os.path.join(self.tmp, "export.jsonl")
+        self.assertEqual(self.store().export_jsonl(exported), 3)
+        with open(exported, encoding="utf-8") as f:
+            self.assertNotIn("_id", json.loads(f.readline()))
+
+    def test_02_concurrent_writers_keep_each_others_changes(self):
+        """Test that two processes updating different fields both persist"""
+        stats, uploader = self.store(), self.store()
+        tracked = stats.load_entries()
+        queued = uploader.load_entries()
+
+        tracked[0]["views"] = 120
+        queued[0]["uploaded"] = True
+        queued[0]["youtube_video_id"] = "abc123"
+        self.assertEqual(stats.save_entries(tracked), 1)
+        self.assertEqual(uploader.save_entries(queued), 1)
+
+        entry = self.store().find_by_video_id("abc123")
+        self.assertEqual(entry["views"], 120)
+        self.assertEqual(entry["title"], "Video 0")
+        self.assertEqual(self.store().next_unuploaded()["title"], "Video 1")
+
+    def test_03_upsert_and_parallel_updates(self):
+        """Test that upserts dedupe by script/video and updates don't race"""
+        store = self.store()
+        entry = {"script": "scripts/0.md", "video": "video/0.mp4", "title": "New"}
+        self.assertEqual(store.upsert(entry, replace=False), "skipped")
+        self.assertEqual(store.upsert(entry), "updated")
+        self.assertEqual(store.upsert({**entry, "script": "scripts/9.md"}), "added")
+        self.assertEqual(
+            store.find_entry("scripts/0.md", "video/0.mp4")["title"], "New"
+        )
+
+        entry_id = store.find_entry("scripts/1.md", "video/1.mp4")["_id"]
+
+        def bump(field):
+            local = self.store()
+            for i in range(20):
+                local.update_entry(entry_id, {field: i})
+            local.close()
+
+        threads = [threading.Thread(target=bump, args=(f"f{n}",)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        updated = self.store().find_entry("scripts/1.md", "video/1.mp4")
+        self.assertEqual([updated[f"f{n}"] for n in range(4)], [19] * 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,226 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpMockSequence, HttpRequest, MediaFileUpload
+
+from pipeline.build_manifest import hash_file
+from pipeline.metadata_store import MetadataStore
+from pipeline.resumable_upload import CHUNK_ALIGN, send_resumable, session_status
+from pipeline.upload_next_video import upload_video
+from pipeline.youtube_client import build_transport
+
+SESSION_URI = "https://upload.example/session/1"
+
+
+class RecordingHttp(HttpMockSequence):
+    """Canned responses in order; remembers each request's method and range."""
+
+    def __init__(self, responses):
+        super().__init__(responses)
+        self.sent = []
+
+    def request(self, uri, method="GET", body=None, headers=None, *args, **kwargs):
+        self.sent.append((method, (headers or {}).get("Content-Range")))
+        return super().request(uri, method, body, headers, *args, **kwargs)
+
+
+class UploadServer(BaseHTTPRequestHandler):
+    """Just enough of YouTube's resumable upload protocol: 308 until done."""
+
+    received = 0
+
+    def do_PUT(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        span, total = self.headers["Content-Range"].split(" ")[1].split("/")
+        if span != "*":
+            start = int(span.split("-")[0])
+            assert start == UploadServer.received, "chunk doesn't follow on"
+            UploadServer.received += len(body)
+        if UploadServer.received == int(total):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(json.dumps({"id": "local1"}).encode())
+            return
+        self.send_response(308)
+        self.send_header("Range", f"bytes=0-{UploadServer.received - 1}")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class TestResumableUpload(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.video = os.path.join(self.tmp, "video.mp4")
+        with open(self.video, "wb") as f:
+            f.write(os.urandom(CHUNK_ALIGN * 3 - 100))
+        self.size = os.path.getsize(self.video)
+        self.hash = hash_file(self.video)
+        self.sessions = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def request(self, http):
+        media = MediaFileUpload(self.video, chunksize=CHUNK_ALIGN, resumable=True)
+        return HttpRequest(
+            http,
+            lambda resp, content: json.loads(content),
+            "https://upload.example/videos",
+            method="POST",
+            body="{}",
+            headers={"content-type": "application/json"},
+            resumable=media,
+        )
+
+    def send(self, http, session=None, on_insert=None):
+        return send_resumable(
+            self.request(http),
+            self.video,
+            self.hash,
+            session,
+            self.sessions.append,
+            retries=0,
+            on_insert=on_insert,
+        )
+
+    def test_01_interrupted_upload_resumes_from_the_server_offset(self):
+        """Test that a second run carries on from the last acknowledged byte"""
+        first = RecordingHttp(
+            [
+                ({"status": "200", "location": SESSION_URI}, ""),
+                ({"status": "308", "range": f"bytes=0-{CHUNK_ALIGN - 1}"}, ""),
+                ({"status": "503"}, "connection dropped"),
+            ]
+        )
+        with self.assertRaises(HttpError):
+            self.send(first)
+        session = self.sessions[-1]
+        self.assertEqual(
+            (session["uri"], session["offset"]), (SESSION_URI, CHUNK_ALIGN)
+        )
+
+        # The server got the whole second chunk before the connection died
+        second = RecordingHttp(
+            [
+                ({"status": "308", "range": f"bytes=0-{2 * CHUNK_ALIGN - 1}"}, ""),
+                ({"status": "200"}, json.dumps({"id": "abc123"})),
+            ]
+        )
+        self.assertEqual(self.send(second, session)["id"], "abc123")
+        self.assertEqual(
+            second.sent,
+            [
+                ("PUT", f"bytes */{self.size}"),
+                ("PUT", f"bytes {2 * CHUNK_ALIGN}-{self.size - 1}/{self.size}"),
+            ],
+        )
+
+    def test_02_finished_session_is_not_uploaded_again(self):
+        """Test that an upload that completed before a crash returns its video"""
+        session = {
+            "uri": SESSION_URI,
+            "offset": CHUNK_ALIGN,
+            "size": self.size,
+            "sha256": self.hash,
+        }
+        http = RecordingHttp([({"status": "201"}, json.dumps({"id": "done1"}))])
+        self.assertEqual(self.send(http, session)["id"], "done1")
+        self.assertEqual(len(http.sent), 1)
+
+        # A re-rendered file doesn't reuse the old session
+        stale = dict(session, sha256="0" * 64)
+        http = RecordingHttp(
+            [
+                ({"status": "200", "location": SESSION_URI}, ""),
+                ({"status": "308", "range": f"bytes=0-{CHUNK_ALIGN - 1}"}, ""),
+                ({"status": "308", "range": f"bytes=0-{2 * CHUNK_ALIGN - 1}"}, ""),
+                ({"status": "200"}, json.dumps({"id": "fresh"})),
+            ]
+        )
+        self.assertEqual(self.send(http, stale)["id"], "fresh")
+        self.assertEqual(http.sent[0][0], "POST")
+
+    def test_03_same_file_queued_twice_reuses_the_video(self):
+        """Test that a file whose contents are already on YouTube isn't re-uploaded"""
+        store = MetadataStore(os.path.join(self.tmp, "metadata.db"))
+        self.addCleanup(store.close)
+        store.save_entries(
+            [
+                {
+                    "video": "old.mp4",
+                    "uploaded": True,
+                    "youtube_video_id": "abc123",
+                    "content_hash": self.hash,
+                },
+                {"video": self.video, "title": "Again"},
+            ]
+        )
+        entry = store.next_unuploaded()
+
+        self.assertEqual(upload_video(None, entry, store), "abc123")
+        self.assertEqual(entry["content_hash"], self.hash)
+
+    def test_04_resume_over_a_real_transport(self):
+        """Test that 308 Resume Incomplete isn't treated as a redirect"""
+        server = ThreadingHTTPServer(("127.0.0.1", 0), UploadServer)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        UploadServer.received = CHUNK_ALIGN
+        uri = f"http://127.0.0.1:{server.server_port}/session"
+
+        status = session_status(build_transport(5), uri, self.size)
+        self.assertEqual(status, (CHUNK_ALIGN, None))
+
+        session = {"uri": uri, "size": self.size, "sha256": self.hash}
+        response = send_resumable(
+            self.request(build_transport(5)), self.video, self.hash, session
+        )
+        self.assertEqual(response["id"], "local1")
+        self.assertEqual(UploadServer.received, self.size)
+
+    def test_05_session_is_saved_before_the_first_chunk(self):
+        """Test that a new session is kept even if its first chunk never lands"""
+        inserts = []
+        http = RecordingHttp(
+            [
+                ({"status": "200", "location": SESSION_URI}, ""),
+                ({"status": "503"}, "connection dropped"),
+            ]
+        )
+        with self.assertRaises(HttpError):
+            self.send(http, on_insert=lambda: inserts.append(1))
+        self.assertEqual(inserts, [1])
+        self.assertEqual(
+            (self.sessions[0]["uri"], self.sessions[0]["offset"]), (SESSION_URI, 0)
+        )
+
+        # Resuming that session is not another insert
+        http = RecordingHttp(
+            [
+                ({"status": "308"}, ""),
+                ({"status": "308", "range": f"bytes=0-{CHUNK_ALIGN - 1}"}, ""),
+                ({"status": "308", "range": f"bytes=0-{2 * CHUNK_ALIGN - 1}"}, ""),
+                ({"status": "200"}, json.dumps({"id": "late1"})),
+            ]
+        )
+        response = self.send(http, self.sessions[-1], lambda: inserts.append(1))
+        self.assertEqual(response["id"], "late1")
+        self.assertEqual(inserts, [1])
+        self.assertEqual(
+            http.sent[1], ("PUT", f"bytes 0-{CHUNK_ALIGN - 1}/{self.size}")
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from pipeline.stats_history import DAY, Series, StatsHistory, decode, encode
+
+SETTINGS = {
+    "raw_days": 7,
+    "hourly_days": 30,
+    "daily_days": 0,
+    "chunk_size": 64,
+    "chart_points": 500,
+}
+
+
+class TestStatsHistory(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.history = StatsHistory(os.path.join(self.tmp, "history.db"), SETTINGS)
+
+    def tearDown(self):
+        self.history.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_01_encoding_round_trips_compactly(self):
+        """Test that delta encoding is lossless and packs small steps tightly"""
+        t = np.arange(1_700_000_000, 1_700_000_000 + 300 * 1000, 300, dtype=np.int64)
+        views = np.cumsum(np.random.default_rng(1).integers(0, 100, len(t)))
+        series = Series(t, views, views // 20, views // 100)
+
+        data = encode(series)
+        decoded = decode(data)
+
+        for original, restored in zip(series, decoded):
+            np.testing.assert_array_equal(original, restored)
+        # 4 int64 columns would be 32 bytes a sample
+        self.assertLess(len(data), 6 * len(t))
+
+    def test_02_retention_rolls_up_old_samples(self):
+        """Test that old samples are downsampled but still queryable in order"""
+        now = 1_700_000_000
+        start = now - 60 * DAY
+        # Every 10 minutes for 60 days
+        for i, t in enumerate(range(start, now, 600)):
+            self.history.record("vid", views=i * 5, likes=i, comments=i // 10, at=t)
+
+        counts = self.history.maintain(now=now)
+        full = self.history.series("vid")
+
+        self.assertGreater(counts["raw_rolled"], 0)
+        self.assertGreater(counts["hourly_rolled"], 0)
+        self.assertTrue(np.all(np.diff(full.t) > 0))
+        self.assertTrue(np.all(np.diff(full.views) >= 0))
+        # One point a day past 30 days, one an hour past 7, every sample after
+        self.assertLessEqual(np.sum(full.t < now - 31 * DAY), 30)
+        hourly = full.t[(full.t >= now - 29 * DAY) & (full.t < now - 8 * DAY)]
+        self.assertLessEqual(len(hourly), 21 * 24 + 1)
+        self.assertEqual(np.sum(full.t >= now - 7 * DAY), 7 * 144)
+        self.assertEqual(int(full.views[-1]), (len(range(start, now, 600)) - 1) * 5)
+
+        week = self.history.series("vid", start=now - 7 * DAY, max_points=100)
+        self.assertLessEqual(len(week), 101)
+        self.assertGreaterEqual(int(week.t[0]), now - 7 * DAY)
+
+        # A second run has nothing left to roll
+        self.assertEqual(self.history.maintain(now=now)["raw_rolled"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
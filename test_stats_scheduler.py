@@ -0,0 +1,96 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from pipeline import track_video_stats
+from pipeline.metadata_store import MetadataStore
+from pipeline.quota import QuotaBudget
+from pipeline.stats_history import StatsHistory
+from pipeline.stats_scheduler import StatsScheduler, poll_interval, quota_stretch
+from test_youtube_stats import FakeYouTube
+
+SETTINGS = {
+    "tiers": [[24, 10], [168, 60], [720, 360]],
+    "min_interval": 300,
+    "max_interval": 86400,
+    "hot_views_per_hour": 50,
+    "quota_share": 0.5,
+    "tick": 60,
+}
+
+
+class TestStatsScheduler(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.store = MetadataStore(os.path.join(self.tmp, "metadata.db"))
+        self.budget = QuotaBudget(os.path.join(self.tmp, "quota.db"), daily_units=100)
+        history = StatsHistory(os.path.join(self.tmp, "history.db"))
+        patch = mock.patch.object(
+            track_video_stats, "get_stats_history", return_value=history
+        )
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.addCleanup(history.close)
+
+    def tearDown(self):
+        self.store.close()
+        self.budget.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_01_intervals_follow_age_and_growth(self):
+        """Test that new or fast-growing videos are polled more often"""
+        fresh = poll_interval(2, 0, SETTINGS)
+        week_old = poll_interval(100, 0, SETTINGS)
+        ancient = poll_interval(20000, 0, SETTINGS)
+        spiking = poll_interval(20000, 500, SETTINGS)
+
+        self.assertEqual((fresh, week_old, ancient), (600, 3600, 86400))
+        self.assertLess(spiking, ancient / 10)
+        self.assertEqual(poll_interval(2, 10_000, SETTINGS), 300)
+        # 10k videos every 5 minutes would be ~58k calls against 5k allowed
+        self.assertGreater(quota_stretch([300] * 10_000, 5000, 50), 10)
+        self.assertEqual(quota_stretch([86400] * 100, 5000, 50), 1.0)
+
+    def test_02_ticks_poll_only_due_videos_within_budget(self):
+        """Test that a tick checks what's due and respects the quota"""
+        now = datetime.utcnow()
+        entries = [
+            {
+                "title": f"Video {i}",
+                "uploaded": True,
+                "youtube_video_id": f"v{i}",
+                "uploaded_at": (now - timedelta(days=i * 3)).isoformat(),
+            }
+            for i in range(120)
+        ]
+        self.store.save_entries(entries)
+        existing = {f"v{i}": 10 for i in range(120)}
+        scheduler = StatsScheduler(
+            FakeYouTube(existing),
+            service_factory=lambda: FakeYouTube(existing),
+            budget=self.budget,
+            store=self.store,
+            settings=SETTINGS,
+        )
+
+        first = scheduler.tick(now)
+        self.assertEqual((first["checked"], first["calls"]), (120, 3))
+        self.assertEqual(self.budget.used(), 3)
+
+        # An hour later only videos under a week old are due again
+        later = scheduler.tick(now + timedelta(minutes=61))
+        self.assertEqual(later["checked"], 3)
+
+        # Polling is held to its half of the day's 100 units
+        self.assertTrue(scheduler.poll_budget.spend(scheduler.poll_budget.remaining()))
+        capped = scheduler.tick(now + timedelta(days=2))
+        self.assertEqual(capped["checked"], 0)
+        self.assertGreater(capped["skipped"], 0)
+        self.assertEqual(self.budget.remaining(), 50)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+
+from PIL import Image
+
+from pipeline.text_layout import draw_text, fit_text, load_font, word_width
+
+
+class TestTextLayout(unittest.TestCase):
+    def test_01_fits_the_box(self):
+        """Test that the chosen size keeps the text inside the box"""
+        title = "How I built an AI pipeline that summarizes PDFs in seconds"
+
+        layout = fit_text(title, 900, 300, max_size=120, min_size=20, stroke_width=4)
+
+        self.assertLessEqual(layout.width, 900)
+        self.assertLessEqual(layout.height, 300)
+        self.assertEqual(" ".join(layout.lines), title)
+        # One size up must overflow, or the search stopped too early
+        bigger = fit_text(
+            title,
+            900,
+            10_000,
+            min_size=layout.size + 1,
+            max_size=layout.size + 1,
+            stroke_width=4,
+        )
+        self.assertTrue(bigger.width > 900 or bigger.height > 300)
+
+    def test_02_longer_titles_get_smaller_text(self):
+        """Test that a longer title is fitted at a smaller font size"""
+        short = fit_text("Try this AI", 900, 300)
+        long = fit_text("Try this AI tool that writes your unit tests " * 3, 900, 300)
+        self.assertGreater(short.size, long.size)
+
+    def test_03_fonts_and_widths_are_cached(self):
+        """Test that fonts and word widths are loaded once per face and size"""
+        self.assertIs(load_font(None, 64), load_font(None, 64))
+        word_width(None, 64, "cached")
+        hits = word_width.cache_info().hits
+        word_width(None, 64, "cached")
+        self.assertEqual(word_width.cache_info().hits, hits + 1)
+
+    def test_04_draws_with_stroke_and_shadow(self):
+        """Test that drawing changes only pixels near the text block"""
+        img = Image.new("RGB", (400, 400), "navy")
+        layout = fit_text("Shadowed", 300, 100, stroke_width=3)
+
+        out = draw_text(
+            img,
+            layout,
+            (50, 50, 350, 350),
+            stroke_width=3,
+            shadow_offset=4,
+            shadow_blur=2,
+        )
+
+        self.assertEqual(out.mode, "RGBA")
+        self.assertEqual(out.getpixel((200, 10))[:3], (0, 0, 128))
+        self.assertIsNotNone(out.crop((50, 250, 350, 360)).convert("L").getbbox())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from pipeline.disk_cache import DiskCache
+from pipeline.text_to_speech import stream_tts, tts_cache_key
+from pipeline.tts_providers import LocalToneProvider, TTSProvider, post_safe_retry
+
+SETTINGS = {
+    "voice": "Laura",
+    "model": "eleven_monolingual_v1",
+    "stability": 0.5,
+    "similarity_boost": 0.75,
+}
+
+
+def canned_audio_stream(chunks, fail_after=None):
+    """Local stand-in for the ElevenLabs streaming endpoint"""
+    for i, chunk in enumerate(chunks):
+        if fail_after is not None and i == fail_after:
+            raise ConnectionError("stream dropped")
+        yield chunk
+
+
+class TestStreamingTTS(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.output_path = os.path.join(self.work_dir, "audio", "out.mp3")
+        self.chunks = [b"ID3" + bytes([i]) * 1024 for i in range(5)]
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def test_01_writes_chunks_as_they_arrive(self):
+        """Test that every streamed chunk lands in the output file in order"""
+        sizes_on_disk = []
+
+        def stream():
+            for chunk in canned_audio_stream(self.chunks):
+                yield chunk
+                part_path = f"{self.output_path}.part"
+                if os.path.exists(part_path):
+                    sizes_on_disk.append(os.path.getsize(part_path))
+
+        written = stream_tts(
+            "Hello world",
+            self.output_path,
+            settings=SETTINGS,
+            audio_stream=stream(),
+            progress=None,
+        )
+
+        self.assertEqual(written, sum(len(c) for c in self.chunks))
+        with open(self.output_path, "rb") as f:
+            self.assertEqual(f.read(), b"".join(self.chunks))
+        # The file grew while the stream was still being consumed
+        self.assertEqual(sizes_on_disk[0], len(self.chunks[0]))
+
+    def test_02_reports_progress(self):
+        """Test that progress reports bytes written and elapsed time"""
+        reports = []
+
+        stream_tts(
+            "Hello world",
+            self.output_path,
+            settings=SETTINGS,
+            audio_stream=canned_audio_stream(self.chunks),
+            progress=lambda n, elapsed, done=False: reports.append((n, done)),
+            progress_interval=0,
+        )
+
+        byte_counts = [n for n, _ in reports]
+        self.assertEqual(byte_counts, sorted(byte_counts))
+        self.assertEqual(reports[-1], (sum(len(c) for c in self.chunks), True))
+
+    def test_03_removes_partial_file_on_failure(self):
+        """Test that a dropped stream leaves no truncated audio behind"""
+        os.makedirs(os.path.dirname(self.output_path))
+        with open(self.output_path, "wb") as f:
+            f.write(b"previous take")
+        with self.assertRaises(ConnectionError):
+            stream_tts(
+                "Hello world",
+                self.output_path,
+                settings=SETTINGS,
+                audio_stream=canned_audio_stream(self.chunks, fail_after=3),
+                progress=None,
+            )
+        with open(self.output_path, "rb") as f:
+            self.assertEqual(f.read(), b"previous take")
+        self.assertFalse(os.path.exists(f"{self.output_path}.part"))
+
+    def test_04_populates_cache(self):
+        """Test that finished streams are stored in the TTS cache"""
+        cache = DiskCache(os.path.join(self.work_dir, "cache"), suffix=".mp3")
+
+        stream_tts(
+            "Hello world",
+            self.output_path,
+            settings=SETTINGS,
+            cache=cache,
+            audio_stream=canned_audio_stream(self.chunks),
+            progress=None,
+        )
+
+        cached = cache.get_bytes(tts_cache_key("Hello   world", SETTINGS))
+        self.assertEqual(cached, b"".join(self.chunks))
+
+
+class TestLocalToneProvider(unittest.TestCase):
+    def test_01_duration_follows_word_rate(self):
+        """Test that stand-in audio is as long as the speech would be"""
+        provider = LocalToneProvider(words_per_minute=120)
+        self.assertAlmostEqual(provider.duration_for("word " * 240), 120.0)
+        self.assertAlmostEqual(provider.duration_for(""), 0.5)
+
+    def test_02_streams_into_a_file(self):
+        """Test that the offline provider drives the streaming writer"""
+        provider = LocalToneProvider(tone_hz=440, stream_chunk_size=1024)
+        audio = provider.synthesize("a few words of speech", SETTINGS)
+        work_dir = tempfile.mkdtemp()
+        try:
+            output_path = os.path.join(work_dir, "tone.mp3")
+            written = stream_tts(
+                "a few words of speech",
+                output_path,
+                settings=SETTINGS,
+                audio_stream=provider.stream("a few words of speech", SETTINGS),
+                progress=None,
+            )
+            self.assertEqual(written, len(audio))
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+class TestElevenLabsProvider(unittest.TestCase):
+    def test_01_billed_requests_are_not_retried_on_server_errors(self):
+        """Test that a synthesis POST is retried only when it surely didn't run"""
+        retry = post_safe_retry()
+        self.assertFalse(retry.is_retry("POST", 500))
+        self.assertFalse(retry.is_retry("POST", 503))
+        self.assertTrue(retry.is_retry("POST", 429))
+        self.assertTrue(retry.is_retry("GET", 503))
+        self.assertEqual(retry.read, 0)
+
+    def test_02_providers_must_implement_stream(self):
+        """Test that the base provider can't be used without stream()"""
+        with self.assertRaises(TypeError):
+            TTSProvider()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from PIL import Image, ImageDraw
+
+from pipeline.thumbnail_index import ThumbnailIndex, phash
+
+
+def scene(seed):
+    img = Image.new("RGB", (512, 512), "white")
+    draw = ImageDraw.Draw(img)
+    for i in range(6):
+        x = (seed * 97 + i * 61) % 400
+        y = (seed * 53 + i * 89) % 400
+        draw.ellipse((x, y, x + 110, y + 110), fill=(seed * 40 % 255, i * 40, 90))
+    return img
+
+
+class TestThumbnailIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.index_path = os.path.join(self.tmp, "index.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def save(self, img, name, **kwargs):
+        path = os.path.join(self.tmp, name)
+        img.save(path, **kwargs)
+        return path
+
+    def test_01_hash_survives_resize_and_reencode(self):
+        """Test that a resized JPEG copy hashes close to the original"""
+        original = scene(1)
+        copy = original.resize((300, 300))
+        other = scene(2)
+
+        index = ThumbnailIndex(self.index_path)
+        path = self.save(original, "a.png")
+        index.update([path])
+
+        self.assertEqual(index.nearest(phash(copy))[0][0], path)
+        self.assertEqual(index.nearest(phash(other)), [])
+
+    def test_02_clusters_merge_duplicates(self):
+        """Test that near-identical files share one representative"""
+        a = self.save(scene(1), "a.png")
+        b = self.save(scene(1).resize((256, 256)), "b.jpg", quality=70)
+        c = self.save(scene(3), "c.png")
+
+        index = ThumbnailIndex(self.index_path)
+        index.update([a, b, c])
+        clusters = index.clusters()
+
+        self.assertEqual(clusters[a], clusters[b])
+        self.assertNotEqual(clusters[a], clusters[c])
+
+    def test_03_only_changed_files_are_rehashed(self):
+        """Test that the saved index skips files that haven't changed"""
+        a = self.save(scene(1), "a.png")
+        b = self.save(scene(2), "b.png")
+        index = ThumbnailIndex(self.index_path)
+        self.assertEqual(index.update([a, b]), 2)
+        index.save()
+
+        reloaded = ThumbnailIndex(self.index_path)
+        self.assertEqual(reloaded.update([a, b]), 0)
+        os.remove(b)
+        self.assertEqual(reloaded.update([a]), 1)
+        self.assertEqual(list(reloaded.entries), [a])
+
+
+if __name__ == "__main__":
+    unittest.main()
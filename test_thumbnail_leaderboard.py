@@ -0,0 +1,118 @@
+import json
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from pipeline import upload_next_video
+from pipeline.thumbnail_leaderboard import (
+    ThumbnailLeaderboard,
+    append_top_performer,
+    load_top_performers,
+)
+
+
+def by_path(thumb, members):
+    return thumb
+
+
+class TestThumbnailLeaderboard(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def leaderboard(self, **kwargs):
+        return ThumbnailLeaderboard(self.tmp, group_of=by_path, **kwargs)
+
+    def test_01_incremental_matches_full_scan(self):
+        """Test that recorded updates give the same top-N as a rebuild"""
+        rng = random.Random(7)
+        board = self.leaderboard(top_n=5)
+        stats = {}
+        for _ in range(500):
+            thumb = f"thumb_{rng.randrange(40)}.png"
+            uses, views = rng.choice([(1, 0), (0, rng.randrange(1, 200))])
+            board.record(thumb, uses=uses, views=views)
+            board.top()
+            totals = stats.setdefault(thumb, {"uses": 0, "views": 0})
+            totals["uses"] += uses
+            totals["views"] += views
+
+        rebuilt = self.leaderboard(top_n=5)
+        rebuilt.rebuild([{"thumbnail_stats": stats}])
+
+        self.assertEqual(board.top(), rebuilt.top())
+        scores = [row["score"] for row in board.top()]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_02_state_survives_reload(self):
+        """Test that the event log is replayed when reopened"""
+        board = self.leaderboard()
+        board.record("a.png", uses=2)
+        board.record("a.png", views=30)
+        board.record("b.png", uses=1, views=5)
+
+        reopened = self.leaderboard()
+
+        self.assertEqual(reopened.totals("a.png")["score"], 15.0)
+        self.assertEqual([r["group"] for r in reopened.top()], ["a.png", "b.png"])
+
+    def test_03_migrates_legacy_top_performers(self):
+        """Test that the old JSON array (even with r+ leftovers) is migrated"""
+        legacy = os.path.join(self.tmp, "top_performers.json")
+        with open(legacy, "w") as f:
+            f.write(json.dumps([{"thumbnail": "old.png", "score": 5.0}]) + "\n  }\n]")
+
+        append_top_performer({"thumbnail": "new.png", "score": 6.0}, self.tmp)
+
+        records = load_top_performers(self.tmp)
+        self.assertEqual([r["thumbnail"] for r in records], ["old.png", "new.png"])
+        self.assertFalse(os.path.exists(legacy))
+
+    def test_04_processes_share_events_across_compaction(self):
+        """Test that compacting keeps other processes' events and top() follows"""
+        first = self.leaderboard()
+        second = self.leaderboard()
+        first.record("a.png", uses=1, views=10)
+        second.record("b.png", uses=1, views=50)
+        self.assertEqual(first.top()[0]["group"], "b.png")
+
+        second.record("a.png", views=100)
+        first.compact()
+        second.record("b.png", views=10)
+
+        expected = {"a.png": (1, 110), "b.png": (1, 60)}
+        for board in (first, second, self.leaderboard()):
+            totals = {r["group"]: (r["uses"], r["views"]) for r in board.top()}
+            self.assertEqual(totals, expected)
+
+    def test_05_failed_upload_records_no_use(self):
+        """Test that a thumbnail use is only counted once the video is up"""
+        video = os.path.join(self.tmp, "video.mp4")
+        with open(video, "wb") as f:
+            f.write(b"0" * 1024)
+        store = mock.Mock()
+        store.find_uploaded_by_hash.return_value = None
+        entry = {"video": video, "title": "T", "thumbnails": ["a.png"]}
+
+        board = mock.Mock()
+        with mock.patch.object(
+            upload_next_video, "get_leaderboard", return_value=board
+        ), mock.patch.object(
+            upload_next_video,
+            "send_resumable",
+            side_effect=ConnectionError("dropped"),
+        ):
+            with self.assertRaises(ConnectionError):
+                upload_next_video.upload_video(mock.Mock(), entry, store)
+
+        board.record.assert_not_called()
+        self.assertNotIn("thumbnail_stats", entry)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,205 @@
+import io
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from PIL import Image
+
+from config import Config
+from pipeline import thumbnail_index, thumbnail_utils
+from pipeline.disk_cache import DiskCache
+from pipeline.thumbnail_export import ensure_variant, export_variants
+from pipeline.thumbnail_index import ThumbnailIndex
+
+
+def png_bytes(color="navy"):
+    buffer = io.BytesIO()
+    Image.new("RGB", (256, 256), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class ImageServer(BaseHTTPRequestHandler):
+    """Serves one PNG over keep-alive HTTP/1.1; remembers each connection."""
+
+    protocol_version = "HTTP/1.1"
+    body = png_bytes()
+    connections = set()
+
+    def do_GET(self):
+        ImageServer.connections.add(self.client_address)
+        if self.path != "/base.png":
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestImageDownloads(unittest.TestCase):
+    def setUp(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), ImageServer)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.url = f"http://127.0.0.1:{server.server_port}"
+        ImageServer.connections = set()
+        patch = mock.patch.object(thumbnail_utils, "_session", None)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.addCleanup(lambda: thumbnail_utils._session.close())
+
+    def test_01_downloads_reuse_pooled_connections(self):
+        """Test that concurrent downloads share keep-alive connections"""
+        settings = dict(thumbnail_utils.get_thumbnail_settings(), pool_size=2)
+        url = f"{self.url}/base.png"
+        with mock.patch.object(
+            thumbnail_utils, "get_thumbnail_settings", return_value=settings
+        ):
+            thumbnail_utils.get_session()
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            bodies = list(
+                pool.map(lambda _: thumbnail_utils.download_bytes(url), range(12))
+            )
+
+        self.assertTrue(all(body == ImageServer.body for body in bodies))
+        self.assertLessEqual(len(ImageServer.connections), 2)
+
+    def test_02_a_failed_download_is_isolated(self):
+        """Test that one image that can't be fetched only fails its own entry"""
+        urls = {"Good": f"{self.url}/base.png", "Gone": f"{self.url}/expired.png"}
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, True)
+        entries = [{"title": "Good"}, {"title": "Gone"}, {"title": "Good"}]
+
+        def request_image(prompt, settings=None):
+            return urls["Gone" if "Gone" in prompt else "Good"]
+
+        with mock.patch.object(
+            thumbnail_utils, "THUMBNAIL_DIR", tmp
+        ), mock.patch.object(
+            thumbnail_utils,
+            "_base_image_cache",
+            DiskCache(f"{tmp}/cache", suffix=".png"),
+        ), mock.patch.object(
+            thumbnail_index, "_index", ThumbnailIndex(f"{tmp}/index.json")
+        ), mock.patch.object(
+            thumbnail_utils, "request_image", side_effect=request_image
+        ):
+            results = thumbnail_utils.generate_thumbnails(entries, progress=None)
+
+        self.assertEqual([r["ok"] for r in results], [True, False, True])
+        self.assertIn("404", results[1]["error"])
+        self.assertNotIn("thumbnail", entries[1])
+
+
+class TestGenerateThumbnails(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        Config.set("cache.thumbnails.enabled", True)
+        patches = [
+            mock.patch.object(thumbnail_utils, "THUMBNAIL_DIR", self.tmp),
+            mock.patch.object(
+                thumbnail_utils,
+                "_base_image_cache",
+                DiskCache(f"{self.tmp}/cache", suffix=".png"),
+            ),
+            mock.patch.object(
+                thumbnail_index, "_index", ThumbnailIndex(f"{self.tmp}/index.json")
+            ),
+            mock.patch.object(
+                thumbnail_utils, "request_image", side_effect=self.request_image
+            ),
+            mock.patch.object(
+                thumbnail_utils, "download_bytes", return_value=png_bytes()
+            ),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.prompts = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def request_image(self, prompt, settings=None):
+        if "broken" in prompt:
+            raise RuntimeError("content policy")
+        self.prompts.append(prompt)
+        return "https://images.example/base.png"
+
+    def test_01_failures_are_isolated(self):
+        """Test that one failed entry doesn't stop the others"""
+        entries = [{"title": f"Video {i}"} for i in range(4)] + [{"title": "broken"}]
+
+        results = thumbnail_utils.generate_thumbnails(entries, progress=None)
+
+        self.assertEqual([r["ok"] for r in results], [True] * 4 + [False])
+        self.assertIn("content policy", results[-1]["error"])
+        self.assertTrue(all("thumbnail" in e for e in entries[:4]))
+        self.assertNotIn("thumbnail", entries[-1])
+
+    def test_02_title_edit_only_recaptions(self):
+        """Test that retitling reuses the cached base image"""
+        entry = {"title": "Original title"}
+        thumbnail_utils.generate_thumbnails([entry], progress=None)
+        self.assertEqual(len(self.prompts), 1)
+
+        entry["title"] = "A much better title"
+        results = thumbnail_utils.generate_thumbnails([entry], progress=None)
+
+        self.assertEqual(len(self.prompts), 1)
+        self.assertTrue(results[0]["cached"])
+        self.assertEqual(entry["thumbnail_title"], "A much better title")
+        self.assertEqual(entry["thumbnail_prompt"], self.prompts[0])
+        # Nothing changed since, so nothing is redone
+        self.assertEqual(
+            thumbnail_utils.generate_thumbnails([entry], progress=None), []
+        )
+
+
+class TestThumbnailExport(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.source = f"{self.tmp}/title_thumb.png"
+        # Noise compresses badly, which makes the byte budget bite
+        Image.effect_noise((1024, 1024), 80).convert("RGBA").save(self.source)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_01_exports_every_variant_under_budget(self):
+        """Test that each variant has its target size and byte budget"""
+        with Image.open(self.source) as img:
+            paths = export_variants(img, self.source)
+
+        expected = {"upload": (1280, 720), "short": (1080, 1920), "preview": (320, 180)}
+        budgets = {"upload": 2000000, "short": 1000000, "preview": 30000}
+        self.assertEqual(set(paths), set(expected))
+        for name, path in paths.items():
+            with Image.open(path) as variant:
+                self.assertEqual(variant.size, expected[name])
+            self.assertLessEqual(os.path.getsize(path), budgets[name])
+
+    def test_02_upload_variant_is_refreshed_when_stale(self):
+        """Test that the uploader gets a fresh JPEG for a changed thumbnail"""
+        path, mimetype = ensure_variant(self.source, "upload")
+        self.assertEqual(mimetype, "image/jpeg")
+        self.assertTrue(path.endswith(".upload.jpg"))
+
+        os.utime(path, (0, 0))
+        ensure_variant(self.source, "upload")
+        self.assertGreater(os.path.getmtime(path), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from config import Config
+from pipeline import text_to_speech
+from pipeline.ffmpeg_utils import FFmpegError, ffmpeg_available, run_ffmpeg
+from pipeline.text_to_speech import split_script, stitch_audio
+
+
+class TestSplitScript(unittest.TestCase):
+    def test_01_keeps_paragraphs_separate(self):
+        """Test that each paragraph becomes its own chunk"""
+        chunks = split_script("First one.\n\nSecond one.\n\n\nThird.", 800)
+        self.assertEqual(chunks, ["First one.", "Second one.", "Third."])
+
+    def test_02_splits_long_paragraphs_at_sentences(self):
+        """Test that oversized paragraphs split on sentence boundaries"""
+        paragraph = " ".join(f"Sentence number {i} is here." for i in range(20))
+        chunks = split_script(paragraph, 100)
+        self.assertTrue(all(len(chunk) <= 100 for chunk in chunks))
+        self.assertTrue(all(chunk.endswith(".") for chunk in chunks))
+        self.assertEqual(" ".join(chunks), paragraph)
+
+
+class TestStitchAudio(unittest.TestCase):
+    def stitch(self, **audio):
+        for key, value in audio.items():
+            name = f"video.audio.{key}"
+            self.addCleanup(Config.set, name, Config.get(name))
+            Config.set(name, value)
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, True)
+        calls = []
+
+        def run_ffmpeg(args):
+            calls.append(args)
+            open(args[-1], "wb").close()
+
+        with mock.patch.object(text_to_speech, "run_ffmpeg", run_ffmpeg):
+            stitch_audio(["a.mp3", "b.mp3"], os.path.join(tmp, "out.mp3"), 500)
+        args = calls[0]
+        return args[args.index("-filter_complex") + 1]
+
+    def test_01_output_format_follows_config(self):
+        """Test that chunks are normalized to the configured rate and layout"""
+        graph = self.stitch(sample_rate=48000, channels=2)
+        self.assertEqual(graph.count("sample_rates=48000:channel_layouts=stereo"), 2)
+
+        graph = self.stitch(sample_rate=22050, channels=1)
+        self.assertEqual(graph.count("sample_rates=22050:channel_layouts=mono"), 2)
+        self.assertEqual(graph.count("apad=pad_dur=0.5"), 1)
+
+    def test_02_failed_stitch_leaves_no_output(self):
+        """Test that an interrupted stitch doesn't leave a truncated mp3 behind"""
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, True)
+        output = os.path.join(tmp, "voice.mp3")
+
+        def interrupted(args):
+            with open(args[-1], "wb") as f:
+                f.write(b"ID3 half an mp3")
+            raise FFmpegError("killed")
+
+        with mock.patch.object(text_to_speech, "run_ffmpeg", interrupted):
+            with self.assertRaises(FFmpegError):
+                stitch_audio(["a.mp3", "b.mp3"], output, gap_ms=500)
+        self.assertEqual(os.listdir(tmp), [])
+
+    @unittest.skipUnless(ffmpeg_available(), "ffmpeg not installed")
+    def test_03_stitches_into_place(self):
+        """Test that a real stitch ends up at the output path only"""
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, True)
+        chunks = []
+        for i in range(2):
+            chunks.append(os.path.join(tmp, f"chunk_{i}.mp3"))
+            run_ffmpeg(["-f", "lavfi", "-i", "sine=duration=0.3", chunks[-1]])
+        output = os.path.join(tmp, "voice.mp3")
+
+        stitch_audio(chunks, output, gap_ms=200)
+
+        self.assertGreater(os.path.getsize(output), 0)
+        self.assertFalse(os.path.exists(f"{output}.part"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,163 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+from pipeline import upload_next_video, upload_worker
+from pipeline.metadata_store import MetadataStore
+from pipeline.quota import QuotaBudget
+
+
+class TestUploadWorker(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.store = MetadataStore(os.path.join(self.tmp, "metadata.db"))
+        self.store.save_entries(
+            [
+                {"script": f"s{i}", "video": f"v{i}.mp4", "title": f"Video {i}"}
+                for i in range(5)
+            ]
+        )
+        self.uploads = []
+        self.broken = {"v1.mp4"}
+        self.lock = threading.Lock()
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def budget(self, uploads):
+        path = os.path.join(self.tmp, "quota.db")
+        budget = QuotaBudget(path, daily_units=uploads * upload_worker.UPLOAD_COST)
+        self.addCleanup(budget.close)
+        return budget
+
+    def fake_upload(self, youtube, entry, store=None, on_insert=None):
+        with self.lock:
+            self.uploads.append(entry["video"])
+        if entry["video"] in self.broken:
+            # Fails before YouTube accepted the insert, e.g. a missing file
+            raise FileNotFoundError(entry["video"])
+        on_insert()
+        time.sleep(0.05)
+        return f"id-{entry['video']}"
+
+    def drain(self, budget, **kwargs):
+        with mock.patch.object(upload_worker, "upload_video", self.fake_upload):
+            return upload_worker.drain_queue(
+                budget=budget,
+                store=self.store,
+                service_factory=lambda: None,
+                progress=None,
+                **kwargs,
+            )
+
+    def test_01_parallel_workers_stop_at_the_quota(self):
+        """Test that workers never share a video and leave the rest queued"""
+        budget = self.budget(3)
+        results = self.drain(budget, concurrency=3)
+
+        # v1 is tried once and its quota refunded, so v3 goes out instead
+        self.assertEqual(sorted(self.uploads), ["v0.mp4", "v1.mp4", "v2.mp4", "v3.mp4"])
+        self.assertEqual([r["ok"] for r in results].count(True), 3)
+        self.assertEqual(self.store.count_unuploaded(), 2)
+        self.assertEqual(budget.remaining(), 0)
+
+        entries = {e["video"]: e for e in self.store.load_entries()}
+        self.assertEqual(entries["v0.mp4"]["youtube_video_id"], "id-v0.mp4")
+        self.assertEqual(entries["v1.mp4"]["upload_error"], "v1.mp4")
+        self.assertFalse(any("upload_claim" in e for e in entries.values()))
+
+    def test_02_a_failing_head_of_queue_is_tried_once(self):
+        """Test that a broken first video doesn't eat the budget or block the rest"""
+        self.broken = {"v0.mp4"}
+        self.drain(self.budget(4), concurrency=1)
+
+        self.assertEqual(self.uploads, [f"v{i}.mp4" for i in range(5)])
+        self.assertEqual(self.store.count_unuploaded(), 1)
+
+    def test_03_claimed_entries_are_skipped_until_the_lease_lapses(self):
+        """Test that another worker's video is only retried after its claim expires"""
+        other = self.store.claim_next_unuploaded("other-host:1", lease_seconds=60)
+        stale = self.store.claim_next_unuploaded("other-host:2", lease_seconds=-1)
+        self.assertEqual(other["video"], "v0.mp4")
+
+        self.drain(self.budget(10), concurrency=2, limit=2)
+
+        # The lapsed claim's video fails here, so two uploads takes three tries
+        self.assertEqual(sorted(self.uploads), [stale["video"], "v2.mp4", "v3.mp4"])
+        self.assertIn("upload_claim", self.store.find_entry("s0", "v0.mp4"))
+
+    def test_04_finished_upload_survives_thumbnail_failures(self):
+        """Test that a video that reached YouTube is recorded and not sent again"""
+        video = os.path.join(self.tmp, "real.mp4")
+        with open(video, "wb") as f:
+            f.write(os.urandom(4096))
+        thumb = os.path.join(self.tmp, "thumb.png")
+        Image.new("RGB", (64, 36), "navy").save(thumb)
+        self.store.close()
+        self.store = MetadataStore(os.path.join(self.tmp, "queue.db"))
+        self.store.save_entries(
+            [
+                {"script": f"s{i}", "video": video, "title": "T", "thumbnail": thumb}
+                for i in range(2)
+            ]
+        )
+        sent = []
+
+        def send_resumable(request, path, *args):
+            sent.append(path)
+            return {"id": "yt1"}
+
+        with mock.patch.object(
+            upload_next_video, "send_resumable", send_resumable
+        ), mock.patch.object(
+            upload_next_video,
+            "get_leaderboard",
+            side_effect=RuntimeError("leaderboard locked"),
+        ):
+            for _ in range(2):
+                upload_worker.drain_queue(
+                    concurrency=1,
+                    budget=self.budget(10),
+                    store=self.store,
+                    service_factory=mock.Mock,
+                    progress=None,
+                )
+
+        self.assertEqual(sent, [video])
+        entries = self.store.load_entries()
+        self.assertEqual([e["youtube_video_id"] for e in entries], ["yt1", "yt1"])
+        self.assertTrue(all(e["uploaded"] for e in entries))
+        self.assertTrue(entries[0]["content_hash"])
+        self.assertEqual(entries[0]["thumbnail_used"], thumb)
+
+    def test_05_a_sent_insert_is_not_refunded(self):
+        """Test that an upload failing after its insert keeps the quota spent"""
+
+        def dropped(youtube, entry, store=None, on_insert=None):
+            on_insert()
+            raise ConnectionError("dropped")
+
+        budget = self.budget(2)
+        with mock.patch.object(upload_worker, "upload_video", dropped):
+            results = upload_worker.drain_queue(
+                budget=budget,
+                store=self.store,
+                service_factory=lambda: None,
+                progress=None,
+                concurrency=1,
+            )
+
+        self.assertEqual([r["charged"] for r in results], [True, True])
+        self.assertEqual(budget.remaining(), 0)
+        self.assertEqual(self.store.count_unuploaded(), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from pipeline import youtube_client
+
+
+class FakeCredentials:
+    """Stands in for google.oauth2 credentials; counts refreshes on disk."""
+
+    def __init__(self, counter, expiry):
+        self.counter = counter
+        self.token = "old"
+        self.expiry = expiry
+        self.refresh_token = "refresh"
+
+    @property
+    def valid(self):
+        return self.expiry > datetime.utcnow()
+
+    def has_scopes(self, scopes):
+        return True
+
+    def refresh(self, request):
+        with open(self.counter, "a") as f:
+            f.write("x")
+        time.sleep(0.05)
+        self.token = "new"
+        self.expiry = datetime.utcnow() + timedelta(hours=1)
+
+
+class TestYouTubeClient(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.token_file = os.path.join(self.tmp, "yt_tokens.pkl")
+        self.counter = os.path.join(self.tmp, "refreshes")
+        settings = {
+            "client_secrets": os.path.join(self.tmp, "client_secret.json"),
+            "token_file": self.token_file,
+            "discovery_cache": os.path.join(self.tmp, "discovery.json"),
+            "timeout": 5,
+            "lock_timeout": 5,
+        }
+        patches = [
+            mock.patch.object(
+                youtube_client, "get_client_settings", return_value=settings
+            ),
+            mock.patch.object(youtube_client, "_credentials", None),
+            mock.patch.object(youtube_client, "_discovery_doc", None),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_01_expired_token_is_refreshed_once(self):
+        """Test that concurrent callers share one refresh and the saved token"""
+        expired = FakeCredentials(self.counter, datetime.utcnow() - timedelta(1))
+        with open(self.token_file, "wb") as f:
+            pickle.dump(expired, f)
+
+        def fresh_process():
+            # Like a separate process: nothing cached in memory
+            youtube_client._credentials = None
+            return youtube_client.get_credentials()
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(fresh_process()))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        with open(self.counter) as f:
+            self.assertEqual(f.read(), "x")
+        self.assertTrue(all(creds.token == "new" for creds in results))
+        self.assertFalse(os.path.exists(f"{self.token_file}.lock"))
+
+    def test_02_file_lock_is_exclusive(self):
+        """Test that only one holder is inside the lock at a time"""
+        path = os.path.join(self.tmp, "lock")
+        inside = []
+        overlaps = []
+
+        def hold():
+            with youtube_client.file_lock(path, timeout=5):
+                inside.append(1)
+                overlaps.append(len(inside))
+                time.sleep(0.01)
+                inside.pop()
+
+        threads = [threading.Thread(target=hold) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(overlaps, [1] * 8)
+
+    def test_03_discovery_document_is_cached_on_disk(self):
+        """Test that the API description is read from disk after the first load"""
+        doc = youtube_client.get_discovery_document()
+        self.assertEqual(doc["name"], "youtube")
+
+        youtube_client._discovery_doc = None
+        with mock.patch(
+            "googleapiclient.discovery_cache.get_static_doc",
+            side_effect=AssertionError("should use the disk cache"),
+        ):
+            self.assertEqual(youtube_client.get_discovery_document(), doc)
+
+    def test_04_env_token_keeps_its_granted_scopes(self):
+        """Test that the env refresh token isn't refreshed with wider scopes"""
+        env = {"YT_REFRESH_TOKEN": "refresh", "YT_CLIENT_ID": "id"}
+        with mock.patch.dict(os.environ, env), mock.patch("dotenv.load_dotenv"):
+            os.environ.pop("YT_SCOPES", None)
+            creds = youtube_client._env_credentials(youtube_client.UPLOAD_SCOPES)
+            self.assertEqual(creds.scopes, youtube_client.UPLOAD_SCOPES)
+            with self.assertRaises(RuntimeError):
+                youtube_client._env_credentials(youtube_client.SCOPES)
+
+            os.environ["YT_SCOPES"] = " ".join(youtube_client.SCOPES)
+            creds = youtube_client._env_credentials(youtube_client.UPLOAD_SCOPES)
+            self.assertEqual(creds.scopes, youtube_client.SCOPES)
+
+    def test_05_live_lock_is_not_taken_over(self):
+        """Test that a holder kept alive outlasts the stale limit"""
+        path = os.path.join(self.tmp, "lock")
+        with youtube_client.file_lock(path, stale=0.3):
+            with youtube_client.keep_lock_alive(path, interval=0.05):
+                time.sleep(0.5)
+                with self.assertRaises(TimeoutError):
+                    with youtube_client.file_lock(path, timeout=0.5, stale=0.3):
+                        pass
+        self.assertFalse(os.path.exists(path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import threading
+import unittest
+from unittest import mock
+
+from pipeline import track_video_stats
+from pipeline.youtube_stats import fetch_statistics
+
+
+class FakeYouTube:
+    """Answers videos.list like the API: only IDs that still exist come back."""
+
+    def __init__(self, existing, fail_on=None):
+        self.existing = existing
+        self.fail_on = fail_on
+        self.calls = []
+        self.threads = set()
+
+    def videos(self):
+        return self
+
+    def list(self, part, id, maxResults=None):
+        self.calls.append(id.split(","))
+        self.threads.add(threading.get_ident())
+        self._ids = id.split(",")
+        return self
+
+    def execute(self):
+        ids = self._ids
+        if self.fail_on and self.fail_on in ids:
+            raise RuntimeError("quotaExceeded")
+        return {
+            "items": [
+                {"id": i, "statistics": {"viewCount": str(self.existing[i])}}
+                for i in ids
+                if i in self.existing
+            ]
+        }
+
+
+class TestYouTubeStats(unittest.TestCase):
+    def test_01_pages_of_fifty_with_missing_and_failed(self):
+        """Test that IDs are batched 50 a call and gaps are reported"""
+        ids = [f"v{i}" for i in range(120)]
+        youtube = FakeYouTube({i: n for n, i in enumerate(ids) if i != "v7"}, "v110")
+
+        stats, errors = fetch_statistics(youtube, ids + ids[:5], concurrency=1)
+
+        self.assertEqual([len(c) for c in youtube.calls], [50, 50, 20])
+        self.assertIsNone(stats["v7"])
+        self.assertEqual(stats["v42"]["views"], 42)
+        self.assertEqual(stats["v42"]["likes"], 0)
+        self.assertEqual(set(errors), set(ids[100:]))
+
+    def test_02_concurrent_pages_use_one_client_per_thread(self):
+        """Test that concurrent fetching builds a client per worker"""
+        ids = [f"v{i}" for i in range(500)]
+        existing = {i: 1 for i in ids}
+        clients = []
+
+        def factory():
+            clients.append(FakeYouTube(existing))
+            return clients[-1]
+
+        stats, errors = fetch_statistics(
+            None, ids, concurrency=4, service_factory=factory
+        )
+
+        self.assertEqual(len(stats), 500)
+        self.assertEqual(errors, {})
+        self.assertLessEqual(len(clients), 4)
+        for client in clients:
+            self.assertEqual(len(client.threads), 1)
+
+    def test_03_update_stats_keeps_missing_videos(self):
+        """Test that a deleted video keeps its last known stats"""
+        entries = [
+            {"title": "Live", "uploaded": True, "youtube_video_id": "a", "views": 5},
+            {"title": "Gone", "uploaded": True, "youtube_video_id": "b", "views": 9},
+            {"title": "Queued", "uploaded": False},
+        ]
+        with mock.patch.object(track_video_stats, "get_stats_history"):
+            logs = track_video_stats.update_stats(FakeYouTube({"a": 12}), entries)
+
+        self.assertEqual(entries[0]["views"], 12)
+        self.assertEqual(entries[1]["views"], 9)
+        self.assertIn("missing_since", entries[1])
+        self.assertTrue(any("not found" in line for line in logs))
+
+    def test_04_first_poll_credits_the_thumbnail(self):
+        """Test that views before the first stats check count for the thumbnail"""
+        entry = {
+            "title": "New",
+            "uploaded": True,
+            "youtube_video_id": "a",
+            "thumbnail_used": "t.png",
+            "thumbnail_stats": {"t.png": {"uses": 1, "views": 0, "score": 0.0}},
+        }
+        board = mock.Mock()
+        with mock.patch.object(
+            track_video_stats, "get_stats_history"
+        ), mock.patch.object(track_video_stats, "get_leaderboard", return_value=board):
+            track_video_stats.update_stats(FakeYouTube({"a": 40}), [entry])
+            track_video_stats.update_stats(FakeYouTube({"a": 55}), [entry])
+
+        self.assertEqual(entry["thumbnail_stats"]["t.png"]["views"], 55)
+        self.assertEqual(entry["thumbnail_stats"]["t.png"]["score"], 55.0)
+        self.assertEqual(
+            [c.kwargs["views"] for c in board.record.call_args_list], [40, 15]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,38 +1,23 @@
-import json
 import os
-import pickle
 import subprocess
-from datetime import datetime
+import sys
+import time
 
 import pandas as pd
 import streamlit as st
 from dotenv import load_dotenv
-from google.auth.transport.requests import Request
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from moviepy.audio.io.AudioFileClip import AudioFileClip
-from moviepy.video.compositing.CompositeVideoClip import CompositeVideoClip
-from moviepy.video.VideoClip import ImageClip, TextClip
 
 from pipeline.generate_thumbnail import generate_thumbnails
-from pipeline.make_video import render_video
-from pipeline.text_to_speech import run_tts
+from pipeline.metadata_store import get_metadata_store, load_entries, save_entries
+from pipeline.stats_history import get_history_settings, get_stats_history
+from pipeline.thumbnail_export import get_export_settings, variant_path
+from pipeline.thumbnail_leaderboard import get_leaderboard
 from pipeline.track_video_stats import update_stats
-from pipeline.upload_video import upload_video
+from pipeline.youtube_client import get_youtube_service
 
 load_dotenv()
 
 # Config
-API_SERVICE_NAME = "youtube"
-API_VERSION = "v3"
-VIDEO_LOG = "video/metadata.jsonl"
-CREDENTIALS_FILE = "client_secret.json"
-TOKEN_PICKLE = "yt_tokens.pkl"
-SCOPES = [
-    "https://www.googleapis.com/auth/youtube.readonly",
-    "https://www.googleapis.com/auth/youtube.force-ssl",
-]
-GROWTH_ALERT_THRESHOLD = 50  # views/hour
 PIPELINE_DIR = "pipeline"
 
 # Scripts for batch operations
@@ -42,76 +27,17 @@ BATCH_RENDER_SCRIPTS = [
     "generate_metadata.py",
     "generate_thumbnail.py",
 ]
-BATCH_UPLOAD_SCRIPT = "upload_next_video.py"
-
-
-def get_authenticated_service():
-    creds = None
-    if os.path.exists(TOKEN_PICKLE):
-        with open(TOKEN_PICKLE, "rb") as token:
-            creds = pickle.load(token)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS_FILE, SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open(TOKEN_PICKLE, "wb") as token:
-            pickle.dump(creds, token)
-    return build(API_SERVICE_NAME, API_VERSION, credentials=creds)
-
-
-def load_entries():
-    with open(VIDEO_LOG, "r", encoding="utf-8") as f:
-        return [json.loads(line) for line in f if line.strip()]
-
-
-def save_entries(entries):
-    with open(VIDEO_LOG, "w", encoding="utf-8") as f:
-        for entry in entries:
-            f.write(json.dumps(entry) + "\n")
+BATCH_UPLOAD_SCRIPT = "upload_worker.py"
 
 
-def update_stats(youtube, entries):
-    logs = []
-    for entry in entries:
-        if not entry.get("uploaded") or not entry.get("youtube_video_id"):
-            continue
-        try:
-            response = (
-                youtube.videos()
-                .list(part="statistics", id=entry["youtube_video_id"])
-                .execute()
-            )
-            stats = response["items"][0]["statistics"]
-            views = int(stats.get("viewCount", 0))
-            likes = int(stats.get("likeCount", 0))
-            comments = int(stats.get("commentCount", 0))
-
-            last_views = entry.get("views", 0)
-            last_check = entry.get("last_checked_at")
-
-            entry["views"] = views
-            entry["likes"] = likes
-            entry["comments"] = comments
-            entry["last_checked_at"] = datetime.utcnow().isoformat()
-
-            logs.append(f"📈 {entry['title']}: {views} views, {likes} likes")
-            if last_check:
-                prev_time = datetime.fromisoformat(last_check)
-                hours_elapsed = (datetime.utcnow() - prev_time).total_seconds() / 3600
-                growth = (
-                    (views - last_views) / hours_elapsed if hours_elapsed > 0 else 0
-                )
-                if growth > GROWTH_ALERT_THRESHOLD:
-                    logs.append(
-                        f"🚨 Growth alert: {entry['title']} — {views - last_views} new views in {hours_elapsed:.2f}h — {growth:.1f} views/hr"
-                    )
-        except Exception as e:
-            logs.append(
-                f"❌ Failed to fetch stats for {entry.get('youtube_video_id')}: {e}"
-            )
-    return logs
+def preview_image(thumb):
+    # The small exported preview when there is one, else the full image
+    spec = get_export_settings()["variants"].get("preview")
+    if spec:
+        preview = variant_path(thumb, "preview", spec["format"])
+        if os.path.exists(preview):
+            return preview
+    return thumb
 
 
 # Streamlit App
@@ -128,9 +54,9 @@ with tab1:
     st.header("📊 Update YouTube Stats")
     if st.button("Run Stats Update"):
         with st.spinner("Fetching stats..."):
-            youtube = get_authenticated_service()
+            youtube = get_youtube_service()
             entries = load_entries()
-            logs = update_stats(youtube, entries)
+            logs = update_stats(youtube, entries, service_factory=get_youtube_service)
             save_entries(entries)
         st.success("✅ Stats updated")
         for line in logs:
@@ -147,6 +73,31 @@ with tab1:
         df = pd.DataFrame(filtered)
         st.line_chart(df.set_index("title")[["views", "likes", "comments"]])
 
+    st.subheader("🕒 Stats History")
+    if uploaded:
+        titles = {e["title"]: e["youtube_video_id"] for e in uploaded}
+        chosen = st.multiselect("Videos", list(titles), default=list(titles)[:3])
+        days = st.slider("Days of history", min_value=1, max_value=365, value=30)
+        start = time.time() - days * 86400
+        points = get_history_settings()["chart_points"]
+        frames = []
+        for name in chosen:
+            series = get_stats_history().series(
+                titles[name], start=start, max_points=points
+            )
+            if len(series):
+                frames.append(
+                    pd.Series(
+                        series.views,
+                        index=pd.to_datetime(series.t, unit="s"),
+                        name=name,
+                    )
+                )
+        if frames:
+            st.line_chart(pd.concat(frames, axis=1).ffill())
+        else:
+            st.info("No history recorded yet for these videos")
+
     colA, colB = st.columns(2)
     with colA:
         if st.button("▶️ Run Batch Render"):
@@ -154,7 +105,7 @@ with tab1:
             for script in BATCH_RENDER_SCRIPTS:
                 path = os.path.join(PIPELINE_DIR, script)
                 result = subprocess.run(
-                    ["python", path], capture_output=True, text=True
+                    [sys.executable, path], capture_output=True, text=True
                 )
                 st.text(f"=== {script} ===\n" + result.stdout + result.stderr)
             st.success("✅ Batch render complete")
@@ -162,8 +113,10 @@ with tab1:
         if st.button("📤 Run Batch Upload"):
             st.info("Running batch upload...")
             path = os.path.join(PIPELINE_DIR, BATCH_UPLOAD_SCRIPT)
-            result = subprocess.run(["python", path], capture_output=True, text=True)
-            st.text("=== upload_next_video.py ===\n" + result.stdout + result.stderr)
+            result = subprocess.run(
+                [sys.executable, path], capture_output=True, text=True
+            )
+            st.text(f"=== {BATCH_UPLOAD_SCRIPT} ===\n" + result.stdout + result.stderr)
             st.success("✅ Batch upload complete")
 
 # Tab 2: Thumbnails
@@ -171,12 +124,59 @@ with tab2:
     st.header("🖼 Regenerate Thumbnails")
     if st.button("Generate All Thumbnails"):
         entries = load_entries()
-        generate_thumbnails(entries)
+        progress_bar = st.progress(0.0, text="Generating thumbnails...")
+
+        def show_progress(done, total, result):
+            status = "✅" if result["ok"] else "❌"
+            progress_bar.progress(
+                done / total, text=f"{status} {done}/{total}: {result['title']}"
+            )
+
+        results = generate_thumbnails(entries, progress=show_progress)
         save_entries(entries)
-        st.success("✅ Thumbnails regenerated")
+        failed = [r for r in results if not r["ok"]]
+        if failed:
+            st.warning(f"⚠️ {len(failed)} of {len(results)} thumbnails failed")
+        st.success(f"✅ Generated {len(results) - len(failed)} thumbnail(s)")
+        if results:
+            st.dataframe(
+                pd.DataFrame(
+                    [
+                        {
+                            "title": r["title"],
+                            "ok": r["ok"],
+                            "total (s)": round(r["seconds"], 2),
+                            **{
+                                f"{step} (s)": round(seconds, 2)
+                                for step, seconds in r["timings"].items()
+                            },
+                            "error": r["error"],
+                        }
+                        for r in results
+                    ]
+                )
+            )
 
-    st.subheader("📸 Thumbnail Previews + Scores")
+    st.subheader("🏆 Thumbnail Leaderboard")
     entries = load_entries()
+    top = get_leaderboard(entries).top()
+    if top:
+        st.dataframe(
+            pd.DataFrame(
+                [
+                    {
+                        "thumbnail": row["group"],
+                        "score": row["score"],
+                        "views": row["views"],
+                        "uses": row["uses"],
+                        "copies": len(row["members"]),
+                    }
+                    for row in top
+                ]
+            )
+        )
+
+    st.subheader("📸 Thumbnail Previews + Scores")
     for entry in entries:
         thumbs = entry.get("thumbnails", [])
         stats = entry.get("thumbnail_stats", {})
@@ -185,7 +185,7 @@ with tab2:
             cols = st.columns(len(thumbs))
             for i, thumb in enumerate(thumbs):
                 with cols[i]:
-                    st.image(thumb, width=150)
+                    st.image(preview_image(thumb), width=150)
                     score = stats.get(thumb, {}).get("score", 0.0)
                     reuse = stats.get(thumb, {}).get("reuse", False)
                     st.caption(f"Score: {score:.2f}, Reuse: {reuse}")
@@ -213,9 +213,19 @@ with tab3:
             if not st.button(f"❌ Delete {i}"):
                 new_queue.append(e)
         if st.button("💾 Save Queue Changes"):
-            updated = [e for e in entries if e.get("uploaded")] + new_queue
-            save_entries(updated)
+            # Retitled entries are re-captioned from their cached base image;
+            # new images still need "Generate All Thumbnails"
+            recaptioned = generate_thumbnails(
+                new_queue, progress=None, allow_generate=False
+            )
+            save_entries(new_queue)
+            kept = {e["_id"] for e in new_queue}
+            get_metadata_store().delete_entries(
+                e["_id"] for e in queue if e["_id"] not in kept
+            )
             st.success("✅ Upload queue updated")
+            if recaptioned:
+                st.info(f"🖼 Re-captioned {len(recaptioned)} thumbnail(s)")
     else:
         st.info("No pending uploads")
 